@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+"""Latency, throughput and SQL statement counts for every API route.
+
+Run from the server directory. Arguments this script doesn't know are handed
+to seed.py to size the dataset:
+
+    python -m benchmarks.endpoints --save baseline.json
+    python -m benchmarks.endpoints --compare baseline.json --users 50k --reviews 1M
+
+The schema is dropped, recreated and seeded on every run, in a temporary
+SQLite file unless DATABASE_URI points somewhere else, so only ever point it
+at a scratch database. Every GET route is measured; with --writes the POST,
+PATCH and DELETE routes follow, deletes last. The response cache is disabled
+unless --warm-cache is given, so repeated requests measure the real work.
+"""
+
+# Standard library imports
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+# A file rather than an in-memory database, so worker threads can connect
+os.environ.setdefault(
+    "DATABASE_URI", f"sqlite:///{tempfile.mkdtemp(prefix='safiri-bench-')}/bench.db"
+)
+
+# Remote library imports
+from flask_jwt_extended import create_access_token, create_refresh_token
+from sqlalchemy import event, select
+
+# Local imports
+from benchmarks.fixtures import app, db
+from export import EXPORTS
+from models import SiteActivity, User
+import seed
+
+DATASET = [
+    "--locations", "20",
+    "--users", "500",
+    "--sites", "200",
+    "--activities", "20",
+    "--reviews", "5k",
+    "--user-activities", "2k",
+    "--site-activities", "1k",
+]  # fmt: skip
+
+# Requests cycle through this many row ids (fewer if a table is smaller), so
+# they don't all hit one row
+ID_SPREAD = 50
+
+# Routes that need a token, and which kind. "fresh" mints a new access token
+# per request, for routes that revoke the token they're called with
+AUTH = {
+    "GET /check_session": "access",
+    "GET /refresh": "refresh",
+    "DELETE /logout": "fresh",
+    "POST /reviews": "access",
+    "POST /reviews/bulk": "access",
+    "GET /users/<int:user_id>/saved_sites": "access",
+    "POST /users/<int:user_id>/saved_sites": "access",
+    "DELETE /users/<int:user_id>/saved_sites/<int:site_id>": "access",
+}
+
+# Routes that need X-Admin-Token; the run sets ADMIN_TOKEN to this
+ADMIN_TOKEN = "benchmark-admin"
+ADMIN_ROUTES = {"GET /metrics", "GET /cache/stats"}
+
+
+def own_user(n, context):
+    # Saved sites are only reachable as the signed-in user
+    return {"user_id": context["user_id"]}
+
+
+# Path arguments other than the cycling row id, from the request number and
+# the run's context
+PATH_ARGUMENTS = {
+    "/export/<string:resource>": lambda n, context: {
+        "resource": sorted(EXPORTS)[n % len(EXPORTS)]
+    },
+    "/users/<int:user_id>/saved_sites": own_user,
+    "/users/<int:user_id>/saved_sites/<int:site_id>": own_user,
+}
+
+# Items per request to the bulk write routes
+BULK_SIZE = 10
+
+# Request bodies for write routes, from the request number and a row id
+BODIES = {
+    "POST /signup": lambda n, row: {
+        "username": f"benchsignup{n:06d}",
+        "password": "benchpassword",
+    },
+    "POST /reviews": lambda n, row: {
+        "reviewText": "Benchmarked",
+        "rating": n % 10 + 1,
+        "siteId": row,
+    },
+    "POST /activities": lambda n, row: {"name": "Bench activity"},
+    "POST /reviews/bulk": lambda n, row: [
+        {"reviewText": "Benchmarked", "rating": i % 10 + 1, "siteId": row + i}
+        for i in range(BULK_SIZE)
+    ],
+    "POST /user_activities": lambda n, row: {"user_id": row, "activity_id": row},
+    "POST /user_activities/bulk": lambda n, row: [
+        {"user_id": row, "activity_id": row + i} for i in range(BULK_SIZE)
+    ],
+    "POST /sites": lambda n, row: {"name": "Bench site", "location_id": row},
+    "POST /locations": lambda n, row: {"name": "Bench location"},
+    "POST /users/<int:user_id>/saved_sites": lambda n, row: {"site_id": row},
+    "PATCH /users/<int:user_id>": lambda n, row: {"bio": f"Bio {n}"},
+    "PATCH /profiles/<int:user_id>": lambda n, row: {"bio": f"Bio {n}"},
+    "PATCH /reviews/<int:id>": lambda n, row: {"rating": n % 10 + 1},
+    "PATCH /activities/<int:id>": lambda n, row: {"description": f"Description {n}"},
+    "PATCH /user_activities/<int:id>": lambda n, row: {"feedback": f"Feedback {n}"},
+    "PATCH /sites/<int:id>": lambda n, row: {"description": f"Description {n}"},
+}
+
+# Query strings for routes that need one, from the request number
+SEARCH_TERMS = ["safari", "group", "and sons", "hik", "mus", "adventure", "s"]
+QUERY_STRINGS = {
+    "GET /search": lambda n: {"q": SEARCH_TERMS[n % len(SEARCH_TERMS)]},
+    "GET /search/autocomplete": lambda n: {"q": SEARCH_TERMS[n % len(SEARCH_TERMS)]},
+    # Points across the region seed.py spreads locations over
+    "GET /sites/nearby": lambda n: {
+        "lat": -4.5 + n % 10,
+        "lng": 34 + n % 8,
+        "radius": 100,
+    },
+}
+
+# Deletes run children first, so earlier ones aren't emptied by cascades
+DELETE_ORDER = [
+    "/logout",
+    "/users/<int:user_id>/saved_sites/<int:site_id>",
+    "/reviews/<int:id>",
+    "/user_activities/<int:id>",
+    "/site_activities/<int:id>",
+    "/profiles/<int:user_id>",
+    "/sites/<int:id>",
+    "/activities/<int:id>",
+    "/users/<int:user_id>",
+]
+
+METHOD_ORDER = ["GET", "POST", "PATCH", "DELETE"]
+
+
+class Scenario:
+    """One method on one route, and how to build its nth request."""
+
+    def __init__(self, method, rule):
+        self.method = method
+        self.rule = rule
+        self.name = f"{method} {rule.rule}"
+
+    @property
+    def sort_key(self):
+        order = METHOD_ORDER.index(self.method)
+        if self.method == "DELETE" and self.rule.rule in DELETE_ORDER:
+            return (order, DELETE_ORDER.index(self.rule.rule))
+        return (order, 0, self.rule.rule)
+
+    def request(self, n, context):
+        row = n % context["spread"] + 1
+        # Each delete removes a different row; everything else cycles
+        row_id = n + 1 if self.method == "DELETE" else row
+        arguments = {key: row_id for key in self.rule.arguments}
+        if self.rule.rule in PATH_ARGUMENTS:
+            arguments.update(PATH_ARGUMENTS[self.rule.rule](n, context))
+        path = self.rule.build(arguments)[1]
+        kwargs = {}
+        if self.name in QUERY_STRINGS:
+            kwargs["query_string"] = QUERY_STRINGS[self.name](n)
+        if self.name == "POST /login":
+            kwargs["json"] = context["login"]
+        elif self.name in BODIES:
+            kwargs["json"] = BODIES[self.name](n, row)
+        elif self.rule.rule == "/site_activities/bulk":
+            # Bulk POSTs take their pairs after the ones the others use
+            pairs = context["free_pairs"]
+            start = 2 * context["pair_block"] + n * BULK_SIZE
+            kwargs["json"] = [
+                {"site_id": site_id, "activity_id": activity_id}
+                for site_id, activity_id in (
+                    pairs[(start + i) % len(pairs)] for i in range(BULK_SIZE)
+                )
+            ]
+        elif self.rule.rule.startswith("/site_activities"):
+            # POST and PATCH each draw from their own block of the unused
+            # pairs, so no request trips the unique (site_id, activity_id) index
+            pairs = context["free_pairs"]
+            offset = 0 if self.method == "POST" else context["pair_block"]
+            site_id, activity_id = pairs[(offset + n) % len(pairs)]
+            kwargs["json"] = {"site_id": site_id, "activity_id": activity_id}
+        token = AUTH.get(self.name)
+        if token is not None:
+            if token == "fresh":
+                with app.app_context():
+                    token = create_access_token(identity=context["user_id"])
+            else:
+                token = context[token]
+            kwargs["headers"] = {"Authorization": f"Bearer {token}"}
+        if self.name in ADMIN_ROUTES:
+            kwargs["headers"] = {"X-Admin-Token": ADMIN_TOKEN}
+        return path, kwargs
+
+
+def scenarios(include_writes):
+    """A scenario per method of every route registered with api.add_resource."""
+    found = []
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint not in app.extensions["api"].endpoints:
+            continue
+        for method in rule.methods - {"HEAD", "OPTIONS"}:
+            scenario = Scenario(method, rule)
+            if method == "GET" or scenario.name == "POST /login" or include_writes:
+                found.append(scenario)
+    return sorted(found, key=lambda scenario: scenario.sort_key)
+
+
+def free_pairs(dataset, count):
+    """(site_id, activity_id) pairs that no site_activities row uses yet."""
+    query = select(SiteActivity.site_id, SiteActivity.activity_id)
+    taken = set(db.session.execute(query).tuples())
+    pairs = (
+        (site_id, activity_id)
+        for site_id in range(1, dataset.sites + 1)
+        for activity_id in range(1, dataset.activities + 1)
+    )
+    unused = list(islice((pair for pair in pairs if pair not in taken), count))
+    return unused or [(1, 1)]
+
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile
+    index = max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes on Linux
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def run(scenario, context, engine, requests, concurrency, warmup):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, execution_context, executemany):
+        statements.append(statement)
+
+    def worker(numbers):
+        client = app.test_client()
+        timings, errors = [], 0
+        for n in numbers:
+            path, kwargs = scenario.request(n, context)
+            started = time.perf_counter()
+            try:
+                response = getattr(client, scenario.method.lower())(path, **kwargs)
+                failed = response.status_code >= 400
+            except Exception:
+                # PROPAGATE_EXCEPTIONS hands unhandled errors to the client
+                failed = True
+            timings.append(time.perf_counter() - started)
+            errors += failed
+        return timings, errors
+
+    # Warm-up requests use numbers past the measured ones, so deletes in the
+    # measured run still find their rows
+    worker(range(requests, requests + warmup))
+
+    event.listen(engine, "before_cursor_execute", record)
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            shares = [range(i, requests, concurrency) for i in range(concurrency)]
+            results = list(pool.map(worker, shares))
+    finally:
+        elapsed = time.perf_counter() - started
+        event.remove(engine, "before_cursor_execute", record)
+
+    timings = sorted(t for worker_timings, _ in results for t in worker_timings)
+    return {
+        "requests": len(timings),
+        "errors": sum(errors for _, errors in results),
+        "p50_ms": percentile(timings, 0.50) * 1000,
+        "p95_ms": percentile(timings, 0.95) * 1000,
+        "p99_ms": percentile(timings, 0.99) * 1000,
+        "mean_ms": sum(timings) / len(timings) * 1000,
+        "throughput_rps": len(timings) / elapsed,
+        "statements_per_request": len(statements) / len(timings),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Regressions of `results` against a saved baseline, as messages."""
+    regressions = []
+    for name, before in baseline["results"].items():
+        after = results.get(name)
+        if after is None:
+            continue
+        for metric in ("p50_ms", "p95_ms"):
+            if before[metric] and after[metric] / before[metric] > threshold:
+                regressions.append(
+                    f"{name}: {metric} {before[metric]:.2f} -> {after[metric]:.2f}"
+                    f" (x{after[metric] / before[metric]:.1f})"
+                )
+        statements = before["statements_per_request"], after["statements_per_request"]
+        if round(statements[1], 1) > round(statements[0], 1):
+            regressions.append(
+                f"{name}: statements/request {statements[0]:.1f}"
+                f" -> {statements[1]:.1f}"
+            )
+        if after["errors"] > before["errors"]:
+            regressions.append(
+                f"{name}: errors {before['errors']} -> {after['errors']}"
+            )
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark every API route against a seeded database.",
+        epilog="Other arguments are passed to seed.py to size the dataset.",
+    )
+    parser.add_argument("--requests", type=int, default=50, metavar="N")
+    parser.add_argument("--concurrency", type=int, default=1, metavar="N")
+    parser.add_argument("--warmup", type=int, default=10, metavar="N")
+    parser.add_argument("--writes", action="store_true")
+    parser.add_argument("--warm-cache", action="store_true")
+    parser.add_argument("--only", metavar="SUBSTRING", help="Scenarios to run")
+    parser.add_argument("--save", metavar="FILE", help="Write results as JSON")
+    parser.add_argument("--compare", metavar="FILE", help="Baseline JSON to check")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.5,
+        help="Latency ratio over the baseline counted as a regression",
+    )
+    args, seed_argv = parser.parse_known_args()
+    args.dataset = seed.parse_args(DATASET + seed_argv)
+    return args
+
+
+def main():
+    args = parse_args()
+    if not args.warm_cache:
+        app.extensions["response_cache"].maxsize = 0
+    app.config["ADMIN_TOKEN"] = ADMIN_TOKEN
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed.populate(args.dataset)
+        user = db.session.get(User, 1)
+        dataset = args.dataset
+        sizes = [dataset.locations, dataset.users, dataset.sites, dataset.activities]
+        context = {
+            "spread": max(1, min(ID_SPREAD, *sizes)),
+            "user_id": user.id,
+            "login": {
+                "username": user.username,
+                "password": seed.PASSWORDS[user.id % len(seed.PASSWORDS)],
+            },
+            "access": create_access_token(identity=user.id),
+            "refresh": create_refresh_token(identity=user.id),
+            "pair_block": args.requests + args.warmup,
+            "free_pairs": free_pairs(
+                dataset, (2 + BULK_SIZE) * (args.requests + args.warmup)
+            ),
+        }
+        engine = db.engine
+        db.session.remove()
+
+    results = {}
+    print(
+        f"\n{'scenario':<36}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+        f"{'req/s':>9}{'sql/req':>9}{'errors':>8}{'rss MB':>8}"
+    )
+    for scenario in scenarios(args.writes):
+        if args.only and args.only not in scenario.name:
+            continue
+        result = run(
+            scenario, context, engine, args.requests, args.concurrency, args.warmup
+        )
+        results[scenario.name] = result
+        print(
+            f"{scenario.name:<36}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}"
+            f"{result['p99_ms']:>9.2f}{result['throughput_rps']:>9.0f}"
+            f"{result['statements_per_request']:>9.1f}{result['errors']:>8}"
+            f"{result['peak_rss_mb']:>8.0f}"
+        )
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": engine.dialect.name,
+            "dataset": vars(args.dataset),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "warm_cache": args.warm_cache,
+        },
+        "results": results,
+    }
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"\nSaved results to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            return 1
+        print(f"\nNo regressions against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Time to first byte, throughput and peak memory of /export as reviews grow.
+
+Run from the server directory:
+
+    python -m benchmarks.export_stream
+    python -m benchmarks.export_stream --reviews 10k,100k,1M
+
+For each size the schema is reseeded with that many reviews and the whole
+table is read through /export/reviews in each format. Peak memory is what
+tracemalloc saw allocated while the response streamed, so a flat column
+means the export doesn't grow with the table. Like benchmarks.endpoints,
+this uses a temporary SQLite file unless DATABASE_URI points at a scratch
+database.
+"""
+
+# Standard library imports
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault(
+    "DATABASE_URI", f"sqlite:///{tempfile.mkdtemp(prefix='safiri-bench-')}/bench.db"
+)
+
+# Local imports
+from benchmarks.fixtures import app, db
+from export import FORMATS
+import seed
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--reviews",
+        type=lambda value: [seed.row_count(size) for size in value.split(",")],
+        default=[10_000, 100_000],
+        metavar="N,N,...",
+    )
+    return parser.parse_args()
+
+
+def measure(client, format):
+    tracemalloc.start()
+    started = time.perf_counter()
+    response = client.get(f"/export/reviews?format={format}", buffered=False)
+    first_byte = None
+    size = 0
+    for chunk in response.response:
+        if first_byte is None:
+            first_byte = time.perf_counter() - started
+        size += len(chunk)
+    total = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    response.close()
+    return first_byte * 1000, total, size / 2**20, peak / 2**20
+
+
+def main():
+    args = parse_args()
+    print(
+        f"\n{'reviews':>10} {'format':<8}{'first byte ms':>15}{'total s':>9}"
+        f"{'MB out':>9}{'peak MB':>9}"
+    )
+    for reviews in args.reviews:
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            seed.populate(
+                seed.parse_args(
+                    [
+                        "--locations", "10",
+                        "--users", "100",
+                        "--sites", "100",
+                        "--activities", "10",
+                        "--reviews", str(reviews),
+                        "--user-activities", "0",
+                        "--site-activities", "0",
+                    ]  # fmt: skip
+                )
+            )
+            db.session.remove()
+        client = app.test_client()
+        for format in FORMATS:
+            first_byte, total, size, peak = measure(client, format)
+            print(
+                f"{reviews:>10,} {format:<8}{first_byte:>15.1f}{total:>9.2f}"
+                f"{size:>9.1f}{peak:>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# Standard library imports
+import os
+from datetime import datetime
+
+# Benchmarks run against a throwaway database unless one is supplied
+os.environ.setdefault("DATABASE_URI", "sqlite://")
+os.environ.setdefault("JWT_SECRET_KET", "benchmark-secret")
+
+# Local imports
+from app import app
+from config import db
+from models import (
+    User,
+    Profile,
+    UserActivity,
+    Review,
+    Activity,
+    Site,
+    SiteActivity,
+    SavedSite,
+    Location,
+)
+
+
+def build_catalog(size):
+    """Create a fresh schema holding `size` locations, activities and users,
+    twice as many sites, and a review from every user on every site, every
+    other of which the user has saved."""
+    db.drop_all()
+    db.create_all()
+
+    locations = [
+        Location(name=f"Location {i}", description="A place") for i in range(size)
+    ]
+    activities = [
+        Activity(name=f"Activity {i}", category="Outdoor") for i in range(size)
+    ]
+    users = []
+    for i in range(size):
+        user = User(username=f"benchuser{i:05d}", password="not-a-real-hash")
+        user.profile = Profile(
+            first_name="Bench", last_name="User", email=f"bench{i}@example.com"
+        )
+        users.append(user)
+    sites = [
+        Site(name=f"Site {i}", category="Leisure", location=locations[i % size])
+        for i in range(size * 2)
+    ]
+    db.session.add_all(locations + activities + users + sites)
+
+    for i, site in enumerate(sites):
+        db.session.add(SiteActivity(site=site, activity=activities[i % size]))
+        for user in users:
+            db.session.add(Review(description="Nice", rating=7, user=user, site=site))
+            if i % 2:
+                db.session.add(SavedSite(user=user, site=site))
+    for user in users:
+        for activity in activities:
+            db.session.add(
+                UserActivity(
+                    user=user, activity=activity, participation_date=datetime.now()
+                )
+            )
+    db.session.commit()
+    db.session.remove()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""Check how long the app takes to import, and what it imports.
+
+Run from the server directory:
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --runs 10 --top 15
+
+Each target is imported in a fresh interpreter under `python -X importtime`,
+`--runs` times, and the fastest run is compared with its budget. "web" is
+what a gunicorn worker loads (app.py), "ready" adds the first request to /,
+and "data" is the database-only app seed.py and the flask commands use,
+which must not import the HTTP stack, the response cache and indexes, or
+Alembic. Budgets are multiples of the time a bare `import flask,
+flask_sqlalchemy` takes in the same run, so they hold on slower and faster
+machines alike; `--headroom` scales them further. A target over its budget
+or importing a forbidden package is reported with FAIL.
+"""
+
+# Standard library imports
+import argparse
+import os
+import subprocess
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+
+# What every target imports anyway; its time is the unit budgets are given in
+BASELINE = "import flask, flask_sqlalchemy"
+
+# name -> (code run in the fresh interpreter, budget as a multiple of the
+# baseline, forbidden packages)
+TARGETS = {
+    "web": (
+        "import app",
+        2.0,
+        {"alembic", "flask_migrate"},
+    ),
+    "ready": (
+        "import app; app.app.test_client().get('/')",
+        2.2,
+        {"alembic", "flask_migrate"},
+    ),
+    "data": (
+        "from config import create_app; create_app(groups=[])",
+        1.8,
+        {
+            "alembic",
+            "cache",
+            "flask_migrate",
+            "flask_restful",
+            "flask_cors",
+            "flask_jwt_extended",
+            "geo",
+            "resources",
+            "search",
+        },
+    ),
+}
+
+
+def profile(code):
+    """Wall time in ms of a fresh interpreter running `code`, and the time
+    spent importing each top-level package, as {package: ms}."""
+    env = dict(os.environ)
+    # Only settings are read at import time; nothing connects to these
+    env.setdefault("DATABASE_URI", "sqlite://")
+    env.setdefault("JWT_SECRET_KET", "import-time-secret")
+    # Measure with bytecode cached, as a deployed worker would find it
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=SERVER_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    elapsed = (time.perf_counter() - started) * 1000
+    packages = Counter()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        own, _, name = line[len("import time:") :].split("|")
+        if own.strip().isdigit():  # skips the header line
+            packages[name.strip().split(".")[0]] += int(own) / 1000
+    return elapsed, packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--top", type=int, default=8, help="slowest packages to list"
+    )
+    parser.add_argument(
+        "--headroom",
+        type=float,
+        default=1.0,
+        help="multiply every budget by this, for noisy machines",
+    )
+    args = parser.parse_args()
+
+    def fastest(code):
+        # One run first so the timed ones don't include writing bytecode
+        profile(code)
+        return min((profile(code) for _ in range(args.runs)), key=lambda run: run[0])
+
+    baseline, _ = fastest(BASELINE)
+    print(f"{'base':<6} {baseline:7.1f} ms wall ({BASELINE})")
+    failures = []
+    for name, (code, multiple, forbidden) in TARGETS.items():
+        budget = baseline * multiple * args.headroom
+        elapsed, packages = fastest(code)
+        loaded = sum(packages.values())
+        print(
+            f"{name:<6} {elapsed:7.1f} ms wall, {loaded:7.1f} ms importing, "
+            f"{elapsed / baseline:.2f}x base (budget {budget:.0f} ms)"
+        )
+        for package, ms in packages.most_common(args.top):
+            print(f"    {ms:7.1f} ms  {package}")
+        if elapsed > budget:
+            failures.append(f"{name} took {elapsed:.0f} ms, over {budget:.0f} ms")
+        for package in sorted(forbidden & packages.keys()):
+            failures.append(f"{name} imported {package}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Query plans and timings of relationship loads without and with the indexes.
+
+Run from the server directory. Arguments are handed to seed.py to size the
+dataset:
+
+    python -m benchmarks.index_plans
+    python -m benchmarks.index_plans --users 200k --reviews 5M
+
+Like benchmarks.endpoints, this drops and reseeds the schema, in a temporary
+SQLite file unless DATABASE_URI points at a scratch database.
+"""
+
+# Standard library imports
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault(
+    "DATABASE_URI", f"sqlite:///{tempfile.mkdtemp(prefix='safiri-bench-')}/bench.db"
+)
+
+# Remote library imports
+from sqlalchemy import select, text
+
+# Local imports
+from benchmarks.fixtures import app, db
+from models import Activity, Profile, Review, Site, SiteActivity, UserActivity
+import seed
+
+DATASET = [
+    "--locations", "100",
+    "--users", "20k",
+    "--sites", "2k",
+    "--activities", "100",
+    "--reviews", "200k",
+    "--user-activities", "50k",
+    "--site-activities", "10k",
+]  # fmt: skip
+
+# Indexes added by migration 5c9e0b7f4a21
+INDEXES = [
+    "ix_profiles_user_id",
+    "ix_user_activities_user_id",
+    "ix_user_activities_activity_id",
+    "ix_reviews_site_id_created_at",
+    "ix_reviews_user_id_created_at",
+    "ix_activities_category",
+    "ix_site_activities_activity_id",
+    "ix_sites_category",
+    "ix_sites_location_id",
+    "uq_site_activities_site_id_activity_id",
+]
+
+# The lookups behind each relationship load, for the busiest parent rows
+QUERIES = {
+    "Site.reviews": select(Review).where(Review.site_id == 1),
+    "newest reviews of a site": select(Review)
+    .where(Review.site_id == 1)
+    .order_by(Review.created_at.desc())
+    .limit(20),
+    "User.reviews": select(Review).where(Review.user_id == 1),
+    "newest reviews by a user": select(Review)
+    .where(Review.user_id == 1)
+    .order_by(Review.created_at.desc())
+    .limit(20),
+    "User.user_activities": select(UserActivity).where(UserActivity.user_id == 1),
+    "Activity.user_activities": select(UserActivity).where(
+        UserActivity.activity_id == 1
+    ),
+    "Site.site_activities": select(SiteActivity).where(SiteActivity.site_id == 1),
+    "Activity.site_activities": select(SiteActivity).where(
+        SiteActivity.activity_id == 1
+    ),
+    "Location.sites": select(Site).where(Site.location_id == 1),
+    "User.profile": select(Profile).where(Profile.user_id == 1),
+    "sites by category": select(Site).where(Site.category == "Historical"),
+    "activities by category": select(Activity).where(Activity.category == "Cultural"),
+}
+
+RUNS = 20
+
+
+def explain(connection, statement):
+    sql = str(statement.compile(connection, compile_kwargs={"literal_binds": True}))
+    if connection.dialect.name == "sqlite":
+        rows = connection.execute(text(f"EXPLAIN QUERY PLAN {sql}"))
+        return [row[-1] for row in rows]
+    return [row[0] for row in connection.execute(text(f"EXPLAIN {sql}"))]
+
+
+def median_ms(connection, statement):
+    timings = []
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        connection.execute(statement).all()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def measure(connection):
+    connection.execute(text("ANALYZE"))
+    return {
+        name: (median_ms(connection, statement), explain(connection, statement))
+        for name, statement in QUERIES.items()
+    }
+
+
+def main():
+    dataset = seed.parse_args(DATASET + sys.argv[1:])
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed.populate(dataset)
+        db.session.remove()
+
+        indexes = {
+            index.name: index
+            for table in db.metadata.tables.values()
+            for index in table.indexes
+        }
+        with db.engine.begin() as connection:
+            for name in INDEXES:
+                indexes[name].drop(connection)
+            before = measure(connection)
+            for name in INDEXES:
+                indexes[name].create(connection)
+            after = measure(connection)
+
+    print(f"\n{'query':<28}{'before ms':>11}{'after ms':>11}{'speedup':>9}")
+    for name in QUERIES:
+        (old, old_plan), (new, new_plan) = before[name], after[name]
+        print(f"{name:<28}{old:>11.3f}{new:>11.3f}{old / new:>8.1f}x")
+        print(f"    before: {' / '.join(old_plan)}")
+        print(f"    after:  {' / '.join(new_plan)}")
+
+
+if __name__ == "__main__":
+    main()
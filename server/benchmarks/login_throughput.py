@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""Logins per second per core, and what a login burst does to other routes.
+
+Run from the server directory:
+
+    python -m benchmarks.login_throughput
+    python -m benchmarks.login_throughput --threads 16 --logins 400
+
+Logins run from `--threads` client threads against the in-process app, once
+hashing on the request threads (PASSWORD_HASH_WORKERS=0) and once in the
+process pool. Meanwhile another thread keeps requesting a cheap read, and
+its median latency shows how much the burst starves everything else.
+The hasher's queue is sized to the client threads, so no login should be
+turned away with 503; any that are get counted. Like
+benchmarks.endpoints, this uses a temporary SQLite file unless DATABASE_URI
+points at a scratch database.
+"""
+
+# Standard library imports
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault(
+    "DATABASE_URI", f"sqlite:///{tempfile.mkdtemp(prefix='safiri-bench-')}/bench.db"
+)
+
+# Local imports
+from benchmarks.fixtures import app, db
+from models import User
+from passwords import PasswordHasher
+import seed
+
+READ_PATH = "/sites/1?fields=id,name"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count() or 1, metavar="N"
+    )
+    return parser.parse_args()
+
+
+def run(args, workers, login):
+    app.extensions["password_hasher"] = PasswordHasher(
+        method=app.config["PASSWORD_HASH_METHOD"],
+        workers=workers,
+        # Room for every client thread, so the rate isn't cut by 503s
+        max_pending=args.threads,
+        retry_after=1,
+    )
+    statuses = []
+    reads = []
+    done = threading.Event()
+
+    def log_in(_):
+        response = app.test_client().post("/login", json=login)
+        statuses.append(response.status_code)
+
+    def read():
+        client = app.test_client()
+        while not done.is_set():
+            started = time.perf_counter()
+            client.get(READ_PATH)
+            reads.append(time.perf_counter() - started)
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        list(pool.map(log_in, range(args.logins)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    reader.join()
+
+    succeeded = statuses.count(200)
+    cores = min(max(workers, 1), os.cpu_count() or 1)
+    return (
+        succeeded / elapsed,
+        succeeded / elapsed / cores,
+        statuses.count(503),
+        statistics.median(reads) * 1000 if reads else float("nan"),
+    )
+
+
+def main():
+    args = parse_args()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed.populate(seed.parse_args(["--users", "10", "--sites", "10"]))
+        user = db.session.get(User, 1)
+        login = {
+            "username": user.username,
+            "password": seed.PASSWORDS[user.id % len(seed.PASSWORDS)],
+        }
+        db.session.remove()
+
+    idle = []
+    client = app.test_client()
+    for _ in range(50):
+        started = time.perf_counter()
+        client.get(READ_PATH)
+        idle.append(time.perf_counter() - started)
+    print(f"\n{READ_PATH} with no logins: {statistics.median(idle) * 1000:.2f} ms")
+
+    print(
+        f"\n{'hashing':<16}{'logins/s':>10}{'per core':>10}{'503s':>7}"
+        f"{'read p50 ms':>13}"
+    )
+    for label, workers in (
+        ("request thread", 0),
+        (f"pool of {args.workers}", args.workers),
+    ):
+        rate, per_core, rejected, read_ms = run(args, workers, login)
+        print(
+            f"{label:<16}{rate:>10.1f}{per_core:>10.1f}{rejected:>7}"
+            f"{read_ms:>13.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""Latency cost of the /metrics instrumentation on a few representative routes.
+
+Run from the server directory. Arguments are handed to seed.py to size the
+dataset:
+
+    python -m benchmarks.metrics_overhead
+    python -m benchmarks.metrics_overhead --sites 10k
+
+Each route is requested with METRICS_ENABLED off and on in alternating
+rounds, so drift in the machine's speed hits both sides alike, and the
+median latencies are compared. The response cache is disabled so every
+request runs its queries and serializers. Like benchmarks.endpoints, this
+reseeds a temporary SQLite file unless DATABASE_URI points at a scratch
+database.
+"""
+
+# Standard library imports
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault(
+    "DATABASE_URI", f"sqlite:///{tempfile.mkdtemp(prefix='safiri-bench-')}/bench.db"
+)
+
+# Local imports
+from benchmarks.fixtures import app, db
+import seed
+
+DATASET = ["--sites", "100", "--reviews", "1k"]
+ROUTES = [
+    "/sites?fields=id,name",
+    "/sites",
+    "/sites/1",
+    "/reviews?expand=user",
+    "/users/1",
+    "/activities",
+]
+ROUNDS = 20
+REQUESTS_PER_ROUND = 25
+
+
+def median_ms(client, path):
+    timings = []
+    for _ in range(REQUESTS_PER_ROUND):
+        started = time.perf_counter()
+        client.get(path)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    dataset = seed.parse_args(DATASET + sys.argv[1:])
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed.populate(dataset)
+        db.session.remove()
+    app.extensions["response_cache"].maxsize = 0
+    client = app.test_client()
+
+    print(f"\n{'route':<28}{'off ms':>9}{'on ms':>9}{'overhead':>10}")
+    ratios = []
+    for path in ROUTES:
+        timings = {False: [], True: []}
+        for _ in range(ROUNDS):
+            for enabled in (False, True):
+                app.config["METRICS_ENABLED"] = enabled
+                timings[enabled].append(median_ms(client, path))
+        off, on = statistics.median(timings[False]), statistics.median(timings[True])
+        ratios.append(on / off)
+        print(f"{path:<28}{off:>9.2f}{on:>9.2f}{on / off - 1:>10.1%}")
+    print(f"{'geometric mean':<46}{statistics.geometric_mean(ratios) - 1:>10.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""k-nearest sites from the grid index against a haversine scan of every site.
+
+Run from the server directory. Arguments are handed to seed.py to size the
+dataset:
+
+    python -m benchmarks.nearby_latency
+    python -m benchmarks.nearby_latency --sites 1M --locations 2k
+
+Like benchmarks.endpoints, this drops and reseeds the schema, in a temporary
+SQLite file unless DATABASE_URI points at a scratch database.
+"""
+
+# Standard library imports
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault(
+    "DATABASE_URI", f"sqlite:///{tempfile.mkdtemp(prefix='safiri-bench-')}/bench.db"
+)
+
+# Remote library imports
+from sqlalchemy import select
+
+# Local imports
+from benchmarks.fixtures import app, db
+from geo import GridIndex, haversine_km
+from models import Site
+import seed
+
+DATASET = [
+    "--locations", "500",
+    "--users", "1",
+    "--sites", "100k",
+    "--activities", "1",
+    "--reviews", "0",
+    "--user-activities", "0",
+    "--site-activities", "0",
+]  # fmt: skip
+
+# (radius km, limit) of each query shape
+SHAPES = [(5, 10), (25, 20), (100, 20), (500, 200)]
+RUNS = 50
+
+
+def scan(points, lat, lng, radius_km, limit):
+    """What /sites/nearby would cost without an index."""
+    distances = (
+        (haversine_km(lat, lng, site_lat, site_lng), id)
+        for id, site_lat, site_lng in points
+    )
+    return sorted(item for item in distances if item[0] <= radius_km)[:limit]
+
+
+def median_ms(function, queries):
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        function(*query)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    dataset = seed.parse_args(DATASET + sys.argv[1:])
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed.populate(dataset)
+        points = db.session.execute(
+            select(Site.id, Site.latitude, Site.longitude)
+        ).all()
+
+        index = GridIndex(
+            cell_degrees=app.config["GEO_CELL_DEGREES"], sync_seconds=3600
+        )
+        started = time.perf_counter()
+        index.nearest(0, 0, 1, 1)
+        print(f"\nindex built in {time.perf_counter() - started:.2f}s")
+
+    rng = random.Random(0)
+    print(f"\n{'radius km':>10}{'limit':>7}{'grid ms':>10}{'scan ms':>10}")
+    for radius_km, limit in SHAPES:
+        queries = [
+            (
+                rng.uniform(*seed.REGION["latitude"]),
+                rng.uniform(*seed.REGION["longitude"]),
+                radius_km,
+                limit,
+            )
+            for _ in range(RUNS)
+        ]
+        grid = median_ms(index.nearest, queries)
+        full = median_ms(lambda *query: scan(points, *query), queries[:5])
+        print(f"{radius_km:>10}{limit:>7}{grid:>10.3f}{full:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""Check that read endpoints issue a fixed number of SQL statements.
+
+Run from the server directory:
+
+    python -m benchmarks.query_counts
+
+Each route's budget is the one its resource declares with
+@query_budget. QUERY_DEBUG is switched on, so statements repeated within
+a request (the N+1 signature) are logged with where they came from.
+Routes that depend on who is asking are also requested signed in as
+user 1.
+"""
+
+# Standard library imports
+import sys
+
+# Remote library imports
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+
+# Local imports
+from benchmarks.fixtures import app, db, build_catalog
+
+# Paths whose statement count must not depend on the data size
+PATHS = [
+    "/users",
+    "/users/1",
+    "/users?expand=activities,sites",
+    "/profiles/1",
+    "/reviews",
+    "/reviews?site_id=1&order=newest",
+    "/reviews/1",
+    "/activities",
+    "/activities/1",
+    "/user_activities",
+    "/user_activities/1",
+    "/sites",
+    "/sites/1",
+    "/sites?expand=activities,users",
+    "/sites/1/bundle",
+    "/locations",
+    "/locations?expand=sites.activities",
+    "/locations/1",
+]
+# Paths requested again with an access token
+SIGNED_IN_PATHS = [
+    "/sites",
+    "/sites/1",
+    "/sites/1/bundle",
+    "/users/1/saved_sites",
+]
+
+
+def query_budget(path):
+    """The @query_budget of the resource method serving GET `path`."""
+    route = path.split("?", 1)[0]
+    endpoint, _ = app.url_map.bind("localhost").match(route, method="GET")
+    view = app.view_functions[endpoint].view_class.get
+    return view.query_budget
+
+
+def count_queries(client, path, headers=None):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        response = client.get(path, headers=headers)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+    assert response.status_code == 200, f"{path} returned {response.status_code}"
+    return len(statements)
+
+
+def main():
+    failures = []
+    app.config["QUERY_DEBUG"] = True
+    with app.app_context():
+        client = app.test_client()
+        token = create_access_token(identity=1)
+        signed_in = {"Authorization": f"Bearer {token}"}
+        for size in (2, 8):
+            build_catalog(size)
+            requests = [(path, None, "") for path in PATHS] + [
+                (path, signed_in, " (signed in)") for path in SIGNED_IN_PATHS
+            ]
+            for path, headers, label in requests:
+                budget = query_budget(path)
+                count = count_queries(client, path, headers)
+                print(
+                    f"size={size:<3} {path + label:<34} {count} queries "
+                    f"(budget {budget})"
+                )
+                if count > budget:
+                    failures.append(
+                        f"{path}{label} issued {count} queries at size {size}"
+                    )
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
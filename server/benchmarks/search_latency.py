@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Search and autocomplete latency of the in-process index as the catalog grows.
+
+Run from the server directory:
+
+    python -m benchmarks.search_latency
+    python -m benchmarks.search_latency --sites 1k,10k,100k,1M
+
+For each catalog size the schema is reseeded with that many sites and a
+tenth as many locations and activities, a fresh index is built from it, and
+every query in QUERIES is timed. Like benchmarks.endpoints, this uses a
+temporary SQLite file unless DATABASE_URI points at a scratch database.
+"""
+
+# Standard library imports
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault(
+    "DATABASE_URI", f"sqlite:///{tempfile.mkdtemp(prefix='safiri-bench-')}/bench.db"
+)
+
+# Local imports
+from benchmarks.fixtures import app, db
+from search import InvertedIndex
+import seed
+
+# (method, query): whole words, multi-word queries and partial words
+QUERIES = [
+    ("search", "safari"),
+    ("search", "museum tour"),
+    ("search", "adventure"),
+    ("search", "group"),
+    ("search", "and sons"),
+    ("search", "hik"),
+    ("autocomplete", "s"),
+    ("autocomplete", "sa"),
+    ("autocomplete", "saf"),
+    ("autocomplete", "john"),
+]
+RUNS = 200
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sites",
+        type=lambda value: [seed.row_count(size) for size in value.split(",")],
+        default=[1_000, 10_000, 100_000],
+        metavar="N,N,...",
+    )
+    return parser.parse_args()
+
+
+def time_query(index, method, query):
+    search = getattr(index, method)
+    timings = []
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        search(query)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return statistics.median(timings) * 1e6, timings[int(RUNS * 0.95)] * 1e6
+
+
+def main():
+    args = parse_args()
+    results = {}
+    with app.app_context():
+        for sites in args.sites:
+            catalog = max(1, sites // 10)
+            db.drop_all()
+            db.create_all()
+            seed.populate(
+                seed.parse_args(
+                    [
+                        "--sites", str(sites),
+                        "--locations", str(catalog),
+                        "--activities", str(catalog),
+                        "--users", "1",
+                        "--reviews", "0",
+                        "--user-activities", "0",
+                        "--site-activities", "0",
+                    ]  # fmt: skip
+                )
+            )
+            # A long sync interval keeps the timings to the index itself
+            index = InvertedIndex(sync_seconds=3600)
+            started = time.perf_counter()
+            index._sync()
+            built = time.perf_counter() - started
+            print(f"\n{sites:,} sites: index built in {built:.2f}s")
+            results[sites] = {
+                (method, query): time_query(index, method, query)
+                for method, query in QUERIES
+            }
+            db.session.remove()
+
+    header = "".join(f"{f'{sites:,} sites':>22}" for sites in args.sites)
+    print(f"\n{'query (p50 / p95 us)':<28}{header}")
+    for method, query in QUERIES:
+        cells = "".join(
+            f"{p50:>13.0f} /{p95:>7.0f}"
+            for p50, p95 in (results[sites][(method, query)] for sites in args.sites)
+        )
+        print(f"{f'{method} {query!r}':<28}{cells}")
+
+
+if __name__ == "__main__":
+    main()
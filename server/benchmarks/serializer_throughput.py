@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""Rows/sec of SerializerMixin.to_dict() against the compiled serializers.
+
+Run from the server directory:
+
+    python -m benchmarks.serializer_throughput [catalog size]
+"""
+
+# Standard library imports
+import json
+import logging
+import sys
+import time
+
+# Local imports
+from benchmarks.fixtures import app, db, build_catalog
+from models import User, Profile, UserActivity, Review, Activity, Site, Location
+from query_plans import (
+    USER_PLAN,
+    PROFILE_PLAN,
+    REVIEW_PLAN,
+    ACTIVITY_PLAN,
+    USER_ACTIVITY_PLAN,
+    SITE_PLAN,
+    LOCATION_PLAN,
+)
+import serializers
+
+PLANS = {
+    User: USER_PLAN,
+    Profile: PROFILE_PLAN,
+    Review: REVIEW_PLAN,
+    Activity: ACTIVITY_PLAN,
+    UserActivity: USER_ACTIVITY_PLAN,
+    Site: SITE_PLAN,
+    Location: LOCATION_PLAN,
+}
+
+
+def rows_per_second(encode, rows, min_seconds=0.5):
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        encode(rows)
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return runs * len(rows) / elapsed
+
+
+def before(rows):
+    # What jsonify() did with app.json.compact = False
+    return json.dumps([row.to_dict() for row in rows], indent=2, sort_keys=True)
+
+
+def after(rows):
+    return serializers.dumps([serializers.dump(row) for row in rows])
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    # SiteActivity rows are skipped by to_dict() with a warning per item
+    logging.getLogger("serializer").setLevel(logging.ERROR)
+    with app.app_context():
+        build_catalog(size)
+        print(f"{'model':<14}{'rows':>6}{'to_dict rows/s':>18}{'compiled rows/s':>18}")
+        for model, plan in PLANS.items():
+            rows = model.query.options(*plan).all()
+            assert json.loads(after(rows)) == json.loads(before(rows))
+            old = rows_per_second(before, rows)
+            new = rows_per_second(after, rows)
+            print(
+                f"{model.__name__:<14}{len(rows):>6}{old:>18,.0f}{new:>18,.0f}"
+                f"  x{new / old:.1f}"
+            )
+        db.session.remove()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,184 @@
-from config import jwt
+import hashlib
+import heapq
+import math
+import time
 
-BLACKLIST = set()
+from flask import current_app
+from werkzeug.local import LocalProxy
+
+from config import db
+from models import RevokedToken
+
+
+class MemoryRevocationStore:
+    """Per-process revoked JTIs that forget each token once its `exp` passes.
+
+    Lookups are a dict hit. Expired entries are dropped lazily in expiry
+    order from a heap, so the store holds only tokens that could still be
+    presented. Revocations are invisible to other worker processes.
+    """
+
+    def __init__(self):
+        self._expires = {}
+        self._heap = []
+
+    def revoke(self, jti, expires_at):
+        self._expires[jti] = expires_at
+        heapq.heappush(self._heap, (expires_at, jti))
+        self._purge(time.time())
+
+    def is_revoked(self, jti):
+        expires_at = self._expires.get(jti)
+        if expires_at is None:
+            return False
+        if expires_at <= time.time():
+            self._purge(time.time())
+            return False
+        return True
+
+    def _purge(self, now):
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, jti = heapq.heappop(self._heap)
+            if self._expires.get(jti) == expires_at:
+                del self._expires[jti]
+
+    def __len__(self):
+        return len(self._expires)
+
+
+class DatabaseRevocationStore:
+    """Revoked JTIs in the `revoked_tokens` table, shared by every worker.
+
+    A lookup is a primary key read. Rows past their expiry are deleted
+    whenever a new token is revoked.
+    """
+
+    def revoke(self, jti, expires_at):
+        now = time.time()
+        RevokedToken.query.filter(RevokedToken.expires_at <= now).delete()
+        db.session.merge(
+            RevokedToken(jti=jti, expires_at=expires_at, revoked_at=now)
+        )
+        db.session.commit()
+
+    def is_revoked(self, jti):
+        token = db.session.get(RevokedToken, jti)
+        return token is not None and token.expires_at > time.time()
+
+    def revoked_since(self, since):
+        """JTIs of unexpired tokens revoked at or after `since`."""
+        rows = (
+            db.session.query(RevokedToken.jti)
+            .filter(
+                RevokedToken.revoked_at >= since,
+                RevokedToken.expires_at > time.time(),
+            )
+            .all()
+        )
+        return [jti for (jti,) in rows]
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.001):
+        # Standard sizing: m = -n ln(p) / ln(2)^2 bits, k = m / n ln(2) hashes
+        self.capacity = capacity
+        bits = -capacity * math.log(error_rate) / (math.log(2) ** 2)
+        self.size = max(8, int(bits))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, key):
+        # Keys already present (the sync pulls overlap, and revoke() adds
+        # what the next pull brings again) set no new bits and aren't
+        # counted, so `count` tracks distinct keys for the resize check
+        added = False
+        for position in self._positions(key):
+            mask = 1 << (position & 7)
+            if not self.bits[position >> 3] & mask:
+                self.bits[position >> 3] |= mask
+                added = True
+        if added:
+            self.count += 1
+
+    def __contains__(self, key):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+
+class BloomFrontedStore:
+    """Answers "not revoked" from an in-process bloom filter without I/O.
+
+    Only JTIs the filter may contain are checked against `backend`. The
+    filter learns about revocations made by other workers by pulling
+    `revoked_since()` at most once every `sync_seconds`, so a token revoked
+    elsewhere can be accepted for up to that long. It is rebuilt from the
+    backend once it fills past its capacity.
+    """
+
+    def __init__(self, backend, capacity=100_000, sync_seconds=5.0):
+        self.backend = backend
+        self.capacity = capacity
+        self.sync_seconds = sync_seconds
+        self._filter = None
+        self._synced_at = 0.0
+
+    def revoke(self, jti, expires_at):
+        self.backend.revoke(jti, expires_at)
+        if self._filter is not None:
+            self._filter.add(jti)
+
+    def is_revoked(self, jti):
+        self._sync()
+        if jti not in self._filter:
+            return False
+        return self.backend.is_revoked(jti)
+
+    def _sync(self):
+        now = time.time()
+        if self._filter is not None and now - self._synced_at < self.sync_seconds:
+            return
+        if self._filter is None or self._filter.count >= self.capacity:
+            self._filter = BloomFilter(self.capacity)
+            since = 0.0
+        else:
+            # Overlap the window so rows committed during the last pull are seen
+            since = self._synced_at - self.sync_seconds
+        for jti in self.backend.revoked_since(since):
+            self._filter.add(jti)
+        self._synced_at = now
+
+
+def build_revocation_store(config):
+    backend_name = config["TOKEN_REVOCATION_BACKEND"]
+    if backend_name == "memory":
+        return MemoryRevocationStore()
+    if backend_name != "database":
+        raise ValueError(f"Unknown token revocation backend '{backend_name}'")
+    store = DatabaseRevocationStore()
+    if config["TOKEN_REVOCATION_BLOOM"]:
+        store = BloomFrontedStore(
+            store, sync_seconds=config["TOKEN_REVOCATION_SYNC_SECONDS"]
+        )
+    return store
+
+
+def init_app(app, jwt):
+    app.extensions["revocation_store"] = build_revocation_store(app.config)
+    jwt.token_in_blocklist_loader(check_if_token_in_blacklist)
+
+
+# The current app's store
+revocation_store = LocalProxy(lambda: current_app.extensions["revocation_store"])
 
 
-@jwt.token_in_blocklist_loader
 def check_if_token_in_blacklist(jwt_header, jwt_payload):
-    return jwt_payload["jti"] in BLACKLIST
+    return revocation_store.is_revoked(jwt_payload["jti"])
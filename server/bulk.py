@@ -0,0 +1,110 @@
+from flask import abort, jsonify, make_response, request
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from config import db
+from serializers import json_response
+
+MAX_BULK_ITEMS = 1000
+
+
+class ItemError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def error(status, message):
+    abort(make_response(jsonify({"error": message}), status))
+
+
+def field(item, name, type, required=False, default=None):
+    """One value of a bulk item, converted like reqparse would."""
+    value = item.get(name)
+    if value is None:
+        if required:
+            raise ItemError(400, f"{name} is required")
+        return default
+    try:
+        return type(value)
+    except (TypeError, ValueError) as e:
+        raise ItemError(400, f"{name}: {e}")
+
+
+def existing_ids(model, ids):
+    """The subset of `ids` that exist in `model`'s table, in one IN query."""
+    ids = {id for id in ids if id is not None}
+    if not ids:
+        return set()
+    return set(db.session.scalars(select(model.id).where(model.id.in_(ids))))
+
+
+class BulkWrite:
+    """Creates the rows of a JSON array request body in one transaction.
+
+    Items are built into model instances, so the models' validators run,
+    then checked against the database in a query per check rather than per
+    item. Rows that pass are flushed together and committed at once; on
+    PostgreSQL SQLAlchemy sends them as one multi-row INSERT ... RETURNING.
+    Going through the session rather than a Core insert keeps the rating
+    stats, co-occurrence, cache and search hooks in step. Every item
+    gets a result with the status its single-row POST would have returned,
+    so one bad item doesn't sink the rest.
+    """
+
+    def __init__(self):
+        items = request.get_json(silent=True)
+        if not isinstance(items, list) or not items:
+            error(400, "Expected a non-empty JSON array")
+        if len(items) > MAX_BULK_ITEMS:
+            error(413, f"At most {MAX_BULK_ITEMS} items per request")
+        self.items = items
+        self.results = [None] * len(items)
+        self.rows = {}
+
+    def build(self, make):
+        """Turn each item into a model instance with `make(item)`."""
+        for index, item in enumerate(self.items):
+            try:
+                if not isinstance(item, dict):
+                    raise ItemError(400, "Expected a JSON object")
+                self.rows[index] = make(item)
+            except ItemError as e:
+                self.fail(index, e.status, e.message)
+            except ValueError as e:
+                self.fail(index, 400, str(e))
+
+    def require(self, attribute, model, message):
+        """Fail the rows whose `attribute` names a missing `model` row."""
+        ids = existing_ids(
+            model, (getattr(row, attribute) for row in self.rows.values())
+        )
+        for index, row in list(self.rows.items()):
+            if getattr(row, attribute) not in ids:
+                self.fail(index, 404, message)
+
+    def fail(self, index, status, message):
+        self.rows.pop(index, None)
+        self.results[index] = {"index": index, "status": status, "error": message}
+
+    def commit(self):
+        rows = self.rows
+        try:
+            db.session.add_all(rows.values())
+            db.session.flush()
+            # Read before the commit expires them
+            ids = {index: row.id for index, row in rows.items()}
+            db.session.commit()
+        except IntegrityError as e:
+            # Something changed between the checks and the insert; nothing
+            # was written, so the whole request can be retried
+            db.session.rollback()
+            error(409, f"Conflicting write, nothing was saved: {e.orig}")
+        for index, id in ids.items():
+            self.results[index] = {"index": index, "status": 201, "id": id}
+        failed = len(self.results) - len(ids)
+        return json_response(
+            {"created": len(ids), "failed": failed, "results": self.results},
+            201 if not failed else 207,
+        )
@@ -0,0 +1,105 @@
+from datetime import datetime
+
+from flask import url_for
+from sqlalchemy import inspect, select
+from sqlalchemy.orm import joinedload, load_only
+from sqlalchemy_serializer import SerializerMixin
+
+from config import db
+from loaders import association_loader
+from models import Activity, Location, Review, SavedSite, Site, SiteActivity, User
+from pagination import encode_cursor
+from rating_stats import stats_for
+from saved_sites import annotate_saved
+
+# Newest reviews included in a bundle; `reviews_next` links to the rest
+BUNDLE_REVIEWS = 10
+LOCATION_SUMMARY = ("id", "name", "image", "latitude", "longitude")
+ACTIVITY_FIELDS = ("id", "name", "category", "description")
+REVIEW_FIELDS = ("id", "rating", "description", "created_at")
+REVIEWER_FIELDS = ("id", "username")
+# Tables a bundle is read from, for its ETag
+BUNDLE_MODELS = (Site, Location, Activity, SiteActivity, Review, User, SavedSite)
+
+
+def _columns(obj, keys):
+    # Same formatting SerializerMixin.to_dict() applies to datetimes
+    data = {}
+    for key in keys:
+        value = getattr(obj, key)
+        if isinstance(value, datetime):
+            value = value.strftime(SerializerMixin.datetime_format)
+        data[key] = value
+    return data
+
+
+def _attributes(model, keys):
+    return [getattr(model, key) for key in keys]
+
+
+def site_bundle(site_id):
+    """Everything a site page shows, or None if there is no such site.
+
+    The site with its location summary, the activities offered there, the
+    newest reviews with their authors' usernames, and the rating stats.
+    `reviews_next` is the /reviews page that carries on from the last
+    review, newest first, or None when the site has no more.
+    Each part is one query that loads only the columns it shows, so the
+    bundle costs the same handful of statements however big the site's
+    location, review history or activity list are.
+    """
+    site_keys = [attribute.key for attribute in inspect(Site).column_attrs]
+    site = db.session.scalars(
+        select(Site)
+        .options(
+            load_only(*_attributes(Site, site_keys)),
+            joinedload(Site.location).load_only(
+                *_attributes(Location, LOCATION_SUMMARY)
+            ),
+        )
+        .where(Site.id == site_id)
+    ).first()
+    if site is None:
+        return None
+
+    activities = association_loader().load(
+        site, "activities", (load_only(*_attributes(Activity, ACTIVITY_FIELDS)),)
+    )
+    reviews = db.session.scalars(
+        select(Review)
+        .options(
+            load_only(*_attributes(Review, REVIEW_FIELDS)),
+            joinedload(Review.user).load_only(*_attributes(User, REVIEWER_FIELDS)),
+        )
+        .where(Review.site_id == site_id)
+        .order_by(Review.id.desc())
+        .limit(BUNDLE_REVIEWS + 1)
+    ).all()
+    reviews_next = None
+    if len(reviews) > BUNDLE_REVIEWS:
+        reviews = reviews[:BUNDLE_REVIEWS]
+        reviews_next = url_for(
+            "reviews",
+            site_id=site_id,
+            order="newest",
+            limit=BUNDLE_REVIEWS,
+            after=encode_cursor(reviews[-1].id),
+            _external=True,
+        )
+
+    data = _columns(site, site_keys)
+    annotate_saved([site], [data])
+    return {
+        "site": data,
+        "location": _columns(site.location, LOCATION_SUMMARY),
+        "activities": [_columns(activity, ACTIVITY_FIELDS) for activity in activities],
+        "reviews": [
+            {
+                **_columns(review, REVIEW_FIELDS),
+                "user": _columns(review.user, REVIEWER_FIELDS),
+            }
+            for review in reviews
+        ],
+        "reviews_next": reviews_next,
+        "rating_stats": stats_for([site_id])[site_id],
+    }
@@ -0,0 +1,202 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, current_app, g, has_app_context, request
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import MANYTOONE, Session
+from werkzeug.local import LocalProxy
+
+from cascades import on_cascade
+from config import db
+
+
+class ResponseCache:
+    """LRU + TTL store of rendered GET responses, tagged with the rows they show.
+
+    Each entry remembers the `(table, id)` of every row loaded while it was
+    built, plus `(table, None)` for the table a list endpoint enumerates.
+    Committing a change to a row drops every entry tagged with it, or with
+    the parent rows its foreign keys point at. The cache is per process, so
+    other workers only see a write once their copy expires.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                self._discard(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, tags):
+        with self._lock:
+            if key in self._entries:
+                self._discard(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, tags):
+        with self._lock:
+            for tag in tags:
+                for key in self._tags.pop(tag, ()):
+                    if key in self._entries:
+                        self._discard(key)
+                        self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def _discard(self, key):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+def init_app(app):
+    app.extensions["response_cache"] = ResponseCache(
+        maxsize=app.config["RESPONSE_CACHE_SIZE"], ttl=app.config["RESPONSE_CACHE_TTL"]
+    )
+
+
+# The current app's cache
+response_cache = LocalProxy(lambda: current_app.extensions["response_cache"])
+
+
+def _row_tag(obj):
+    mapper = inspect(obj).mapper
+    return (mapper.local_table.name, mapper.primary_key_from_instance(obj)[0])
+
+
+@event.listens_for(db.Model, "load", propagate=True)
+def _record_loaded_row(obj, context):
+    loaded = g.get("cache_tags") if has_app_context() else None
+    if loaded is not None:
+        loaded.add(_row_tag(obj))
+
+
+def cached(collection=None, vary=None):
+    """Serve a resource's GET from `response_cache`.
+
+    `collection` names the model a list endpoint enumerates, so inserts into
+    its table invalidate the cached pages. `vary` is called per request for
+    anything besides the URL the response depends on, such as the caller's
+    identity; each value gets its own entry. Under `@conditional`, a hit
+    costs only the table version lookup its ETag is built from.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = (request.path, tuple(sorted(request.args.items(multi=True))))
+            if vary is not None:
+                key += (vary(),)
+            hit = response_cache.get(key)
+            if hit is not None:
+                body, mimetype, headers = hit
+                response = Response(body, mimetype=mimetype, headers=headers)
+                response.headers["X-Cache"] = "HIT"
+                return response
+
+            g.cache_tags = set()
+            response = view(*args, **kwargs)
+            tags, g.cache_tags = g.cache_tags, None
+            if isinstance(response, Response) and response.status_code == 200:
+                if collection is not None:
+                    tags.add((collection.__tablename__, None))
+                headers = [(k, v) for k, v in response.headers if k == "Link"]
+                response_cache.set(
+                    key, (response.get_data(), response.mimetype, headers), tags
+                )
+                response.headers["X-Cache"] = "MISS"
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def _changed_tags(session):
+    tags = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        state = inspect(obj)
+        mapper = state.mapper
+        tags.add(_row_tag(obj))
+        if obj in session.new or obj in session.deleted:
+            tags.add((mapper.local_table.name, None))
+        # The parents a row hangs off, before and after any foreign key change
+        for relationship in mapper.relationships:
+            if relationship.direction is not MANYTOONE:
+                continue
+            parent_table = relationship.mapper.local_table.name
+            for column in relationship.local_columns:
+                key = mapper.get_property_by_column(column).key
+                for value in state.attrs[key].history.sum():
+                    if value is not None:
+                        tags.add((parent_table, value))
+    return tags
+
+
+@on_cascade
+def _collect_cascaded_rows(session, cascaded):
+    tags = session.info.setdefault("cache_tags", set())
+    for model, ids in cascaded.items():
+        if ids:
+            tags.add((model.__tablename__, None))
+            tags.update((model.__tablename__, id) for id in ids)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_rows(session, flush_context):
+    session.info.setdefault("cache_tags", set()).update(_changed_tags(session))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_rows(session):
+    tags = session.info.pop("cache_tags", None)
+    if tags and "response_cache" in current_app.extensions:
+        response_cache.invalidate(tags)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_rows(session):
+    session.info.pop("cache_tags", None)
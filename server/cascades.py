@@ -0,0 +1,64 @@
+from collections import defaultdict
+
+from sqlalchemy import event, or_, select
+from sqlalchemy.orm import Session
+
+from models import Activity, Location, Site, SiteActivity
+
+_subscribers = []
+
+
+def on_cascade(callback):
+    """Call `callback(session, cascaded)` before every flush.
+
+    `cascaded` maps Site and SiteActivity to the ids of the rows ON DELETE
+    CASCADE will remove along with the flush's deletions: sites with their
+    location, and site_activities with their site or activity. Those rows
+    never pass through the session (the relationships use passive deletes),
+    so hooks that track them have to hear about them here, while they still
+    exist. The rows are read once per flush, whoever subscribes.
+    """
+    _subscribers.append(callback)
+    return callback
+
+
+def _cascaded_rows(session):
+    deleted = defaultdict(set)
+    for obj in session.deleted:
+        if isinstance(obj, (Location, Site, Activity, SiteActivity)):
+            deleted[type(obj)].add(obj.id)
+    cascaded = {Site: [], SiteActivity: []}
+    if not (deleted[Location] or deleted[Site] or deleted[Activity]):
+        return cascaded
+
+    with session.no_autoflush:
+        if deleted[Location]:
+            cascaded[Site] = [
+                id
+                for id in session.scalars(
+                    select(Site.id).where(Site.location_id.in_(deleted[Location]))
+                )
+                if id not in deleted[Site]
+            ]
+        site_ids = deleted[Site] | set(cascaded[Site])
+        conditions = []
+        if site_ids:
+            conditions.append(SiteActivity.site_id.in_(site_ids))
+        if deleted[Activity]:
+            conditions.append(SiteActivity.activity_id.in_(deleted[Activity]))
+        if conditions:
+            cascaded[SiteActivity] = [
+                id
+                for id in session.scalars(
+                    select(SiteActivity.id).where(or_(*conditions))
+                )
+                if id not in deleted[SiteActivity]
+            ]
+    return cascaded
+
+
+@event.listens_for(Session, "before_flush")
+def _notify_subscribers(session, flush_context, instances):
+    cascaded = _cascaded_rows(session)
+    for callback in _subscribers:
+        callback(session, cascaded)
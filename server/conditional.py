@@ -0,0 +1,49 @@
+import hashlib
+from functools import wraps
+
+from flask import Response, request
+
+from fieldsets import Fieldset
+from versions import table_versions
+
+
+def conditional(model, vary=None, also=()):
+    """Add a strong ETag and Last-Modified to a resource's GET.
+
+    The validator is derived from the versions of every table the response
+    can include, given `?fields=`/`?expand=`, so a matching If-None-Match is
+    answered with 304 before any row is loaded or serialized. `also` lists
+    further models the response reads, and `vary` is called for anything
+    besides the URL it depends on, such as the caller's identity.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            models = Fieldset.from_request(model, None).models(model) | set(also)
+            versions = table_versions(models)
+            digest = hashlib.sha1(request.full_path.encode())
+            if vary is not None:
+                digest.update(f"|{vary()}".encode())
+            for table, version, updated_at in versions:
+                digest.update(f"|{table}:{version}".encode())
+            etag = digest.hexdigest()
+            timestamps = [updated_at for _, _, updated_at in versions if updated_at]
+            last_modified = max(timestamps) if timestamps else None
+
+            if etag in request.if_none_match:
+                response = Response(status=304)
+            else:
+                response = view(*args, **kwargs)
+                if not isinstance(response, Response) or response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            if vary is not None:
+                # Shared caches must not hand one user's copy to another
+                response.vary.add("Authorization")
+            if last_modified is not None:
+                response.last_modified = last_modified
+            return response
+
+        return wrapper
+
+    return decorator
@@ -1,41 +1,175 @@
 # Standard library imports
 from datetime import timedelta
 import os
+import sqlite3
 from dotenv import load_dotenv
 
-load_dotenv()
-
 # Remote library imports
 from flask import Flask
-from flask_migrate import Migrate
-from flask_restful import Api
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import MetaData
-from flask_cors import CORS
-from flask_jwt_extended import JWTManager
+from sqlalchemy import MetaData, event
+from sqlalchemy.engine import Engine
 
 # Local imports
 
-# Instantiate app, set attributes
-app = Flask(__name__)
-CORS(app)
-jwt = JWTManager(app)
-app.config["JWT_SECRET_KEY"] = os.environ.get("JWT_SECRET_KET")
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(minutes=30)
-app.config['JWT_REFRESH_TOKEN_EXPIRES'] = timedelta(days=30)
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URI")
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-app.json.compact = False
+
+def settings():
+    """App settings from the environment, after loading any .env file."""
+    load_dotenv()
+    config = {}
+    config["JWT_SECRET_KEY"] = os.environ.get("JWT_SECRET_KET")
+    config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(minutes=30)
+    config["JWT_REFRESH_TOKEN_EXPIRES"] = timedelta(days=30)
+    # Let flask-jwt-extended answer revoked/expired tokens with 401 instead of
+    # flask-restful turning its exceptions into 500s
+    config["PROPAGATE_EXCEPTIONS"] = True
+    config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URI")
+    config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    # "database" shares revocations across workers, "memory" keeps them per process
+    config["TOKEN_REVOCATION_BACKEND"] = os.environ.get(
+        "TOKEN_REVOCATION_BACKEND", "database"
+    )
+    config["TOKEN_REVOCATION_BLOOM"] = (
+        os.environ.get("TOKEN_REVOCATION_BLOOM", "false").lower() == "true"
+    )
+    config["TOKEN_REVOCATION_SYNC_SECONDS"] = float(
+        os.environ.get("TOKEN_REVOCATION_SYNC_SECONDS", "5")
+    )
+    config["RESPONSE_CACHE_SIZE"] = int(os.environ.get("RESPONSE_CACHE_SIZE", "1024"))
+    config["RESPONSE_CACHE_TTL"] = float(os.environ.get("RESPONSE_CACHE_TTL", "60"))
+    # "auto" uses Postgres full-text search when the database is Postgres and an
+    # in-process inverted index otherwise
+    config["SEARCH_BACKEND"] = os.environ.get("SEARCH_BACKEND", "auto")
+    config["SEARCH_SYNC_SECONDS"] = float(os.environ.get("SEARCH_SYNC_SECONDS", "5"))
+    # Grid cell size of the nearby-sites index, in degrees (about 11 km at 0.1)
+    config["GEO_CELL_DEGREES"] = float(os.environ.get("GEO_CELL_DEGREES", "0.1"))
+    config["GEO_SYNC_SECONDS"] = float(os.environ.get("GEO_SYNC_SECONDS", "5"))
+    # How long deletions are remembered for /sync; older tokens get a full resync
+    config["SYNC_TOMBSTONE_DAYS"] = float(os.environ.get("SYNC_TOMBSTONE_DAYS", "30"))
+    # Each sync token points this far before the sync it came from, so rows
+    # written by transactions still in flight at the time aren't missed
+    config["SYNC_OVERLAP_SECONDS"] = float(
+        os.environ.get("SYNC_OVERLAP_SECONDS", "5")
+    )
+    # Per-route latency, SQL and serialization metrics served at /metrics
+    config["METRICS_ENABLED"] = (
+        os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+    )
+    # Sent as X-Admin-Token to unlock admin-only features such as X-Profile;
+    # they stay off while it is unset
+    config["ADMIN_TOKEN"] = os.environ.get("ADMIN_TOKEN")
+    # Development and staging aids: log slow statements with their plans and
+    # repeated statements within a request (N+1), and check query budgets
+    config["QUERY_DEBUG"] = os.environ.get("QUERY_DEBUG", "false").lower() == "true"
+    config["SLOW_QUERY_MS"] = float(os.environ.get("SLOW_QUERY_MS", "100"))
+    config["N_PLUS_ONE_THRESHOLD"] = int(os.environ.get("N_PLUS_ONE_THRESHOLD", "5"))
+    # Raise instead of logging when a route goes over its query budget
+    config["QUERY_BUDGET_STRICT"] = (
+        os.environ.get("QUERY_BUDGET_STRICT", "false").lower() == "true"
+    )
+    # Passed to werkzeug's generate_password_hash; hashes made with anything else
+    # are replaced the next time their user logs in
+    config["PASSWORD_HASH_METHOD"] = os.environ.get(
+        "PASSWORD_HASH_METHOD", "pbkdf2:sha256:260000"
+    )
+    # Processes hashing passwords (0 hashes on the request thread), and how many
+    # hashes may be running or waiting before logins get 503 with Retry-After.
+    # Every web worker starts its own pool, so keep workers x web workers
+    # within the CPU count
+    config["PASSWORD_HASH_WORKERS"] = int(os.environ.get("PASSWORD_HASH_WORKERS", "1"))
+    config["PASSWORD_HASH_MAX_PENDING"] = int(
+        os.environ.get(
+            "PASSWORD_HASH_MAX_PENDING", str(4 * config["PASSWORD_HASH_WORKERS"])
+        )
+    )
+    config["PASSWORD_HASH_RETRY_AFTER"] = int(
+        os.environ.get("PASSWORD_HASH_RETRY_AFTER", "1")
+    )
+    return config
+
 
 # Define metadata, instantiate db
 metadata = MetaData(
     naming_convention={
         "fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s",
+        "ix": "ix_%(table_name)s_%(column_0_name)s",
     }
 )
 db = SQLAlchemy(metadata=metadata)
-migrate = Migrate(app, db)
-db.init_app(app)
 
-# Instantiate REST API
-api = Api(app)
+
+@event.listens_for(Engine, "connect")
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite ignores ON DELETE CASCADE unless foreign keys are switched on
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+
+def create_app(config=None, groups=None, cli=None):
+    """Build the Flask app.
+
+    `config` overrides settings(). `groups` names the resource groups in
+    resources.GROUPS to serve; the default is all of them, and an empty list
+    gives an app with just the database layer, for scripts that don't
+    serve HTTP and shouldn't import or set up the web stack. Migrations
+    and the other flask commands are wired up when `cli` is true, which
+    defaults to whether the app is being loaded by the flask command, so
+    web workers never import Alembic.
+    """
+    app = Flask(__name__)
+    app.config.update(settings())
+    app.config.update(config or {})
+    app.json.compact = True
+    db.init_app(app)
+
+    # Every app gets these: their session hooks keep the derived tables in
+    # step with each write, wherever it is made
+    import passwords
+    import rating_stats
+    import recommendations
+    import sync
+    import versions
+
+    passwords.init_app(app)
+
+    if cli is None:
+        cli = os.environ.get("FLASK_RUN_FROM_CLI") == "true"
+    if cli:
+        from flask_migrate import Migrate
+
+        Migrate(app, db)
+        app.cli.add_command(rating_stats.rebuild_command)
+        app.cli.add_command(recommendations.rebuild_command)
+        app.cli.add_command(sync.prune_command)
+
+    if groups is None or groups:
+        _init_web(app, groups)
+    return app
+
+
+def _init_web(app, groups):
+    from flask_cors import CORS
+    from flask_jwt_extended import JWTManager
+    from flask_restful import Api
+
+    import blacklist
+    import cache
+    import geo
+    import metrics
+    import querylog
+    import resources
+    import search
+
+    # The response cache and in-process indexes only matter to apps serving
+    # requests; their hooks skip commits made by apps without them
+    for module in (cache, geo, search):
+        module.init_app(app)
+    CORS(app, expose_headers=["Link", "ETag"])
+    blacklist.init_app(app, JWTManager(app))
+    metrics.init_app(app)
+    querylog.init_app(app)
+    api = Api(app)
+    resources.register(api, list(resources.GROUPS) if groups is None else groups)
+    app.extensions["api"] = api
@@ -0,0 +1,103 @@
+import csv
+import io
+from datetime import datetime
+
+from flask import Response
+from sqlalchemy import select
+from sqlalchemy_serializer import SerializerMixin
+
+from config import db
+from models import (
+    gmt_plus_3,
+    Activity,
+    Location,
+    Review,
+    Site,
+    SiteActivity,
+    UserActivity,
+)
+from serializers import dumps
+
+# Tables that can be dumped whole. Users are left out so password hashes
+# never leave the database
+EXPORTS = {
+    "reviews": Review,
+    "user_activities": UserActivity,
+    "site_activities": SiteActivity,
+    "sites": Site,
+    "locations": Location,
+    "activities": Activity,
+}
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+# Rows fetched from the cursor, and written out, at a time
+CHUNK_ROWS = 1000
+
+
+def updated_since(value):
+    """An ISO 8601 time; one without an offset is taken as Nairobi time."""
+    since = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if since.tzinfo is None:
+        return gmt_plus_3.localize(since)
+    # SQLite compares the stored local time as text
+    return since.astimezone(gmt_plus_3)
+
+
+def _value(value):
+    # Times are written the way the JSON API writes them
+    if isinstance(value, datetime):
+        return value.strftime(SerializerMixin.datetime_format)
+    return value
+
+
+def row_dict(keys, row):
+    """A selected row as it appears in an export, keyed by column name."""
+    return {key: _value(value) for key, value in zip(keys, row)}
+
+
+def _ndjson(columns, chunk):
+    keys = [column.key for column in columns]
+    return b"".join(dumps(row_dict(keys, row)) + b"\n" for row in chunk)
+
+
+def _csv(columns, chunk):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([_value(value) for value in row] for row in chunk)
+    return buffer.getvalue().encode()
+
+
+def export_response(resource, format, since=None):
+    """Stream every row of an exported table, in id order.
+
+    Rows are read straight into tuples through a server-side cursor on its
+    own connection, CHUNK_ROWS at a time, and each chunk is encoded and sent
+    before the next is fetched. No ORM objects are built and nothing holds
+    the whole table, so memory stays flat however many rows there are and
+    the first bytes go out as soon as the first chunk is read.
+    """
+    model = EXPORTS[resource]
+    columns = list(model.__table__.columns)
+    query = select(*columns).order_by(model.id)
+    if since is not None:
+        query = query.where(model.updated_at >= since)
+    encode = _ndjson if format == "ndjson" else _csv
+    # The response body is generated after the app context is gone
+    engine = db.engine
+
+    def generate():
+        if format == "csv":
+            yield _csv(columns, [[column.key for column in columns]])
+        with engine.connect() as connection:
+            result = connection.execution_options(
+                stream_results=True, yield_per=CHUNK_ROWS
+            ).execute(query)
+            for chunk in result.partitions():
+                yield encode(columns, chunk)
+
+    return Response(
+        generate(),
+        mimetype=FORMATS[format],
+        headers={
+            "Content-Disposition": f"attachment; filename={resource}.{format}"
+        },
+    )
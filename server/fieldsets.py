@@ -0,0 +1,193 @@
+from datetime import datetime
+
+from flask_restful import reqparse, abort
+from sqlalchemy import inspect
+from sqlalchemy.orm import joinedload, selectinload, load_only
+from sqlalchemy_serializer import SerializerMixin
+
+import serializers
+from loaders import association_loader, association_path
+from metrics import timed_serialization
+
+MAX_EXPAND_DEPTH = 3
+
+
+def _split(value):
+    return [part.strip() for part in value.split(",") if part.strip()]
+
+
+def _column_value(value):
+    # Same formatting SerializerMixin.to_dict() applies to datetimes
+    if isinstance(value, datetime):
+        return value.strftime(SerializerMixin.datetime_format)
+    return value
+
+
+class _Node:
+    """One model in the requested shape: its columns and expanded relationships."""
+
+    def __init__(self, model):
+        self.mapper = inspect(model)
+        self.columns = None
+        self.children = {}
+        # AssociationPath of each child reached through an association proxy
+        self.proxies = {}
+
+    def column_keys(self):
+        if self.columns is not None:
+            return self.columns
+        return [column.key for column in self.mapper.column_attrs]
+
+    def load_columns(self):
+        # Keys the relationship loaders need must be fetched even when not requested
+        keys = set(self.column_keys())
+        for relationship in self.mapper.relationships:
+            keys.update(column.key for column in relationship.local_columns)
+        return [self.mapper.attrs[key].class_attribute for key in sorted(keys)]
+
+    def options(self):
+        """Loader options fetching this node's columns and expansions."""
+        return (load_only(*self.load_columns()), *self._loaders(None))
+
+    def _loaders(self, parent_loader):
+        loaders = []
+        for key, child in self.children.items():
+            if key in self.proxies:
+                # Fetched separately, for every parent at once; see dump()
+                continue
+            relationship = self.mapper.relationships[key]
+            attribute = relationship.class_attribute
+            strategy = selectinload if relationship.uselist else joinedload
+            if parent_loader is None:
+                loader = strategy(attribute)
+            else:
+                loader = getattr(parent_loader, strategy.__name__)(attribute)
+            loaders.append(loader.load_only(*child.load_columns()))
+            loaders.extend(child._loaders(loader))
+        return loaders
+
+    def dump(self, obj):
+        data = {key: _column_value(getattr(obj, key)) for key in self.column_keys()}
+        for key, child in self.children.items():
+            if key in self.proxies:
+                value = association_loader().load(obj, key, child.options())
+            else:
+                value = getattr(obj, key)
+            if isinstance(value, list):
+                data[key] = [child.dump(item) for item in value]
+            else:
+                data[key] = child.dump(value) if value is not None else None
+        return data
+
+
+class Fieldset:
+    """Response shape for a read endpoint.
+
+    Without `?fields=` or `?expand=` the model's full to_dict() shape is
+    produced by its compiled serializer with its default loading plan.
+    Otherwise only the requested columns and relationships are serialized,
+    and the query loads exactly those: `load_only` for columns and one eager
+    loader per expansion. `?fields=` may also name the model's
+    `computed_fields`, which the view adds itself when wants() says so.
+    """
+
+    def __init__(self, plan, root=None, computed=frozenset()):
+        self.plan = plan
+        self.root = root
+        self.computed = computed
+
+    @classmethod
+    def from_request(cls, model, plan):
+        parser = reqparse.RequestParser()
+        parser.add_argument("fields", type=str, location="args")
+        parser.add_argument("expand", type=str, location="args")
+        args = parser.parse_args()
+        if not args["fields"] and not args["expand"]:
+            return cls(plan)
+
+        root = _Node(model)
+        for path in _split(args["expand"] or ""):
+            keys = path.split(".")
+            if len(keys) > MAX_EXPAND_DEPTH:
+                abort(
+                    400, message=f"Cannot expand more than {MAX_EXPAND_DEPTH} levels"
+                )
+            node = root
+            for key in keys:
+                if key not in node.children:
+                    relationship = node.mapper.relationships.get(key)
+                    proxy = association_path(node.mapper.class_, key)
+                    if relationship is not None:
+                        node.children[key] = _Node(relationship.mapper.class_)
+                    elif proxy is not None:
+                        node.children[key] = _Node(proxy.target)
+                        node.proxies[key] = proxy
+                    else:
+                        abort(
+                            400,
+                            message=f"Cannot expand unknown relationship '{path}'",
+                        )
+                node = node.children[key]
+
+        computed = set()
+        for path in _split(args["fields"] or ""):
+            *keys, column = path.split(".")
+            if not keys and column in getattr(model, "computed_fields", ()):
+                computed.add(column)
+                if root.columns is None:
+                    root.columns = []
+                continue
+            node = root
+            for key in keys:
+                node = node.children.get(key)
+                if node is None:
+                    abort(
+                        400,
+                        message=f"Field '{path}' is not on an expanded relationship",
+                    )
+            if column not in node.mapper.column_attrs:
+                abort(400, message=f"Unknown field '{path}'")
+            if node.columns is None:
+                node.columns = []
+            node.columns.append(column)
+
+        return cls(plan, root, frozenset(computed))
+
+    def wants(self, field):
+        """Whether the response should carry the computed `field`."""
+        return self.root is None or field in self.computed
+
+    @property
+    def options(self):
+        if self.root is None:
+            return self.plan
+        return self.root.options()
+
+    def models(self, model):
+        """Models whose rows can appear in this response."""
+        if self.root is None:
+            return serializers.models_reached(model)
+        reached, nodes = set(), [self.root]
+        while nodes:
+            node = nodes.pop()
+            reached.add(node.mapper.class_)
+            reached.update(proxy.link for proxy in node.proxies.values())
+            nodes.extend(node.children.values())
+        if self.computed:
+            tables = {
+                table
+                for field in self.computed
+                for table in model.computed_fields[field]
+            }
+            reached.update(
+                mapper.class_
+                for mapper in model.registry.mappers
+                if mapper.local_table.name in tables
+            )
+        return reached
+
+    @timed_serialization
+    def dump(self, obj):
+        if self.root is None:
+            return serializers.dump(obj)
+        return self.root.dump(obj)
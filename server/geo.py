@@ -0,0 +1,242 @@
+import heapq
+import math
+import threading
+import time
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from werkzeug.local import LocalProxy
+
+from cascades import on_cascade
+from config import db
+from models import now_gmt_plus_3, Site
+from sync import deleted_since
+from versions import table_versions
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def _hav(radians):
+    return math.sin(radians / 2) ** 2
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    h = _hav(phi2 - phi1) + math.cos(phi1) * math.cos(phi2) * _hav(
+        math.radians(lng2 - lng1)
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, h)))
+
+
+class GridIndex:
+    """Site coordinates bucketed into a latitude/longitude grid.
+
+    A nearest-sites query visits cells best first, ordered by a lower bound
+    on the distance from the query point to anything inside them, and stops
+    once the next cell can't beat the `limit`th site found or lies beyond
+    the radius. Only the cells around the point are read, so the cost
+    depends on how many sites are nearby rather than on the table size.
+
+    Like search.InvertedIndex, the grid loads on first use, applies commits
+    made through this process's sessions, and catches up with other workers
+    at most once every `sync_seconds`: when the sites table's version has
+    moved, it reads the sites written and the tombstones left since the last
+    check, reaching `overlap_seconds` further back for transactions that
+    were still in flight.
+    """
+
+    def __init__(self, cell_degrees=0.1, sync_seconds=5.0, overlap_seconds=5.0):
+        self.cell_degrees = cell_degrees
+        self.sync_seconds = sync_seconds
+        self.overlap_seconds = overlap_seconds
+        # The cell size should divide 180 so the columns wrap at the antimeridian
+        self.rows = round(180 / cell_degrees)
+        self.columns = round(360 / cell_degrees)
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._synced_at = 0.0
+        self._checked_at = None
+        self._version = None
+        self._clear()
+
+    def _clear(self):
+        self._cells = {}
+        self._points = {}
+
+    def _cell(self, lat, lng):
+        row = min(int((lat + 90) / self.cell_degrees), self.rows - 1)
+        column = int((lng + 180) / self.cell_degrees) % self.columns
+        return row, column
+
+    # Writes
+
+    def add(self, id, lat, lng):
+        with self._lock:
+            self.remove(id)
+            if lat is None or lng is None:
+                return
+            cell = self._cell(lat, lng)
+            self._cells.setdefault(cell, {})[id] = (lat, lng)
+            self._points[id] = cell
+
+    def remove(self, id):
+        with self._lock:
+            cell = self._points.pop(id, None)
+            if cell is None:
+                return
+            points = self._cells[cell]
+            del points[id]
+            if not points:
+                del self._cells[cell]
+
+    def apply(self, changes):
+        with self._lock:
+            if not self._loaded:
+                return
+            for id, coordinates in changes:
+                if coordinates is None:
+                    self.remove(id)
+                else:
+                    self.add(id, *coordinates)
+
+    # Loading
+
+    def _load(self, since=None):
+        query = select(Site.id, Site.latitude, Site.longitude)
+        if since is not None:
+            query = query.where(Site.updated_at >= since)
+        for id, lat, lng in db.session.execute(query):
+            self.add(id, lat, lng)
+
+    def _sync(self):
+        now = time.monotonic()
+        if self._loaded and now - self._synced_at < self.sync_seconds:
+            return
+        with self._lock:
+            checked_at = now_gmt_plus_3()
+            [(_, version, _)] = table_versions([Site])
+            if not self._loaded:
+                self._load()
+            elif version != self._version:
+                since = self._checked_at - timedelta(seconds=self.overlap_seconds)
+                deleted = deleted_since([Site], since)
+                if deleted is None:
+                    self._clear()
+                    self._load()
+                else:
+                    # Deletions first, as an id deleted and reused is current
+                    for id in deleted[Site.__tablename__]:
+                        self.remove(id)
+                    self._load(since=since)
+            self._version = version
+            self._checked_at = checked_at
+            self._loaded = True
+            self._synced_at = now
+
+    # Queries
+
+    def _lower_bound_km(self, lat, lng, row, column):
+        """Shortest possible distance from (lat, lng) to a point in a cell.
+
+        hav(d) = hav(dlat) + cos(lat1) cos(lat2) hav(dlng), so the smallest
+        latitude and longitude gaps to the cell, with the smaller cosine of
+        its two edges, give a bound that never overestimates.
+        """
+        south = row * self.cell_degrees - 90
+        north = min(south + self.cell_degrees, 90)
+        west = column * self.cell_degrees - 180
+        dlat = max(south - lat, lat - north, 0)
+        dlng = (lng - west) % 360
+        if dlng > self.cell_degrees:
+            dlng = min(dlng - self.cell_degrees, 360 - dlng)
+        else:
+            dlng = 0
+        cosine = min(math.cos(math.radians(south)), math.cos(math.radians(north)))
+        h = _hav(math.radians(dlat)) + math.cos(math.radians(lat)) * max(
+            cosine, 0
+        ) * _hav(math.radians(dlng))
+        return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, h)))
+
+    def nearest(self, lat, lng, radius_km, limit):
+        """(site id, distance in km) of up to `limit` sites, closest first."""
+        self._sync()
+        with self._lock:
+            start = self._cell(lat, lng)
+            frontier = [(0.0, start)]
+            queued = {start}
+            # Max-heap of the closest sites so far, as (-distance, -id)
+            best = []
+            while frontier:
+                bound, (row, column) = heapq.heappop(frontier)
+                if bound > radius_km or (len(best) == limit and bound > -best[0][0]):
+                    break
+                for id, point in self._cells.get((row, column), {}).items():
+                    distance = haversine_km(lat, lng, *point)
+                    if distance > radius_km:
+                        continue
+                    if len(best) < limit:
+                        heapq.heappush(best, (-distance, -id))
+                    elif (-distance, -id) > best[0]:
+                        heapq.heapreplace(best, (-distance, -id))
+                for next_row, next_column in (
+                    (row - 1, column),
+                    (row + 1, column),
+                    (row, (column - 1) % self.columns),
+                    (row, (column + 1) % self.columns),
+                ):
+                    cell = (next_row, next_column)
+                    if 0 <= next_row < self.rows and cell not in queued:
+                        queued.add(cell)
+                        heapq.heappush(
+                            frontier,
+                            (self._lower_bound_km(lat, lng, *cell), cell),
+                        )
+            return [
+                (-negative_id, -negative_distance)
+                for negative_distance, negative_id in sorted(best, reverse=True)
+            ]
+
+
+def init_app(app):
+    app.extensions["site_locator"] = GridIndex(
+        cell_degrees=app.config["GEO_CELL_DEGREES"],
+        sync_seconds=app.config["GEO_SYNC_SECONDS"],
+        overlap_seconds=app.config["SYNC_OVERLAP_SECONDS"],
+    )
+
+
+# The current app's index
+site_locator = LocalProxy(lambda: current_app.extensions["site_locator"])
+
+
+@on_cascade
+def _collect_cascaded_sites(session, cascaded):
+    if cascaded[Site]:
+        session.info.setdefault("geo_changes", []).extend(
+            (id, None) for id in cascaded[Site]
+        )
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_geo_changes(session, flush_context):
+    changes = session.info.setdefault("geo_changes", [])
+    for obj in (*session.new, *session.dirty):
+        if isinstance(obj, Site) and obj not in session.deleted:
+            changes.append((obj.id, (obj.latitude, obj.longitude)))
+    for obj in session.deleted:
+        if isinstance(obj, Site):
+            changes.append((obj.id, None))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_geo_changes(session):
+    changes = session.info.pop("geo_changes", None)
+    if changes and "site_locator" in current_app.extensions:
+        site_locator.apply(changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_geo_changes(session):
+    session.info.pop("geo_changes", None)
@@ -0,0 +1,143 @@
+from collections import defaultdict
+from functools import cache
+
+from flask import has_request_context, request
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.associationproxy import AssociationProxyExtensionType
+from sqlalchemy.orm import Session
+
+from config import db
+
+# Most parent ids sent in one IN list
+MAX_BATCH = 1000
+
+
+class AssociationPath:
+    """How one association_proxy reaches its targets: parent -> link rows
+    -> target, e.g. User.activities through user_activities."""
+
+    def __init__(self, model, name, proxy):
+        link_relationship = inspect(model).relationships[proxy.target_collection]
+        (self.parent_key,) = link_relationship.remote_side
+        self.model = model
+        self.name = name
+        self.link = link_relationship.mapper.class_
+        target_relationship = inspect(self.link).relationships[proxy.value_attr]
+        self.target = target_relationship.mapper.class_
+        self.join = target_relationship.class_attribute
+
+    def query(self, parent_ids, options=()):
+        """(parent id, target) for every link row of the given parents, in
+        link order, so each parent's list matches what the proxy yields.
+        `options` are loader options for the targets."""
+        return (
+            select(self.parent_key, self.target)
+            .options(*options)
+            .select_from(self.link)
+            .join(self.join)
+            .where(self.parent_key.in_(parent_ids))
+            .order_by(*inspect(self.link).primary_key)
+        )
+
+
+@cache
+def _association_paths():
+    # Built on first use, once every model is mapped
+    paths = {}
+    for mapper in db.Model.registry.mappers:
+        for name, descriptor in mapper.all_orm_descriptors.items():
+            if (
+                descriptor.extension_type
+                is AssociationProxyExtensionType.ASSOCIATION_PROXY
+            ):
+                proxy = getattr(mapper.class_, name)
+                paths[mapper.class_, name] = AssociationPath(mapper.class_, name, proxy)
+    return paths
+
+
+@cache
+def _parent_models():
+    return frozenset(model for model, _ in _association_paths())
+
+
+def association_path(model, name):
+    """The AssociationPath of `model.name`, or None if it isn't a proxy."""
+    return _association_paths().get((model, name))
+
+
+class AssociationLoader:
+    """Resolves association proxies for many parents at once.
+
+    Reading `user.activities` walks the user's link rows lazily, so a page
+    of N users costs N queries or more. Here the first lookup for any
+    parent fetches the targets of every parent of that model the loader
+    knows about, the requested one included, with one IN query per proxy,
+    and later lookups are answered from memory. Within a request the loader
+    learns about parents as the ORM loads them, so a page's rows are all
+    resolved together however they are visited.
+    """
+
+    def __init__(self):
+        # model -> {id: parent} of rows seen but maybe not yet resolved
+        self._pending = defaultdict(dict)
+        # (model, proxy name) -> {parent id: [targets]}
+        self._resolved = defaultdict(dict)
+
+    def add(self, obj):
+        self._pending[type(obj)][obj.id] = obj
+
+    def load(self, obj, name, options=()):
+        """The targets of `obj.name`, as a list."""
+        return self.load_many(type(obj), name, [obj], options)[0]
+
+    def load_many(self, model, name, parents, options=()):
+        """The targets of `name` for each of `parents`, in order.
+
+        `options` (loader options for the targets) only apply to the query
+        that first resolves a parent; later lookups reuse its objects.
+        """
+        path = association_path(model, name)
+        if path is None:
+            raise AttributeError(
+                f"{model.__name__}.{name} is not an association proxy"
+            )
+        resolved = self._resolved[model, name]
+        missing = {parent.id for parent in parents if parent.id not in resolved}
+        if missing:
+            missing.update(id for id in self._pending[model] if id not in resolved)
+            targets = {id: [] for id in missing}
+            ids = sorted(missing)
+            for start in range(0, len(ids), MAX_BATCH):
+                query = path.query(ids[start : start + MAX_BATCH], options)
+                for parent_id, target in db.session.execute(query):
+                    targets[parent_id].append(target)
+            resolved.update(targets)
+        return [resolved[parent.id] for parent in parents]
+
+    def clear(self):
+        self._resolved.clear()
+
+
+def association_loader():
+    """The current request's AssociationLoader; outside a request, a new one."""
+    if not has_request_context():
+        return AssociationLoader()
+    loader = request.environ.get("loaders.association")
+    if loader is None:
+        loader = request.environ["loaders.association"] = AssociationLoader()
+    return loader
+
+
+@event.listens_for(db.Model, "load", propagate=True)
+def _remember_parent(obj, context):
+    if type(obj) in _parent_models() and has_request_context():
+        association_loader().add(obj)
+
+
+@event.listens_for(Session, "after_flush")
+def _forget_resolved(session, flush_context):
+    # Link rows may have just changed; later lookups read them again
+    if has_request_context():
+        loader = request.environ.get("loaders.association")
+        if loader is not None:
+            loader.clear()
@@ -0,0 +1,272 @@
+import contextvars
+import cProfile
+import hmac
+import io
+import pstats
+import threading
+import time
+from functools import wraps
+
+from flask import Response, current_app, jsonify, make_response, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+try:
+    from pyinstrument import Profiler
+except ImportError:  # pragma: no cover - pyinstrument is optional
+    Profiler = None
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Upper bounds of the statements-per-request histogram buckets
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+# Lines of cProfile output returned for a profiled request
+PROFILE_LINES = 60
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+class Sample:
+    """What one request spent, filled in as it runs."""
+
+    __slots__ = ("started", "statements", "sql_seconds", "serialization", "depth")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.sql_seconds = 0.0
+        self.serialization = 0.0
+        # Nesting of timed serializer calls, so only the outermost counts
+        self.depth = 0
+
+
+class Registry:
+    """Per-endpoint request metrics, kept in process and rendered for
+    Prometheus. Nothing is shared between processes: /metrics reports
+    whichever worker answered it, so the figures are only complete when the
+    app runs in a single worker process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._requests = {}
+            self._latency = {}
+            self._statements = {}
+            self._sql_seconds = {}
+            self._serialization = {}
+
+    def record(self, endpoint, method, status, sample):
+        key = (endpoint, method)
+        with self._lock:
+            status_key = (endpoint, method, status)
+            self._requests[status_key] = self._requests.get(status_key, 0) + 1
+            if key not in self._latency:
+                self._latency[key] = Histogram(LATENCY_BUCKETS)
+                self._statements[key] = Histogram(STATEMENT_BUCKETS)
+                self._sql_seconds[key] = 0.0
+                self._serialization[key] = 0.0
+            self._latency[key].observe(time.perf_counter() - sample.started)
+            self._statements[key].observe(sample.statements)
+            self._sql_seconds[key] += sample.sql_seconds
+            self._serialization[key] += sample.serialization
+
+    def render(self):
+        """The metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            lines.append("# TYPE safiri_http_requests_total counter")
+            for (endpoint, method, status), count in sorted(self._requests.items()):
+                labels = _labels(endpoint=endpoint, method=method, status=status)
+                lines.append(f"safiri_http_requests_total{{{labels}}} {count}")
+            _histogram(lines, "safiri_http_request_duration_seconds", self._latency)
+            _histogram(lines, "safiri_sql_statements_per_request", self._statements)
+            for name, totals in (
+                ("safiri_sql_duration_seconds_total", self._sql_seconds),
+                ("safiri_serialization_seconds_total", self._serialization),
+            ):
+                lines.append(f"# TYPE {name} counter")
+                for (endpoint, method), total in sorted(totals.items()):
+                    labels = _labels(endpoint=endpoint, method=method)
+                    lines.append(f"{name}{{{labels}}} {total:.6f}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+
+
+def _histogram(lines, name, histograms):
+    lines.append(f"# TYPE {name} histogram")
+    for (endpoint, method), histogram in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            labels = _labels(endpoint=endpoint, method=method, le=bound)
+            lines.append(f"{name}_bucket{{{labels}}} {cumulative}")
+        labels = _labels(endpoint=endpoint, method=method, le="+Inf")
+        lines.append(f"{name}_bucket{{{labels}}} {histogram.count}")
+        labels = _labels(endpoint=endpoint, method=method)
+        lines.append(f"{name}_sum{{{labels}}} {histogram.sum:.6f}")
+        lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+
+registry = Registry()
+# The current request's Sample; a context variable is cheaper to reach from
+# the per-statement and per-row hooks than flask.g
+_sample = contextvars.ContextVar("metrics_sample", default=None)
+
+
+def timed_serialization(function):
+    """Add the time spent in `function` to the request's serialization time."""
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        sample = _sample.get()
+        if sample is None:
+            return function(*args, **kwargs)
+        sample.depth += 1
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            sample.depth -= 1
+            if not sample.depth:
+                sample.serialization += time.perf_counter() - started
+
+    return wrapper
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_statement(conn, cursor, statement, parameters, context, executemany):
+    if _sample.get() is not None:
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _finish_statement(conn, cursor, statement, parameters, context, executemany):
+    sample = _sample.get()
+    started = conn.info.get("metrics_started")
+    if sample is not None and started:
+        sample.statements += 1
+        sample.sql_seconds += time.perf_counter() - started.pop()
+
+
+def is_admin():
+    """Whether the request carries X-Admin-Token matching ADMIN_TOKEN; never
+    while ADMIN_TOKEN is unset."""
+    token = current_app.config["ADMIN_TOKEN"]
+    given = request.headers.get("X-Admin-Token", "")
+    return bool(token) and hmac.compare_digest(given.encode(), token.encode())
+
+
+def admin_only(view):
+    """Answer 403 unless the request comes with the admin token."""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not is_admin():
+            return make_response(jsonify({"error": "Needs an admin token"}), 403)
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def _profile_requested():
+    """The profiler a request asked for with X-Profile, if its token is good."""
+    mode = request.headers.get("X-Profile")
+    if not mode:
+        return None
+    if not is_admin():
+        return make_response(
+            jsonify({"error": "Profiling needs an admin token"}), 403
+        )
+    if mode == "pyinstrument":
+        if Profiler is None:
+            return make_response(
+                jsonify({"error": "pyinstrument is not installed"}), 400
+            )
+        return Profiler()
+    if mode == "cprofile":
+        return cProfile.Profile()
+    return make_response(jsonify({"error": f"Unknown profiler '{mode}'"}), 400)
+
+
+def _stop(profiler):
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+        output = io.StringIO()
+        stats = pstats.Stats(profiler, stream=output)
+        stats.sort_stats("cumulative").print_stats(PROFILE_LINES)
+        return output.getvalue()
+    profiler.stop()
+    return profiler.output_text()
+
+
+def _record(status):
+    token = request.environ.pop("metrics.token", None)
+    if token is None:
+        return
+    rule = request.url_rule.rule if request.url_rule else "unmatched"
+    registry.record(rule, request.method, status, _sample.get())
+    _sample.reset(token)
+
+
+def _start_request():
+    if current_app.config["METRICS_ENABLED"]:
+        request.environ["metrics.token"] = _sample.set(Sample())
+    profiler = _profile_requested()
+    if isinstance(profiler, Response):
+        return profiler
+    if profiler is not None:
+        request.environ["metrics.profiler"] = profiler
+        if isinstance(profiler, cProfile.Profile):
+            profiler.enable()
+        else:
+            profiler.start()
+    return None
+
+
+def _finish_request(response):
+    profiler = request.environ.pop("metrics.profiler", None)
+    if profiler is not None:
+        # The profile replaces the body; the request's own status goes along
+        profiled = Response(_stop(profiler), mimetype="text/plain")
+        profiled.headers["X-Profiled-Status"] = str(response.status_code)
+        response = profiled
+    _record(response.status_code)
+    return response
+
+
+def _teardown_request(error):
+    # after_request is skipped when a view raises; count it as a 500
+    profiler = request.environ.pop("metrics.profiler", None)
+    if profiler is not None:
+        _stop(profiler)
+    _record(500)
+
+
+def init_app(app):
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_teardown_request)
@@ -0,0 +1,30 @@
+"""Adds coordinates to locations and sites
+
+Revision ID: 1e7b3c9f5a26
+Revises: 9a4f2c6e1d85
+Create Date: 2026-10-18 20:31:52.704913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1e7b3c9f5a26'
+down_revision = '9a4f2c6e1d85'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('locations', 'sites'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('latitude', sa.Float(), nullable=True))
+            batch_op.add_column(sa.Column('longitude', sa.Float(), nullable=True))
+
+
+def downgrade():
+    for table in ('sites', 'locations'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('longitude')
+            batch_op.drop_column('latitude')
@@ -0,0 +1,24 @@
+"""Adds reviews site_id, id index
+
+Revision ID: 2b6e8d4f1a97
+Revises: 7d5f1a3c8e62
+Create Date: 2026-10-19 10:12:44.301958
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2b6e8d4f1a97'
+down_revision = '7d5f1a3c8e62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_reviews_site_id_id', 'reviews', ['site_id', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_reviews_site_id_id', table_name='reviews')
@@ -0,0 +1,48 @@
+"""Adds foreign key and filter indexes
+
+Revision ID: 5c9e0b7f4a21
+Revises: d2a8f61c3e17
+Create Date: 2026-10-18 17:21:05.318842
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c9e0b7f4a21'
+down_revision = 'd2a8f61c3e17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(op.f('ix_profiles_user_id'), 'profiles', ['user_id'], unique=False)
+    op.create_index(op.f('ix_user_activities_user_id'), 'user_activities', ['user_id'], unique=False)
+    op.create_index(op.f('ix_user_activities_activity_id'), 'user_activities', ['activity_id'], unique=False)
+    op.create_index('ix_reviews_site_id_created_at', 'reviews', ['site_id', 'created_at'], unique=False)
+    op.create_index('ix_reviews_user_id_created_at', 'reviews', ['user_id', 'created_at'], unique=False)
+    op.create_index(op.f('ix_activities_category'), 'activities', ['category'], unique=False)
+    op.create_index(op.f('ix_site_activities_activity_id'), 'site_activities', ['activity_id'], unique=False)
+    op.create_index(op.f('ix_sites_category'), 'sites', ['category'], unique=False)
+    op.create_index(op.f('ix_sites_location_id'), 'sites', ['location_id'], unique=False)
+
+    # Keep the oldest of any duplicate pairs so the unique index can be built
+    op.execute(
+        'DELETE FROM site_activities WHERE id NOT IN ('
+        'SELECT MIN(id) FROM site_activities GROUP BY site_id, activity_id)'
+    )
+    op.create_index('uq_site_activities_site_id_activity_id', 'site_activities', ['site_id', 'activity_id'], unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_site_activities_site_id_activity_id', table_name='site_activities')
+    op.drop_index(op.f('ix_sites_location_id'), table_name='sites')
+    op.drop_index(op.f('ix_sites_category'), table_name='sites')
+    op.drop_index(op.f('ix_site_activities_activity_id'), table_name='site_activities')
+    op.drop_index(op.f('ix_activities_category'), table_name='activities')
+    op.drop_index('ix_reviews_user_id_created_at', table_name='reviews')
+    op.drop_index('ix_reviews_site_id_created_at', table_name='reviews')
+    op.drop_index(op.f('ix_user_activities_activity_id'), table_name='user_activities')
+    op.drop_index(op.f('ix_user_activities_user_id'), table_name='user_activities')
+    op.drop_index(op.f('ix_profiles_user_id'), table_name='profiles')
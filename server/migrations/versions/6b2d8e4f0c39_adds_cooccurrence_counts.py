@@ -0,0 +1,64 @@
+"""Adds activity and site co-occurrence counts
+
+Revision ID: 6b2d8e4f0c39
+Revises: 1e7b3c9f5a26
+Create Date: 2026-10-18 21:47:10.226384
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6b2d8e4f0c39'
+down_revision = '1e7b3c9f5a26'
+branch_labels = None
+depends_on = None
+
+# Matches recommendations.LIKED_RATING
+LIKED_RATING = 7
+
+
+def upgrade():
+    op.create_table('activity_cooccurrences',
+    sa.Column('activity_id', sa.Integer(), nullable=False),
+    sa.Column('other_activity_id', sa.Integer(), nullable=False),
+    sa.Column('users', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['activity_id'], ['activities.id'], name=op.f('fk_activity_cooccurrences_activity_id_activities'), ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['other_activity_id'], ['activities.id'], name=op.f('fk_activity_cooccurrences_other_activity_id_activities'), ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('activity_id', 'other_activity_id')
+    )
+    op.create_index('ix_activity_cooccurrences_activity_id_users', 'activity_cooccurrences', ['activity_id', 'users'], unique=False)
+    op.create_index(op.f('ix_activity_cooccurrences_other_activity_id'), 'activity_cooccurrences', ['other_activity_id'], unique=False)
+    op.create_table('site_cooccurrences',
+    sa.Column('site_id', sa.Integer(), nullable=False),
+    sa.Column('other_site_id', sa.Integer(), nullable=False),
+    sa.Column('users', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['site_id'], ['sites.id'], name=op.f('fk_site_cooccurrences_site_id_sites'), ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['other_site_id'], ['sites.id'], name=op.f('fk_site_cooccurrences_other_site_id_sites'), ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('site_id', 'other_site_id')
+    )
+    op.create_index('ix_site_cooccurrences_site_id_users', 'site_cooccurrences', ['site_id', 'users'], unique=False)
+    op.create_index(op.f('ix_site_cooccurrences_other_site_id'), 'site_cooccurrences', ['other_site_id'], unique=False)
+
+    # Backfill from existing rows; the app keeps the counts current from here on
+    for table, item, source, condition in (
+        ('activity_cooccurrences', 'activity_id', 'user_activities', 'TRUE'),
+        ('site_cooccurrences', 'site_id', 'reviews', f'rating >= {LIKED_RATING}'),
+    ):
+        have = f'(SELECT DISTINCT user_id, {item} FROM {source} WHERE {condition})'
+        op.execute(
+            f'INSERT INTO {table} ({item}, other_{item}, users) '
+            f'SELECT a.{item}, b.{item}, COUNT(*) FROM {have} AS a '
+            f'JOIN {have} AS b ON b.user_id = a.user_id '
+            f'GROUP BY a.{item}, b.{item}'
+        )
+
+
+def downgrade():
+    op.drop_index(op.f('ix_site_cooccurrences_other_site_id'), table_name='site_cooccurrences')
+    op.drop_index('ix_site_cooccurrences_site_id_users', table_name='site_cooccurrences')
+    op.drop_table('site_cooccurrences')
+    op.drop_index(op.f('ix_activity_cooccurrences_other_activity_id'), table_name='activity_cooccurrences')
+    op.drop_index('ix_activity_cooccurrences_activity_id_users', table_name='activity_cooccurrences')
+    op.drop_table('activity_cooccurrences')
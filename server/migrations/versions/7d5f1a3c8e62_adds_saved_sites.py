@@ -0,0 +1,44 @@
+"""Adds saved sites
+
+Revision ID: 7d5f1a3c8e62
+Revises: 4c8a2e6f9d13
+Create Date: 2026-10-18 23:48:02.915634
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d5f1a3c8e62'
+down_revision = '4c8a2e6f9d13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('saved_sites',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('site_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], name=op.f('fk_saved_sites_user_id_users'), ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['site_id'], ['sites.id'], name=op.f('fk_saved_sites_site_id_sites'), ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'site_id')
+    )
+    op.create_index(op.f('ix_saved_sites_site_id'), 'saved_sites', ['site_id'], unique=False)
+    op.create_index(op.f('ix_saved_sites_updated_at'), 'saved_sites', ['updated_at'], unique=False)
+
+    # A single flag on the site can't say who saved it; it is computed per
+    # user from saved_sites now
+    with op.batch_alter_table('sites', schema=None) as batch_op:
+        batch_op.drop_column('is_saved')
+
+
+def downgrade():
+    with op.batch_alter_table('sites', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('is_saved', sa.Boolean(), nullable=True))
+
+    op.drop_index(op.f('ix_saved_sites_updated_at'), table_name='saved_sites')
+    op.drop_index(op.f('ix_saved_sites_site_id'), table_name='saved_sites')
+    op.drop_table('saved_sites')
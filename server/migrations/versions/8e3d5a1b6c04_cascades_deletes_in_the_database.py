@@ -0,0 +1,43 @@
+"""Cascades deletes in the database
+
+Revision ID: 8e3d5a1b6c04
+Revises: 5c9e0b7f4a21
+Create Date: 2026-10-18 18:02:44.907215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e3d5a1b6c04'
+down_revision = '5c9e0b7f4a21'
+branch_labels = None
+depends_on = None
+
+# (table, column, referred table) of every foreign key that cascades
+FOREIGN_KEYS = [
+    ('profiles', 'user_id', 'users'),
+    ('user_activities', 'user_id', 'users'),
+    ('user_activities', 'activity_id', 'activities'),
+    ('reviews', 'user_id', 'users'),
+    ('reviews', 'site_id', 'sites'),
+    ('site_activities', 'activity_id', 'activities'),
+    ('site_activities', 'site_id', 'sites'),
+    ('sites', 'location_id', 'locations'),
+]
+
+
+def _recreate_foreign_keys(ondelete):
+    for table, column, referred in FOREIGN_KEYS:
+        name = op.f(f'fk_{table}_{column}_{referred}')
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, referred, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    _recreate_foreign_keys('CASCADE')
+
+
+def downgrade():
+    _recreate_foreign_keys(None)
@@ -0,0 +1,57 @@
+"""Adds search vectors
+
+Revision ID: 9a4f2c6e1d85
+Revises: 8e3d5a1b6c04
+Create Date: 2026-10-18 19:14:06.318452
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4f2c6e1d85'
+down_revision = '8e3d5a1b6c04'
+branch_labels = None
+depends_on = None
+
+# Searchable columns of each table with their tsvector weight; A is the name,
+# which is what autocomplete matches on
+SEARCH_COLUMNS = {
+    'sites': [('name', 'A'), ('category', 'B'), ('description', 'C')],
+    'locations': [('name', 'A'), ('description', 'C')],
+    'activities': [('name', 'A'), ('category', 'B')],
+}
+
+
+def search_vector(columns):
+    return ' || '.join(
+        f"setweight(to_tsvector('english', coalesce({column}, '')), '{weight}')"
+        for column, weight in columns
+    )
+
+
+def upgrade():
+    # Only Postgres has tsvector; other databases use the in-process index
+    if op.get_context().dialect.name != 'postgresql':
+        return
+    for table, columns in SEARCH_COLUMNS.items():
+        op.execute(
+            f'ALTER TABLE {table} ADD COLUMN search_vector tsvector '
+            f'GENERATED ALWAYS AS ({search_vector(columns)}) STORED'
+        )
+        op.create_index(
+            op.f(f'ix_{table}_search_vector'),
+            table,
+            ['search_vector'],
+            unique=False,
+            postgresql_using='gin',
+        )
+
+
+def downgrade():
+    if op.get_context().dialect.name != 'postgresql':
+        return
+    for table in reversed(list(SEARCH_COLUMNS)):
+        op.drop_index(op.f(f'ix_{table}_search_vector'), table_name=table)
+        op.drop_column(table, 'search_vector')
@@ -0,0 +1,29 @@
+"""Adds table_versions
+
+Revision ID: 9e3c7b5a1d48
+Revises: 2b6e8d4f1a97
+Create Date: 2026-10-19 14:26:03.118524
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e3c7b5a1d48'
+down_revision = '2b6e8d4f1a97'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('table_versions',
+    sa.Column('table_name', sa.String(length=64), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('table_name')
+    )
+
+
+def downgrade():
+    op.drop_table('table_versions')
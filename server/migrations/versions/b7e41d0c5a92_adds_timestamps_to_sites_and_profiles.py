@@ -0,0 +1,47 @@
+"""Adds timestamps to sites and profiles, indexes updated_at
+
+Revision ID: b7e41d0c5a92
+Revises: 3f1c2a7d9b40
+Create Date: 2026-10-18 11:04:17.558120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e41d0c5a92'
+down_revision = '3f1c2a7d9b40'
+branch_labels = None
+depends_on = None
+
+TABLES = (
+    'activities',
+    'locations',
+    'users',
+    'profiles',
+    'sites',
+    'user_activities',
+    'reviews',
+    'site_activities',
+)
+
+
+def upgrade():
+    for table in ('profiles', 'sites'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True))
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True))
+
+    for table in TABLES:
+        op.create_index(op.f(f'ix_{table}_updated_at'), table, ['updated_at'], unique=False)
+
+
+def downgrade():
+    for table in TABLES:
+        op.drop_index(op.f(f'ix_{table}_updated_at'), table_name=table)
+
+    for table in ('sites', 'profiles'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('updated_at')
+            batch_op.drop_column('created_at')
@@ -0,0 +1,45 @@
+"""Adds site_rating_stats
+
+Revision ID: d2a8f61c3e17
+Revises: b7e41d0c5a92
+Create Date: 2026-10-18 14:03:27.551902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a8f61c3e17'
+down_revision = 'b7e41d0c5a92'
+branch_labels = None
+depends_on = None
+
+RATINGS = range(1, 11)
+
+
+def upgrade():
+    op.create_table('site_rating_stats',
+    sa.Column('site_id', sa.Integer(), nullable=False),
+    sa.Column('review_count', sa.Integer(), nullable=False),
+    sa.Column('rating_sum', sa.Integer(), nullable=False),
+    *[sa.Column(f'rating_{rating}', sa.Integer(), nullable=False) for rating in RATINGS],
+    sa.ForeignKeyConstraint(['site_id'], ['sites.id'], name=op.f('fk_site_rating_stats_site_id_sites'), ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('site_id')
+    )
+    # Backfill from existing reviews; the app keeps the rows current from here on
+    histogram = ', '.join(f'rating_{rating}' for rating in RATINGS)
+    counts = ', '.join(
+        f'COALESCE(SUM(CASE WHEN reviews.rating = {rating} THEN 1 ELSE 0 END), 0)'
+        for rating in RATINGS
+    )
+    op.execute(
+        f'INSERT INTO site_rating_stats (site_id, review_count, rating_sum, {histogram}) '
+        f'SELECT sites.id, COUNT(reviews.id), COALESCE(SUM(reviews.rating), 0), {counts} '
+        'FROM sites LEFT OUTER JOIN reviews ON reviews.site_id = sites.id '
+        'GROUP BY sites.id'
+    )
+
+
+def downgrade():
+    op.drop_table('site_rating_stats')
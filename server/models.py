@@ -2,15 +2,31 @@ from datetime import datetime
 import pytz
 from sqlalchemy import DateTime
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
 from sqlalchemy.orm import validates
 from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy_serializer import SerializerMixin
 from config import db
+from passwords import password_hasher
 import re
 
 gmt_plus_3 = pytz.timezone("Africa/Nairobi")
 
+RATINGS = range(1, 11)
+# Largest absolute latitude and longitude, in degrees
+COORDINATE_LIMITS = {"latitude": 90, "longitude": 180}
+
+
+def now_gmt_plus_3():
+    # Passed uncalled as column default/onupdate so each write gets a fresh time
+    return datetime.now(gmt_plus_3)
+
+
+def validate_coordinate(key, value):
+    limit = COORDINATE_LIMITS[key]
+    if value is not None and not -limit <= value <= limit:
+        raise ValueError(f"{key} must be between -{limit} and {limit}")
+    return value
+
 
 class User(db.Model, SerializerMixin):
     __tablename__ = "users"
@@ -27,16 +43,20 @@ class User(db.Model, SerializerMixin):
     created_at = db.Column(
         DateTime(timezone=True),
         server_default=db.func.now(),
-        default=datetime.now(gmt_plus_3),
+        default=now_gmt_plus_3,
     )
     updated_at = db.Column(
         DateTime(timezone=True),
-        onupdate=datetime.now(gmt_plus_3),
-        default=datetime.now(gmt_plus_3),
+        onupdate=now_gmt_plus_3,
+        default=now_gmt_plus_3,
+        index=True,
     )
 
     user_activities = db.relationship(
-        "UserActivity", back_populates="user", cascade="all, delete-orphan"
+        "UserActivity",
+        back_populates="user",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
     activities = association_proxy(
         "user_activities",
@@ -48,10 +68,17 @@ class User(db.Model, SerializerMixin):
     )
 
     reviews = db.relationship(
-        "Review", back_populates="user", cascade="all, delete-orphan"
+        "Review",
+        back_populates="user",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
     profile = db.relationship(
-        "Profile", uselist=False, back_populates="user", cascade="all, delete-orphan"
+        "Profile",
+        uselist=False,
+        back_populates="user",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
 
     @validates("username")
@@ -65,10 +92,15 @@ class User(db.Model, SerializerMixin):
     def set_password(self, password):
         if len(password) < 8:
             raise ValueError("Password must be at least 8 characters long.")
-        self.password = generate_password_hash(password)
+        self.password = password_hasher.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password, password)
+        """Whether `password` is right, updating the stored hash (uncommitted)
+        when it was made with other hashing parameters than configured."""
+        matches, new_hash = password_hasher.verify(self.password, password)
+        if new_hash is not None:
+            self.password = new_hash
+        return matches
 
 
 class Profile(db.Model, SerializerMixin):
@@ -82,8 +114,24 @@ class Profile(db.Model, SerializerMixin):
     image = db.Column(db.String(255))
     bio = db.Column(db.Text)
     phone_number = db.Column(db.String(20))
+    created_at = db.Column(
+        DateTime(timezone=True),
+        server_default=db.func.now(),
+        default=now_gmt_plus_3,
+    )
+    updated_at = db.Column(
+        DateTime(timezone=True),
+        onupdate=now_gmt_plus_3,
+        default=now_gmt_plus_3,
+        index=True,
+    )
 
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
 
     user = db.relationship("User", back_populates="profile")
 
@@ -116,16 +164,27 @@ class UserActivity(db.Model, SerializerMixin):
     created_at = db.Column(
         DateTime(timezone=True),
         server_default=db.func.now(),
-        default=datetime.now(gmt_plus_3),
+        default=now_gmt_plus_3,
     )
     updated_at = db.Column(
         DateTime(timezone=True),
-        onupdate=datetime.now(gmt_plus_3),
-        default=datetime.now(gmt_plus_3),
+        onupdate=now_gmt_plus_3,
+        default=now_gmt_plus_3,
+        index=True,
     )
 
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
-    activity_id = db.Column(db.Integer, db.ForeignKey("activities.id"), nullable=False)
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    activity_id = db.Column(
+        db.Integer,
+        db.ForeignKey("activities.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
 
     user = db.relationship("User", back_populates="user_activities")
     activity = db.relationship("Activity", back_populates="user_activities")
@@ -137,6 +196,13 @@ class Review(db.Model, SerializerMixin):
         "-user.reviews",
         "-site.reviews",
     )
+    # Serve both lookups by site or user and their newest-first listings;
+    # (site_id, id) is the keyset seek of /reviews?site_id= and site bundles
+    __table_args__ = (
+        db.Index("ix_reviews_site_id_created_at", "site_id", "created_at"),
+        db.Index("ix_reviews_site_id_id", "site_id", "id"),
+        db.Index("ix_reviews_user_id_created_at", "user_id", "created_at"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     description = db.Column(db.Text, nullable=False)
@@ -144,22 +210,31 @@ class Review(db.Model, SerializerMixin):
     created_at = db.Column(
         DateTime(timezone=True),
         server_default=db.func.now(),
-        default=datetime.now(gmt_plus_3),
+        default=now_gmt_plus_3,
     )
     updated_at = db.Column(
         DateTime(timezone=True),
-        onupdate=datetime.now(gmt_plus_3),
-        default=datetime.now(gmt_plus_3),
+        onupdate=now_gmt_plus_3,
+        default=now_gmt_plus_3,
+        index=True,
+    )
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    site_id = db.Column(
+        db.Integer,
+        db.ForeignKey("sites.id", ondelete="CASCADE"),
+        nullable=False,
     )
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
-    site_id = db.Column(db.Integer, db.ForeignKey("sites.id"), nullable=False)
 
     user = db.relationship("User", back_populates="reviews")
     site = db.relationship("Site", back_populates="reviews")
 
     @validates("rating")
     def validate_rating(self, key, value):
-        if not (1 <= value <= 10):
+        if value not in RATINGS:
             raise ValueError("Rating must be between 1 and 10")
         return value
 
@@ -175,27 +250,34 @@ class Activity(db.Model, SerializerMixin):
     id = db.Column(db.Integer, primary_key=True)
     description = db.Column(db.Text)
     name = db.Column(db.String(100), nullable=False)
-    category = db.Column(db.String(50))
+    category = db.Column(db.String(50), index=True)
     created_at = db.Column(
         DateTime(timezone=True),
         server_default=db.func.now(),
-        default=datetime.now(gmt_plus_3),
+        default=now_gmt_plus_3,
     )
     updated_at = db.Column(
         DateTime(timezone=True),
-        onupdate=datetime.now(gmt_plus_3),
-        default=datetime.now(gmt_plus_3),
+        onupdate=now_gmt_plus_3,
+        default=now_gmt_plus_3,
+        index=True,
     )
 
     user_activities = db.relationship(
-        "UserActivity", back_populates="activity", cascade="all, delete-orphan"
+        "UserActivity",
+        back_populates="activity",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
     users = association_proxy(
         "user_activities", "user", creator=lambda user_obj: UserActivity(user=user_obj)
     )
 
     site_activities = db.relationship(
-        "SiteActivity", back_populates="activity", cascade="all, delete-orphan"
+        "SiteActivity",
+        back_populates="activity",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
     sites = association_proxy(
         "site_activities", "site", creator=lambda site_obj: SiteActivity(site=site_obj)
@@ -208,21 +290,40 @@ class SiteActivity(db.Model):
         "-site.site_activities",
         "-activity.site_activities",
     )
+    # A site offers each activity once; the index also serves lookups by site
+    __table_args__ = (
+        db.Index(
+            "uq_site_activities_site_id_activity_id",
+            "site_id",
+            "activity_id",
+            unique=True,
+        ),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     created_at = db.Column(
         DateTime(timezone=True),
         server_default=db.func.now(),
-        default=datetime.now(gmt_plus_3),
+        default=now_gmt_plus_3,
     )
     updated_at = db.Column(
         DateTime(timezone=True),
-        onupdate=datetime.now(gmt_plus_3),
-        default=datetime.now(gmt_plus_3),
+        onupdate=now_gmt_plus_3,
+        default=now_gmt_plus_3,
+        index=True,
     )
 
-    activity_id = db.Column(db.Integer, db.ForeignKey("activities.id"), nullable=False)
-    site_id = db.Column(db.Integer, db.ForeignKey("sites.id"), nullable=False)
+    activity_id = db.Column(
+        db.Integer,
+        db.ForeignKey("activities.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    site_id = db.Column(
+        db.Integer,
+        db.ForeignKey("sites.id", ondelete="CASCADE"),
+        nullable=False,
+    )
 
     activity = db.relationship("Activity", back_populates="site_activities")
     site = db.relationship("Site", back_populates="site_activities")
@@ -236,21 +337,47 @@ class Site(db.Model, SerializerMixin):
         "-location.sites",
         "-users.sites",
     )
+    # Added to site payloads by the views rather than read from a column, with
+    # the tables each is read from; `?fields=` may still ask for them
+    computed_fields = {"rating_stats": ("reviews",), "is_saved": ("saved_sites",)}
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     image = db.Column(db.String(255))
     description = db.Column(db.Text)
-    is_saved = db.Column(db.Boolean, default=False)
-    category = db.Column(db.String(50))
+    category = db.Column(db.String(50), index=True)
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    created_at = db.Column(
+        DateTime(timezone=True),
+        server_default=db.func.now(),
+        default=now_gmt_plus_3,
+    )
+    updated_at = db.Column(
+        DateTime(timezone=True),
+        onupdate=now_gmt_plus_3,
+        default=now_gmt_plus_3,
+        index=True,
+    )
 
-    location_id = db.Column(db.Integer, db.ForeignKey("locations.id"), nullable=False)
+    location_id = db.Column(
+        db.Integer,
+        db.ForeignKey("locations.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
 
     site_activities = db.relationship(
-        "SiteActivity", back_populates="site", cascade="all, delete-orphan"
+        "SiteActivity",
+        back_populates="site",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
     reviews = db.relationship(
-        "Review", back_populates="site", cascade="all, delete-orphan"
+        "Review",
+        back_populates="site",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
     location = db.relationship("Location", back_populates="sites")
 
@@ -263,6 +390,43 @@ class Site(db.Model, SerializerMixin):
         creator=lambda activity_obj: SiteActivity(activity=activity_obj),
     )
 
+    @validates("latitude", "longitude")
+    def validate_coordinates(self, key, value):
+        return validate_coordinate(key, value)
+
+
+class SavedSite(db.Model):
+    """A site a user has bookmarked."""
+
+    __tablename__ = "saved_sites"
+
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    site_id = db.Column(
+        db.Integer,
+        db.ForeignKey("sites.id", ondelete="CASCADE"),
+        primary_key=True,
+        index=True,
+    )
+    created_at = db.Column(
+        DateTime(timezone=True),
+        server_default=db.func.now(),
+        default=now_gmt_plus_3,
+    )
+    updated_at = db.Column(
+        DateTime(timezone=True),
+        onupdate=now_gmt_plus_3,
+        default=now_gmt_plus_3,
+        index=True,
+    )
+
+    # One-way, so neither side's to_dict() grows a saved_sites list
+    user = db.relationship("User")
+    site = db.relationship("Site")
+
 
 class Location(db.Model, SerializerMixin):
     __tablename__ = "locations"
@@ -272,17 +436,136 @@ class Location(db.Model, SerializerMixin):
     name = db.Column(db.String(100), nullable=False)
     image = db.Column(db.String(255))
     description = db.Column(db.Text)
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
     created_at = db.Column(
         DateTime(timezone=True),
         server_default=db.func.now(),
-        default=datetime.now(gmt_plus_3),
+        default=now_gmt_plus_3,
     )
     updated_at = db.Column(
         DateTime(timezone=True),
-        onupdate=datetime.now(gmt_plus_3),
-        default=datetime.now(gmt_plus_3),
+        onupdate=now_gmt_plus_3,
+        default=now_gmt_plus_3,
+        index=True,
     )
 
     sites = db.relationship(
-        "Site", back_populates="location", cascade="all, delete-orphan"
+        "Site",
+        back_populates="location",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
+
+    @validates("latitude", "longitude")
+    def validate_coordinates(self, key, value):
+        return validate_coordinate(key, value)
+
+
+class RevokedToken(db.Model):
+    __tablename__ = "revoked_tokens"
+
+    jti = db.Column(db.String(36), primary_key=True)
+    # Unix timestamps, so expiry checks don't depend on database timezone handling
+    expires_at = db.Column(db.Integer, nullable=False, index=True)
+    revoked_at = db.Column(db.Float, nullable=False, index=True)
+
+
+class Tombstone(db.Model):
+    """A deleted catalog row, kept so /sync can tell clients to drop it."""
+
+    __tablename__ = "tombstones"
+
+    id = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(64), nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(
+        DateTime(timezone=True), nullable=False, default=now_gmt_plus_3, index=True
+    )
+
+
+class TableVersion(db.Model):
+    """A counter per table, bumped by every transaction that writes to it
+    (see versions.py), so validators and indexes can tell whether a table
+    changed without scanning it."""
+
+    __tablename__ = "table_versions"
+
+    table_name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(DateTime(timezone=True), nullable=False)
+
+
+class SiteRatingStats(db.Model):
+    __tablename__ = "site_rating_stats"
+
+    site_id = db.Column(
+        db.Integer, db.ForeignKey("sites.id", ondelete="CASCADE"), primary_key=True
+    )
+    review_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    # One counter per possible rating (see Review.validate_rating)
+    rating_1 = db.Column(db.Integer, nullable=False, default=0)
+    rating_2 = db.Column(db.Integer, nullable=False, default=0)
+    rating_3 = db.Column(db.Integer, nullable=False, default=0)
+    rating_4 = db.Column(db.Integer, nullable=False, default=0)
+    rating_5 = db.Column(db.Integer, nullable=False, default=0)
+    rating_6 = db.Column(db.Integer, nullable=False, default=0)
+    rating_7 = db.Column(db.Integer, nullable=False, default=0)
+    rating_8 = db.Column(db.Integer, nullable=False, default=0)
+    rating_9 = db.Column(db.Integer, nullable=False, default=0)
+    rating_10 = db.Column(db.Integer, nullable=False, default=0)
+
+    def to_dict(self):
+        return {
+            "review_count": self.review_count,
+            "rating_sum": self.rating_sum,
+            "mean": (
+                self.rating_sum / self.review_count if self.review_count else None
+            ),
+            "histogram": {
+                str(rating): getattr(self, f"rating_{rating}") for rating in RATINGS
+            },
+        }
+
+
+class ActivityCooccurrence(db.Model):
+    """How many users did both activities; the diagonal holds each activity's
+    own user count. Stored in both directions."""
+
+    __tablename__ = "activity_cooccurrences"
+    __table_args__ = (
+        db.Index("ix_activity_cooccurrences_activity_id_users", "activity_id", "users"),
+    )
+
+    activity_id = db.Column(
+        db.Integer, db.ForeignKey("activities.id", ondelete="CASCADE"), primary_key=True
+    )
+    other_activity_id = db.Column(
+        db.Integer,
+        db.ForeignKey("activities.id", ondelete="CASCADE"),
+        primary_key=True,
+        index=True,
+    )
+    users = db.Column(db.Integer, nullable=False, default=0)
+
+
+class SiteCooccurrence(db.Model):
+    """How many users liked both sites (see recommendations.LIKED_RATING); the
+    diagonal holds each site's own count. Stored in both directions."""
+
+    __tablename__ = "site_cooccurrences"
+    __table_args__ = (
+        db.Index("ix_site_cooccurrences_site_id_users", "site_id", "users"),
+    )
+
+    site_id = db.Column(
+        db.Integer, db.ForeignKey("sites.id", ondelete="CASCADE"), primary_key=True
+    )
+    other_site_id = db.Column(
+        db.Integer,
+        db.ForeignKey("sites.id", ondelete="CASCADE"),
+        primary_key=True,
+        index=True,
     )
+    users = db.Column(db.Integer, nullable=False, default=0)
@@ -0,0 +1,78 @@
+import base64
+import binascii
+import json
+from urllib.parse import urlencode
+
+from flask import request
+from flask_restful import reqparse
+
+from serializers import json_response
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(last_id):
+    payload = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """Turn an opaque `after` token back into the id it points past."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded))["id"]
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(last_id, int):
+        raise ValueError("Invalid cursor")
+    return last_id
+
+
+def page_size(value):
+    limit = int(value)
+    if limit < 1:
+        raise ValueError("limit must be a positive integer")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def paginate(query, model, newest_first=False):
+    """Return one keyset page of `query` and the cursor for the next page.
+
+    Rows are walked in primary key order (descending with `newest_first`)
+    and each page starts with an indexed `id > last_id` (or `<`) seek, so
+    deep pages cost the same as the first.
+    """
+    parser = reqparse.RequestParser()
+    parser.add_argument(
+        "limit", type=page_size, location="args", default=DEFAULT_PAGE_SIZE
+    )
+    parser.add_argument("after", type=decode_cursor, location="args")
+    args = parser.parse_args()
+
+    if newest_first:
+        if args["after"] is not None:
+            query = query.filter(model.id < args["after"])
+        query = query.order_by(model.id.desc())
+    else:
+        if args["after"] is not None:
+            query = query.filter(model.id > args["after"])
+        query = query.order_by(model.id)
+    rows = query.limit(args["limit"] + 1).all()
+
+    next_cursor = None
+    if len(rows) > args["limit"]:
+        rows = rows[: args["limit"]]
+        next_cursor = encode_cursor(rows[-1].id)
+    return rows, next_cursor
+
+
+def paginated_response(items, next_cursor):
+    """JSON list response with an RFC 8288 `Link: rel="next"` header."""
+    response = json_response(items)
+    if next_cursor is not None:
+        params = request.args.to_dict(flat=False)
+        params["after"] = [next_cursor]
+        next_url = f"{request.base_url}?{urlencode(params, doseq=True)}"
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return response
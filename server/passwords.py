@@ -0,0 +1,101 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app
+from werkzeug.local import LocalProxy
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HasherBusy(Exception):
+    """Every hashing slot is taken; the client should retry later."""
+
+    def __init__(self, retry_after):
+        super().__init__("Too many password checks in progress")
+        self.retry_after = retry_after
+
+
+def _method_of(password_hash):
+    return password_hash.split("$", 1)[0]
+
+
+def _hash(password, method):
+    return generate_password_hash(password, method)
+
+
+def _verify(password_hash, password, method, canonical):
+    """(whether `password` matches, and a new hash if the stored one was
+    made with other parameters than `method`)."""
+    if not check_password_hash(password_hash, password):
+        return False, None
+    if _method_of(password_hash) == canonical:
+        return True, None
+    return True, generate_password_hash(password, method)
+
+
+class PasswordHasher:
+    """Runs password hashing in a pool of worker processes.
+
+    Key derivation is CPU-bound and holds the GIL, so doing it on the request
+    thread stalls everything else the process is serving. In the pool it
+    runs in parallel with the request threads, and at most `max_pending`
+    hashes are in flight; beyond that callers get HasherBusy at once rather
+    than queueing behind a login burst. With `workers=0` hashing runs inline.
+    """
+
+    def __init__(self, method, workers, max_pending, retry_after):
+        self.method = method
+        self.workers = workers
+        self.retry_after = retry_after
+        self._slots = threading.BoundedSemaphore(max(max_pending, 1))
+        self._executor = None
+        self._lock = threading.Lock()
+        self._canonical = None
+
+    @property
+    def canonical_method(self):
+        """`method` as werkzeug writes it into hashes, defaults filled in
+        (so "pbkdf2:sha256" compares equal to "pbkdf2:sha256:260000")."""
+        if self._canonical is None:
+            sample = generate_password_hash("", self.method, salt_length=1)
+            self._canonical = _method_of(sample)
+        return self._canonical
+
+    def _pool(self):
+        # Started on first use, so processes that never hash (migrations,
+        # CLI commands) don't fork workers
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def _run(self, function, *args):
+        if not self.workers:
+            return function(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy(self.retry_after)
+        try:
+            return self._pool().submit(function, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        """(match, new hash or None); see _verify."""
+        return self._run(
+            _verify, password_hash, password, self.method, self.canonical_method
+        )
+
+
+def init_app(app):
+    app.extensions["password_hasher"] = PasswordHasher(
+        method=app.config["PASSWORD_HASH_METHOD"],
+        workers=app.config["PASSWORD_HASH_WORKERS"],
+        max_pending=app.config["PASSWORD_HASH_MAX_PENDING"],
+        retry_after=app.config["PASSWORD_HASH_RETRY_AFTER"],
+    )
+
+
+# The current app's hasher
+password_hasher = LocalProxy(lambda: current_app.extensions["password_hasher"])
@@ -0,0 +1,95 @@
+from sqlalchemy.orm import joinedload, selectinload
+
+from models import (
+    User,
+    Profile,
+    UserActivity,
+    Review,
+    Activity,
+    Site,
+    Location,
+)
+
+# Loader options mirroring the shape produced by each model's serialize_rules.
+# Collections are fetched with selectinload (one batched IN query per level),
+# many-to-one and one-to-one links are joined into the parent's SELECT, so a
+# request costs the same handful of queries however many rows it returns.
+
+
+def _activity_with_sites(path):
+    return path.selectinload(Activity.site_activities)
+
+
+def _site_summary(path):
+    return path.options(
+        joinedload(Site.location),
+        selectinload(Site.site_activities),
+    )
+
+
+def _user_without_reviews(path):
+    return path.options(
+        joinedload(User.profile),
+        _activity_with_sites(
+            selectinload(User.user_activities).joinedload(UserActivity.activity)
+        ),
+    )
+
+
+def _user_without_activities(path):
+    return path.options(
+        joinedload(User.profile),
+        _site_summary(selectinload(User.reviews).joinedload(Review.site)),
+    )
+
+
+def _review_with_author(path):
+    return _user_without_reviews(path.joinedload(Review.user))
+
+
+USER_PLAN = (
+    joinedload(User.profile),
+    _site_summary(selectinload(User.reviews).joinedload(Review.site)),
+    _activity_with_sites(
+        selectinload(User.user_activities).joinedload(UserActivity.activity)
+    ),
+)
+
+PROFILE_PLAN = (
+    joinedload(Profile.user).options(
+        _site_summary(selectinload(User.reviews).joinedload(Review.site)),
+        _activity_with_sites(
+            selectinload(User.user_activities).joinedload(UserActivity.activity)
+        ),
+    ),
+)
+
+REVIEW_PLAN = (
+    _site_summary(joinedload(Review.site)),
+    _user_without_reviews(joinedload(Review.user)),
+)
+
+ACTIVITY_PLAN = (
+    selectinload(Activity.site_activities),
+    _user_without_activities(
+        selectinload(Activity.user_activities).joinedload(UserActivity.user)
+    ),
+)
+
+USER_ACTIVITY_PLAN = (
+    _activity_with_sites(joinedload(UserActivity.activity)),
+    _user_without_activities(joinedload(UserActivity.user)),
+)
+
+SITE_PLAN = (
+    joinedload(Site.location),
+    selectinload(Site.site_activities),
+    _review_with_author(selectinload(Site.reviews)),
+)
+
+LOCATION_PLAN = (
+    selectinload(Location.sites).options(
+        selectinload(Site.site_activities),
+        _review_with_author(selectinload(Site.reviews)),
+    ),
+)
@@ -0,0 +1,178 @@
+import contextvars
+import os
+import sys
+import time
+from collections import Counter
+from functools import wraps
+
+from flask import current_app, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+# Longest statement text quoted in a log line
+MAX_LOGGED_SQL = 500
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RequestQueries:
+    """The statements one request has run so far."""
+
+    def __init__(self):
+        self.count = 0
+        self.shapes = Counter()
+        # Where each repeated statement was issued from, once it repeats
+        self.call_sites = {}
+
+
+_current = contextvars.ContextVar("request_queries", default=None)
+
+
+def _enabled():
+    # Statements can run outside any app, e.g. in a bare script
+    return has_app_context() and current_app.config["QUERY_DEBUG"]
+
+
+def _route():
+    rule = request.url_rule.rule if request.url_rule else request.path
+    return f"{request.method} {rule}"
+
+
+def _shorten(statement):
+    statement = " ".join(statement.split())
+    if len(statement) > MAX_LOGGED_SQL:
+        return statement[:MAX_LOGGED_SQL] + "..."
+    return statement
+
+
+def call_site():
+    """file:line in function of the innermost frame in this app's own code,
+    outside this module, that led to the current statement."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (
+            filename.startswith(SERVER_DIR)
+            and filename != __file__
+            and "site-packages" not in filename
+        ):
+            name = os.path.relpath(filename, SERVER_DIR)
+            return f"{name}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return "unknown"
+
+
+def _explain(conn, statement, parameters):
+    """The database's plan for a statement, without running it again."""
+    if not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+        return None
+    prefix = (
+        "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    )
+    # A cursor of its own keeps the slow statement's rows intact, and going
+    # to the DBAPI directly keeps these events from seeing the EXPLAIN
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return "\n".join(
+            "    " + " ".join(str(value) for value in row)
+            for row in cursor.fetchall()
+        )
+    except Exception as e:
+        return f"    (EXPLAIN failed: {e})"
+    finally:
+        cursor.close()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_statement(conn, cursor, statement, parameters, context, executemany):
+    if _enabled():
+        conn.info.setdefault("query_log_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _finish_statement(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_log_started")
+    if not _enabled() or not started:
+        return
+    elapsed_ms = (time.perf_counter() - started.pop()) * 1000
+
+    queries = _current.get()
+    if queries is not None:
+        queries.count += 1
+        queries.shapes[statement] += 1
+        if queries.shapes[statement] == current_app.config["N_PLUS_ONE_THRESHOLD"]:
+            queries.call_sites[statement] = call_site()
+
+    if elapsed_ms >= current_app.config["SLOW_QUERY_MS"]:
+        where = _route() if queries is not None else "outside a request"
+        plan = None if executemany else _explain(conn, statement, parameters)
+        current_app.logger.warning(
+            "Slow query (%.1f ms) in %s at %s: %s%s",
+            elapsed_ms,
+            where,
+            call_site(),
+            _shorten(statement),
+            f"\n{plan}" if plan else "",
+        )
+
+
+def _start_request():
+    if _enabled():
+        request.environ["query_log.token"] = _current.set(RequestQueries())
+
+
+def _finish_request(error):
+    token = request.environ.pop("query_log.token", None)
+    if token is None:
+        return
+    queries = _current.get()
+    _current.reset(token)
+    # The same statement over and over is the signature of a lazy load per
+    # row (N+1); say where it came from so the missing eager load is easy
+    # to find
+    for statement, site in queries.call_sites.items():
+        current_app.logger.warning(
+            "Possible N+1 in %s: %d identical statements from %s: %s",
+            _route(),
+            queries.shapes[statement],
+            site,
+            _shorten(statement),
+        )
+
+
+def query_budget(limit):
+    """Cap the statements a resource method may issue.
+
+    With QUERY_DEBUG on, a request that goes over is logged, and raises
+    QueryBudgetExceeded under QUERY_BUDGET_STRICT so test runs fail on it.
+    Apply it outermost so the statements of the other decorators count.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            response = view(*args, **kwargs)
+            queries = _current.get()
+            if queries is not None and queries.count > limit:
+                message = (
+                    f"{_route()} issued {queries.count} statements, "
+                    f"over its budget of {limit}"
+                )
+                if current_app.config["QUERY_BUDGET_STRICT"]:
+                    raise QueryBudgetExceeded(message)
+                current_app.logger.warning(message)
+            return response
+
+        wrapper.query_budget = limit
+        return wrapper
+
+    return decorator
+
+
+def init_app(app):
+    app.before_request(_start_request)
+    app.teardown_request(_finish_request)
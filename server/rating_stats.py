@@ -0,0 +1,165 @@
+from collections import defaultdict
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import (
+    bindparam,
+    case,
+    delete,
+    event,
+    func,
+    inspect,
+    insert,
+    select,
+    update,
+)
+from sqlalchemy.orm import Session
+
+from config import db
+from models import RATINGS, Review, Site, SiteRatingStats, User
+
+
+def _aggregate_columns():
+    return [
+        func.count(Review.id),
+        func.coalesce(func.sum(Review.rating), 0),
+        *(
+            func.coalesce(func.sum(case((Review.rating == rating, 1), else_=0)), 0)
+            for rating in RATINGS
+        ),
+    ]
+
+
+STAT_COLUMNS = ["review_count", "rating_sum", *(f"rating_{r}" for r in RATINGS)]
+
+
+def _review_deltas(session):
+    """Per-site changes to each stats column caused by the reviews just flushed."""
+    deltas = defaultdict(lambda: defaultdict(int))
+
+    def apply(site_id, rating, sign):
+        if site_id is None or rating is None:
+            return
+        deltas[site_id]["review_count"] += sign
+        deltas[site_id]["rating_sum"] += sign * rating
+        deltas[site_id][f"rating_{rating}"] += sign
+
+    # Reviews the database removed along with their user
+    for site_id, rating, count in session.info.pop("cascaded_reviews", ()):
+        apply(site_id, rating, -count)
+
+    for review in session.new:
+        if isinstance(review, Review):
+            apply(review.site_id, review.rating, 1)
+    for review in session.deleted:
+        if isinstance(review, Review):
+            state = inspect(review)
+            apply(
+                state.attrs.site_id.history.non_added()[0],
+                state.attrs.rating.history.non_added()[0],
+                -1,
+            )
+    for review in session.dirty:
+        if not isinstance(review, Review) or review in session.deleted:
+            continue
+        state = inspect(review)
+        site, rating = state.attrs.site_id.history, state.attrs.rating.history
+        if not (site.has_changes() or rating.has_changes()):
+            continue
+        apply(site.non_added()[0], rating.non_added()[0], -1)
+        apply(review.site_id, review.rating, 1)
+    return deltas
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_cascaded_reviews(session, flush_context, instances):
+    """Count the reviews ON DELETE CASCADE will take with deleted users.
+
+    Those rows never enter the session (the relationships use passive
+    deletes), so they are read while they still exist.
+    """
+    cascaded = []
+    user_ids = [obj.id for obj in session.deleted if isinstance(obj, User)]
+    if user_ids:
+        in_session = [obj.id for obj in session.deleted if isinstance(obj, Review)]
+        query = select(Review.site_id, Review.rating, func.count()).where(
+            Review.user_id.in_(user_ids), Review.id.not_in(in_session)
+        )
+        with session.no_autoflush:
+            cascaded = session.execute(
+                query.group_by(Review.site_id, Review.rating)
+            ).all()
+    session.info["cascaded_reviews"] = cascaded
+
+
+@event.listens_for(Session, "after_flush")
+def _update_site_rating_stats(session, flush_context):
+    """Fold flushed review writes into site_rating_stats in the same transaction."""
+    deltas = _review_deltas(session)
+    deleted_sites = {obj.id for obj in session.deleted if isinstance(obj, Site)}
+    rows = [
+        {"site": site_id, **{column: changes[column] for column in STAT_COLUMNS}}
+        for site_id, changes in deltas.items()
+        if site_id not in deleted_sites and any(changes.values())
+    ]
+    if not rows:
+        return
+    stats = SiteRatingStats.__table__
+    # One executemany for every site; the parameters are named apart from
+    # the columns, which UPDATE reserves for SET values
+    session.execute(
+        update(stats)
+        .where(stats.c.site_id == bindparam("site"))
+        .values(
+            {column: stats.c[column] + bindparam(column) for column in STAT_COLUMNS}
+        ),
+        rows,
+    )
+    # Sites with no row yet are counted from scratch, which already includes
+    # the reviews written in this flush
+    session.execute(
+        insert(SiteRatingStats).from_select(
+            ["site_id", *STAT_COLUMNS],
+            select(Review.site_id, *_aggregate_columns())
+            .where(
+                Review.site_id.in_([row["site"] for row in rows]),
+                ~select(SiteRatingStats.site_id)
+                .where(SiteRatingStats.site_id == Review.site_id)
+                .exists(),
+            )
+            .group_by(Review.site_id),
+        )
+    )
+
+
+def stats_for(site_ids):
+    """Rating stats dicts keyed by site id, from one query on site_rating_stats."""
+    rows = SiteRatingStats.query.filter(SiteRatingStats.site_id.in_(site_ids)).all()
+    stats = {row.site_id: row.to_dict() for row in rows}
+    # Sites whose stats row hasn't been written yet have no reviews
+    empty = {"review_count": 0, "rating_sum": 0, "mean": None}
+    empty["histogram"] = {str(rating): 0 for rating in RATINGS}
+    return {site_id: stats.get(site_id, empty) for site_id in site_ids}
+
+
+def rebuild():
+    """Recompute every site's stats from the reviews table in one statement."""
+    db.session.execute(delete(SiteRatingStats))
+    db.session.execute(
+        insert(SiteRatingStats).from_select(
+            ["site_id", *STAT_COLUMNS],
+            select(Site.id, *_aggregate_columns())
+            .select_from(Site)
+            .outerjoin(Review, Review.site_id == Site.id)
+            .group_by(Site.id),
+        )
+    )
+    db.session.commit()
+
+
+@click.command("rebuild-rating-stats")
+@with_appcontext
+def rebuild_command():
+    """Backfill site_rating_stats from existing reviews."""
+    rebuild()
+    print(f"Rebuilt rating stats for {SiteRatingStats.query.count()} sites")
@@ -0,0 +1,308 @@
+import math
+from collections import defaultdict
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import delete, event, func, insert, inspect, select, true
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from cascades import on_cascade
+from config import db
+from models import (
+    Activity,
+    ActivityCooccurrence,
+    Review,
+    Site,
+    SiteCooccurrence,
+    User,
+    UserActivity,
+)
+
+# A review at or above this rating counts as the user liking the site
+LIKED_RATING = 7
+# Neighbours read per activity or site the user already has
+NEIGHBORS = 50
+
+
+class Matrix:
+    """One item-item co-occurrence matrix: which rows make a user "have" an
+    item, and the table the counts live in.
+
+    The matrix is the sparse product X^T X of the user x item incidence
+    matrix X, stored one nonzero cell per row rather than built in NumPy or
+    SciPy. Neither is a dependency, and an in-memory matrix would be
+    rebuilt by and held in every worker, and would go stale there as soon
+    as another worker wrote a participation. Stored counts are shared by
+    all workers, change in the same transaction as the rows they count,
+    and are read through the (item, users) index, so serving is an index
+    lookup. rebuild() is the batch computation, one set-based self-join;
+    the flush hooks apply just the cells a write changes.
+    """
+
+    def __init__(self, name, user_column, item_column, condition, counts):
+        self.name = name
+        self.user_column = user_column
+        self.item_column = item_column
+        self.condition = condition
+        self.counts = counts
+        self.model = user_column.class_
+        self.item, self.other = counts.__table__.primary_key.columns
+
+    def memberships(self, session, user_ids):
+        """{user id: set of item ids} for the given users, as stored right now."""
+        query = select(self.user_column, self.item_column).where(
+            self.user_column.in_(user_ids), self.condition
+        )
+        items = defaultdict(set)
+        for user_id, item_id in session.execute(query.distinct()):
+            items[user_id].add(item_id)
+        return items
+
+
+ACTIVITIES = Matrix(
+    "activities",
+    UserActivity.user_id,
+    UserActivity.activity_id,
+    true(),
+    ActivityCooccurrence,
+)
+SITES = Matrix(
+    "sites",
+    Review.user_id,
+    Review.site_id,
+    Review.rating >= LIKED_RATING,
+    SiteCooccurrence,
+)
+MATRICES = [ACTIVITIES, SITES]
+
+
+def _pair_deltas(before, after):
+    """Changes to each (item, other item) count when users' item sets go from
+    `before` to `after`. Only pairs touching an item that came or went move."""
+    deltas = defaultdict(int)
+    for user_id in before.keys() | after.keys():
+        had, has = before.get(user_id, set()), after.get(user_id, set())
+        changed = had ^ has
+        for item in changed:
+            for other in had | has:
+                delta = (item in has and other in has) - (item in had and other in had)
+                if delta:
+                    deltas[item, other] += delta
+                    if other not in changed:
+                        deltas[other, item] += delta
+    return deltas
+
+
+def _touched_users(session):
+    """{matrix name: ids of the users whose item sets this flush can change},
+    for the matrices whose membership rows it writes.
+
+    Deleting an activity or site, or a location and its sites, touches no
+    one: the only counts it changes are its own pairs, which ON DELETE
+    CASCADE removes along with it.
+    """
+    touched = {}
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, User) and obj in session.deleted:
+            for matrix in MATRICES:
+                touched.setdefault(matrix.name, set()).add(obj.id)
+            continue
+        for matrix in MATRICES:
+            if not isinstance(obj, matrix.model):
+                continue
+            user_ids = touched.setdefault(matrix.name, set())
+            history = inspect(obj).attrs.user_id.history
+            user_ids.update(value for value in history.sum() if value is not None)
+            # Rows attached through the relationship get user_id during the
+            # flush; a user that is new too has no items to start from
+            if obj.user_id is None and obj.user is not None and obj.user.id:
+                user_ids.add(obj.user.id)
+    return touched
+
+
+@on_cascade
+def _collect_memberships(session, cascaded):
+    touched = _touched_users(session)
+    deleted = {
+        "activities": {obj.id for obj in session.deleted if isinstance(obj, Activity)},
+        "sites": {obj.id for obj in session.deleted if isinstance(obj, Site)}
+        | set(cascaded[Site]),
+    }
+    with session.no_autoflush:
+        session.info["cooccurrence_before"] = {
+            matrix.name: (
+                touched[matrix.name],
+                deleted[matrix.name],
+                matrix.memberships(session, touched[matrix.name])
+                if touched[matrix.name]
+                else {},
+            )
+            for matrix in MATRICES
+            if matrix.name in touched
+        }
+
+
+def _upsert(session, counts, rows):
+    """Add each row's `users` to the stored count, creating missing rows."""
+    dialect = session.connection().dialect.name
+    statement = (postgresql if dialect == "postgresql" else sqlite).insert(counts)
+    item, other = counts.__table__.primary_key.columns
+    session.execute(
+        statement.on_conflict_do_update(
+            index_elements=[item.name, other.name],
+            set_={"users": counts.users + statement.excluded.users},
+        ),
+        rows,
+    )
+
+
+@event.listens_for(Session, "after_flush")
+def _update_cooccurrences(session, flush_context):
+    """Fold the flushed changes into the co-occurrence counts in the same
+    transaction, reading only the matrices whose membership rows changed."""
+    before = session.info.pop("cooccurrence_before", None)
+    if not before:
+        return
+    for matrix in MATRICES:
+        if matrix.name not in before:
+            continue
+        user_ids, deleted, had = before[matrix.name]
+        user_ids = user_ids | {
+            obj.user_id for obj in session.new if isinstance(obj, matrix.model)
+        }
+        if not user_ids:
+            continue
+        has = matrix.memberships(session, user_ids)
+        rows = [
+            {matrix.item.name: item, matrix.other.name: other, "users": delta}
+            for (item, other), delta in _pair_deltas(had, has).items()
+            # Counts of deleted items go with them through ON DELETE CASCADE
+            if item not in deleted and other not in deleted
+        ]
+        if not rows:
+            continue
+        _upsert(session, matrix.counts, rows)
+        items = {row[matrix.item.name] for row in rows}
+        session.execute(
+            delete(matrix.counts).where(
+                matrix.item.in_(items), matrix.counts.users <= 0
+            )
+        )
+
+
+def _similar(matrix, seeds, limit):
+    """Items most similar to `seeds` by cosine similarity of their user sets,
+    excluding the seeds, as (item id, score) best first."""
+    if not seeds:
+        return []
+    ranked = (
+        select(
+            matrix.item,
+            matrix.other,
+            matrix.counts.users,
+            func.row_number()
+            .over(partition_by=matrix.item, order_by=matrix.counts.users.desc())
+            .label("rank"),
+        )
+        .where(matrix.item.in_(seeds))
+        .subquery()
+    )
+    # The top counts of each seed, its own diagonal among them
+    neighbours = db.session.execute(
+        select(
+            ranked.c[matrix.item.name], ranked.c[matrix.other.name], ranked.c.users
+        ).where(ranked.c.rank <= NEIGHBORS + 1)
+    ).all()
+    candidates = {other for _, other, _ in neighbours} - set(seeds)
+    if not candidates:
+        return []
+    users = dict(
+        db.session.execute(
+            select(matrix.item, matrix.counts.users).where(
+                matrix.item.in_(candidates | set(seeds)), matrix.item == matrix.other
+            )
+        ).all()
+    )
+    scores = defaultdict(float)
+    for item, other, together in neighbours:
+        if other in candidates and users.get(item) and users.get(other):
+            scores[other] += together / math.sqrt(users[item] * users[other])
+    best = sorted(scores.items(), key=lambda pair: (-pair[1], pair[0]))[:limit]
+    return [(item, round(score, 4)) for item, score in best]
+
+
+def _named(model, scored):
+    names = dict(
+        db.session.execute(
+            select(model.id, model.name).where(model.id.in_([id for id, _ in scored]))
+        ).all()
+    )
+    return [
+        {"id": id, "name": names[id], "score": score}
+        for id, score in scored
+        if id in names
+    ]
+
+
+def recommend(user_id, limit=10):
+    """Activities people who did this user's activities also did, and sites
+    people who liked the sites this user liked also liked."""
+    activities = ACTIVITIES.memberships(db.session, [user_id])[user_id]
+    reviewed = db.session.execute(
+        select(Review.site_id, func.max(Review.rating))
+        .where(Review.user_id == user_id)
+        .group_by(Review.site_id)
+    ).all()
+    liked = [site_id for site_id, rating in reviewed if rating >= LIKED_RATING]
+    reviewed_sites = {site_id for site_id, _ in reviewed}
+
+    similar_activities = _similar(ACTIVITIES, list(activities), limit)
+    # Sites the user reviewed without liking them are candidates too, so
+    # fetch enough to still have `limit` after dropping them
+    similar_sites = [
+        (site_id, score)
+        for site_id, score in _similar(SITES, liked, limit + len(reviewed))
+        if site_id not in reviewed_sites
+    ][:limit]
+    return {
+        "activities": _named(Activity, similar_activities),
+        "sites": _named(Site, similar_sites),
+    }
+
+
+def rebuild():
+    """Recount every co-occurrence from scratch with one self-join per matrix,
+    computing all of X^T X in the database in one pass."""
+    for matrix in MATRICES:
+        have = (
+            select(
+                matrix.user_column.label("user_id"), matrix.item_column.label("item")
+            )
+            .where(matrix.condition)
+            .distinct()
+            .subquery()
+        )
+        other = have.alias()
+        db.session.execute(delete(matrix.counts))
+        db.session.execute(
+            insert(matrix.counts).from_select(
+                [matrix.item.name, matrix.other.name, "users"],
+                select(have.c.item, other.c.item, func.count())
+                .select_from(have)
+                .join(other, other.c.user_id == have.c.user_id)
+                .group_by(have.c.item, other.c.item),
+            )
+        )
+    db.session.commit()
+
+
+@click.command("rebuild-recommendations")
+@with_appcontext
+def rebuild_command():
+    """Recompute the activity and site co-occurrence counts."""
+    rebuild()
+    print(
+        f"Rebuilt {ActivityCooccurrence.query.count()} activity and "
+        f"{SiteCooccurrence.query.count()} site co-occurrence counts"
+    )
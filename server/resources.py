@@ -0,0 +1,1215 @@
+#!/usr/bin/env python3
+
+# Standard library imports
+
+# Remote library imports
+
+from flask import Response, request, make_response, jsonify
+from flask_restful import Resource, reqparse
+from sqlalchemy import select, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy_serializer import SerializerMixin
+from flask_jwt_extended import (
+    create_access_token,
+    create_refresh_token,
+    jwt_required,
+    get_jwt_identity,
+    get_jwt,
+)
+from blacklist import revocation_store
+
+# Local imports
+from config import db
+
+# Add your model imports
+from models import (
+    validate_coordinate,
+    User,
+    Profile,
+    UserActivity,
+    Review,
+    SiteActivity,
+    Site,
+    SavedSite,
+    Location,
+    Activity,
+)
+from query_plans import (
+    USER_PLAN,
+    PROFILE_PLAN,
+    REVIEW_PLAN,
+    ACTIVITY_PLAN,
+    USER_ACTIVITY_PLAN,
+    SITE_PLAN,
+    LOCATION_PLAN,
+)
+from pagination import page_size, paginate, paginated_response
+from fieldsets import Fieldset
+from serializers import json_response
+from cache import cached, response_cache
+from conditional import conditional
+from rating_stats import stats_for
+from search import TYPES, search_backend
+from geo import site_locator
+from recommendations import recommend
+from bulk import BulkWrite, field
+from export import EXPORTS, FORMATS, export_response, updated_since
+from sync import changes, decode_token
+from metrics import admin_only, registry, timed_serialization
+from querylog import query_budget
+from passwords import HasherBusy
+from saved_sites import annotate_saved, current_user_id
+from bundle import BUNDLE_MODELS, site_bundle
+
+
+from datetime import datetime
+import pytz
+
+
+gmt_plus_3 = pytz.timezone("Africa/Nairobi")
+
+MAX_NEARBY_RADIUS_KM = 500
+
+
+def index():
+    return "<h1>Project Server</h1>"
+
+
+@timed_serialization
+def to_dict(obj):
+    # Write responses use the library's to_dict(); timed like the read paths
+    return obj.to_dict()
+
+
+def hasher_busy(error):
+    return make_response(
+        jsonify({"error": str(error)}),
+        503,
+        {"Retry-After": str(error.retry_after)},
+    )
+
+
+class Login(Resource):
+    def post(self):
+        data = request.get_json() if request.is_json else request.form
+        if "username" not in data or "password" not in data:
+            return {"error": "Missing required fields"}, 422
+        user = (
+            User.query.options(*USER_PLAN).filter_by(username=data["username"]).first()
+        )
+        try:
+            valid = user is not None and user.check_password(data["password"])
+        except HasherBusy as e:
+            return hasher_busy(e)
+        if valid:
+            if db.session.is_modified(user):
+                # check_password rehashed it with the current parameters
+                db.session.commit()
+            access_token = create_access_token(identity=user.id)
+            refresh_token = create_refresh_token(identity=user.id)
+
+            return make_response(
+                {
+                    "message": "Login successful",
+                    "tokens": {"access": access_token, "refresh": refresh_token},
+                    "user": to_dict(user),
+                },
+                200,
+            )
+
+        return make_response({"error": "Invalid username or password"})
+
+
+class CheckSession(Resource):
+    @jwt_required()
+    def get(self):
+        current_user_id = get_jwt_identity()
+        user = User.query.options(*USER_PLAN).filter_by(id=current_user_id).first()
+        if user:
+            return to_dict(user), 200
+        else:
+            return {"error": "User not found"}, 404
+
+
+class Logout(Resource):
+    @jwt_required()
+    def delete(self):
+        token = get_jwt()
+        revocation_store.revoke(token["jti"], token["exp"])
+        return {"message": "Successfully logged out"}, 200
+
+
+class RefreshToken(Resource):
+    @jwt_required(refresh=True)
+    def get(self):
+        identity = get_jwt_identity()
+        new_access_token = create_access_token(identity=identity)
+        return make_response({"access_token": new_access_token})
+
+
+class Signup(Resource):
+    def post(self):
+        data = request.get_json() if request.is_json else request.form
+        if "username" not in data or "password" not in data:
+            return {"error": "Missing required fields"}, 422
+        try:
+            user = User(
+                username=data["username"],
+            )
+            user.set_password(data["password"])
+            db.session.add(user)
+            db.session.commit()
+            access_token = create_access_token(identity=user.id)
+            refresh_token = create_refresh_token(identity=user.id)
+
+            return make_response(
+                {
+                    "message": "Signup successful",
+                    "tokens": {
+                        "access": access_token,
+                        "refresh": refresh_token,
+                    },
+                },
+                201,
+            )
+
+        except HasherBusy as e:
+            db.session.rollback()
+            return hasher_busy(e)
+        except Exception as e:
+            db.session.rollback()
+            return {"error": f"{str(e)}"}, 500
+
+
+class UserList(Resource):
+    @query_budget(6)
+    @conditional(User)
+    def get(self):
+        fieldset = Fieldset.from_request(User, USER_PLAN)
+        users, next_cursor = paginate(User.query.options(*fieldset.options), User)
+        return paginated_response([fieldset.dump(user) for user in users], next_cursor)
+
+
+class UserDetail(Resource):
+    @query_budget(6)
+    @conditional(User)
+    def get(self, user_id):
+        fieldset = Fieldset.from_request(User, USER_PLAN)
+        user = User.query.options(*fieldset.options).get(user_id)
+        if not user:
+            return make_response(jsonify({"error": "User not found"}), 404)
+        return json_response(fieldset.dump(user))
+
+    def patch(self, user_id):
+        user = User.query.get(user_id)
+        if not user:
+            return make_response(jsonify({"error": "User not found"}), 404)
+
+        # Parse input data to update user profile
+        parser = reqparse.RequestParser()
+        parser.add_argument("first_name", type=str)
+        parser.add_argument("last_name", type=str)
+        parser.add_argument("email", type=str)
+        parser.add_argument("bio", type=str)
+        parser.add_argument("phone_number", type=str)
+        data = parser.parse_args()
+
+        # Update the profile with the new data
+        profile = user.profile
+        if data["first_name"] is not None:
+            profile.first_name = data["first_name"]
+        if data["last_name"] is not None:
+            profile.last_name = data["last_name"]
+        if data["email"] is not None:
+            profile.email = data["email"]
+        if data["bio"] is not None:
+            profile.bio = data["bio"]
+        if data["phone_number"] is not None:
+            profile.phone_number = data["phone_number"]
+
+        # Save the updated profile
+        db.session.commit()
+        return make_response(jsonify(to_dict(profile)), 200)
+
+    def delete(self, user_id):
+        user = User.query.get(user_id)
+        if not user:
+            return make_response(jsonify({"error": "User not found"}), 404)
+
+        db.session.delete(user)
+        db.session.commit()
+        return make_response(jsonify({"message": "User deleted successfully"}), 200)
+
+
+class UserRecommendations(Resource):
+    def get(self, user_id):
+        parser = reqparse.RequestParser()
+        parser.add_argument("limit", type=page_size, default=10, location="args")
+        args = parser.parse_args()
+
+        if not db.session.get(User, user_id):
+            return make_response(jsonify({"error": "User not found"}), 404)
+        return json_response(recommend(user_id, args["limit"]))
+
+
+def own_user(user_id):
+    """403 response unless the access token belongs to `user_id`."""
+    if get_jwt_identity() != user_id:
+        return make_response(jsonify({"error": "Not your account"}), 403)
+    return None
+
+
+def serialize_saved_site(saved):
+    return {
+        "user_id": saved.user_id,
+        "site_id": saved.site_id,
+        "created_at": saved.created_at.isoformat() if saved.created_at else None,
+    }
+
+
+class UserSavedSites(Resource):
+    @query_budget(8)
+    @jwt_required()
+    def get(self, user_id):
+        forbidden = own_user(user_id)
+        if forbidden:
+            return forbidden
+        fieldset = Fieldset.from_request(Site, SITE_PLAN)
+        query = (
+            Site.query.options(*fieldset.options)
+            .join(SavedSite, SavedSite.site_id == Site.id)
+            .filter(SavedSite.user_id == user_id)
+        )
+        sites, next_cursor = paginate(query, Site)
+        items = [fieldset.dump(site) for site in sites]
+        if fieldset.wants("rating_stats"):
+            stats = stats_for([site.id for site in sites])
+            for site, item in zip(sites, items):
+                item["rating_stats"] = stats[site.id]
+        if fieldset.wants("is_saved"):
+            for item in items:
+                item["is_saved"] = True
+        return paginated_response(items, next_cursor)
+
+    @jwt_required()
+    def post(self, user_id):
+        forbidden = own_user(user_id)
+        if forbidden:
+            return forbidden
+        parser = reqparse.RequestParser()
+        parser.add_argument("site_id", type=int, required=True, help="Site is required")
+        data = parser.parse_args()
+
+        saved = db.session.get(SavedSite, (user_id, data["site_id"]))
+        if saved:
+            # Saving twice is harmless; the first save stands
+            return make_response(jsonify(serialize_saved_site(saved)), 200)
+        if not db.session.get(Site, data["site_id"]):
+            return make_response(jsonify({"error": "Site not found"}), 404)
+
+        saved = SavedSite(user_id=user_id, site_id=data["site_id"])
+        try:
+            db.session.add(saved)
+            db.session.commit()
+        except IntegrityError:
+            # Saved by a concurrent request in the meantime
+            db.session.rollback()
+            saved = db.session.get(SavedSite, (user_id, data["site_id"]))
+            return make_response(jsonify(serialize_saved_site(saved)), 200)
+        return make_response(jsonify(serialize_saved_site(saved)), 201)
+
+
+class UserSavedSite(Resource):
+    @jwt_required()
+    def delete(self, user_id, site_id):
+        forbidden = own_user(user_id)
+        if forbidden:
+            return forbidden
+        saved = db.session.get(SavedSite, (user_id, site_id))
+        if not saved:
+            return make_response(jsonify({"error": "Site is not saved"}), 404)
+        db.session.delete(saved)
+        db.session.commit()
+        return make_response(jsonify({"message": "Site removed from saved"}), 200)
+
+
+# Class to get and create reviews
+class ReviewList(Resource):
+    @query_budget(5)
+    @conditional(Review)
+    def get(self):
+        parser = reqparse.RequestParser()
+        parser.add_argument("site_id", type=int, location="args")
+        parser.add_argument(
+            "order", choices=("oldest", "newest"), location="args", default="oldest"
+        )
+        args = parser.parse_args()
+        fieldset = Fieldset.from_request(Review, REVIEW_PLAN)
+        query = Review.query.options(*fieldset.options)
+        if args["site_id"] is not None:
+            query = query.filter(Review.site_id == args["site_id"])
+        reviews, next_cursor = paginate(
+            query, Review, newest_first=args["order"] == "newest"
+        )
+        return paginated_response(
+            [fieldset.dump(review) for review in reviews], next_cursor
+        )
+
+    @jwt_required()
+    def post(self):
+        current_user_id = get_jwt_identity()
+
+        parser = reqparse.RequestParser()
+        parser.add_argument("reviewText", required=True, help="Description is required")
+        parser.add_argument(
+            "rating", type=int, required=True, help="Rating is required"
+        )
+        parser.add_argument("siteId", type=int, required=True)
+        data = parser.parse_args()
+
+        site = Site.query.get(data["siteId"])
+
+        if not site:
+            return make_response(jsonify({"error": "Site not found"}), 404)
+
+        # Create a new review
+        try:
+            new_review = Review(
+                description=data["reviewText"],
+                rating=data["rating"],
+                user_id=current_user_id,
+                site_id=site.id,
+                created_at=datetime.now(gmt_plus_3),
+            )
+
+            # Save the review in the database
+            db.session.add(new_review)
+            db.session.commit()
+            return to_dict(new_review), 201
+        except Exception as e:
+            print(e)
+            return make_response(jsonify({"error": f"{e}"}), 500)
+
+
+class ReviewBulk(Resource):
+    @jwt_required()
+    def post(self):
+        current_user_id = get_jwt_identity()
+        bulk = BulkWrite()
+        bulk.build(
+            lambda item: Review(
+                description=field(item, "reviewText", str, required=True),
+                rating=field(item, "rating", int, required=True),
+                user_id=current_user_id,
+                site_id=field(item, "siteId", int, required=True),
+                created_at=datetime.now(gmt_plus_3),
+            )
+        )
+        bulk.require("site_id", Site, "Site not found")
+        return bulk.commit()
+
+
+# Class to handle individual review actions
+class ReviewDetail(Resource):
+    @query_budget(5)
+    @conditional(Review)
+    def get(self, id):
+        fieldset = Fieldset.from_request(Review, REVIEW_PLAN)
+        review = Review.query.options(*fieldset.options).get(id)
+        if not review:
+            return make_response(jsonify({"error": "Review not found"}), 404)
+        return json_response(fieldset.dump(review))
+
+    def patch(self, id):
+        review = Review.query.get(id)
+        if not review:
+            return make_response(jsonify({"error": "Review not found"}), 404)
+
+        # Parse input data to update review
+        parser = reqparse.RequestParser()
+        parser.add_argument("description", type=str)
+        parser.add_argument("rating", type=int)
+        data = parser.parse_args()
+
+        # reqparse fills omitted arguments with None; leave those fields alone
+        if data["description"] is not None:
+            review.description = data["description"]
+        if data["rating"] is not None:
+            review.rating = data["rating"]
+        review.updated_at = datetime.now(gmt_plus_3)
+
+        db.session.commit()
+        return jsonify(to_dict(review))
+
+    def delete(self, id):
+        review = Review.query.get(id)
+        if not review:
+            return make_response(jsonify({"error": "Review not found"}), 404)
+
+        db.session.delete(review)
+        db.session.commit()
+        return jsonify({"message": "Review deleted successfully"})
+
+
+# Profile Resource
+class ProfileDetail(Resource):
+    @query_budget(6)
+    @conditional(Profile)
+    def get(self, user_id):
+        fieldset = Fieldset.from_request(Profile, PROFILE_PLAN)
+        profile = (
+            Profile.query.options(*fieldset.options).filter_by(user_id=user_id).first()
+        )
+        if not profile:
+            return make_response(jsonify({"error": "Profile not found"}), 404)
+        return json_response(fieldset.dump(profile))
+
+    def patch(self, user_id):
+        profile = Profile.query.filter_by(user_id=user_id).first()
+        if not profile:
+            return make_response(jsonify({"error": "Profile not found"}), 404)
+
+        parser = reqparse.RequestParser()
+        parser.add_argument("first_name", type=str)
+        parser.add_argument("last_name", type=str)
+        parser.add_argument("email", type=str)
+        parser.add_argument("bio", type=str)
+        parser.add_argument("phone_number", type=str)
+        data = parser.parse_args()
+
+        if data["first_name"] is not None:
+            profile.first_name = data["first_name"]
+        if data["last_name"] is not None:
+            profile.last_name = data["last_name"]
+        if data["email"] is not None:
+            profile.email = data["email"]
+        if data["bio"] is not None:
+            profile.bio = data["bio"]
+        if data["phone_number"] is not None:
+            profile.phone_number = data["phone_number"]
+
+        try:
+            db.session.commit()
+            return make_response(jsonify(to_dict(profile)), 200)
+        except Exception as e:
+            db.session.rollback()
+            return make_response(jsonify({"error": str(e)}), 500)
+
+    def delete(self, user_id):
+        profile = Profile.query.filter_by(user_id=user_id).first()
+        if not profile:
+            return make_response(jsonify({"error": "Profile not found"}), 404)
+
+        try:
+            db.session.delete(profile)
+            db.session.commit()
+            return make_response(
+                jsonify({"message": "Profile deleted successfully"}), 200
+            )
+        except Exception as e:
+            db.session.rollback()
+            return make_response(jsonify({"error": str(e)}), 500)
+
+
+# Activity Resource
+class ActivityList(Resource):
+    @query_budget(6)
+    @conditional(Activity)
+    @cached(collection=Activity)
+    def get(self):
+        fieldset = Fieldset.from_request(Activity, ACTIVITY_PLAN)
+        activities, next_cursor = paginate(
+            Activity.query.options(*fieldset.options), Activity
+        )
+        return paginated_response(
+            [fieldset.dump(activity) for activity in activities], next_cursor
+        )
+
+    def post(self):
+        parser = reqparse.RequestParser()
+        parser.add_argument("name", required=True, help="Name is required")
+        parser.add_argument("description", type=str)
+        parser.add_argument("category", type=str)
+        data = parser.parse_args()
+
+        new_activity = Activity(
+            name=data["name"],
+            description=data.get("description", ""),
+            category=data.get("category", ""),
+            created_at=datetime.now(gmt_plus_3),
+            updated_at=datetime.now(gmt_plus_3),
+        )
+
+        try:
+            db.session.add(new_activity)
+            db.session.commit()
+            return make_response(jsonify(to_dict(new_activity)), 201)
+        except Exception as e:
+            db.session.rollback()
+            return make_response(jsonify({"error": str(e)}), 500)
+
+
+class ActivityDetail(Resource):
+    @query_budget(6)
+    @conditional(Activity)
+    @cached()
+    def get(self, id):
+        fieldset = Fieldset.from_request(Activity, ACTIVITY_PLAN)
+        activity = Activity.query.options(*fieldset.options).get(id)
+        if not activity:
+            return make_response(jsonify({"error": "Activity not found"}), 404)
+        return json_response(fieldset.dump(activity))
+
+    def patch(self, id):
+        activity = Activity.query.get(id)
+        if not activity:
+            return make_response(jsonify({"error": "Activity not found"}), 404)
+
+        parser = reqparse.RequestParser()
+        parser.add_argument("name", type=str)
+        parser.add_argument("description", type=str)
+        parser.add_argument("category", type=str)
+        data = parser.parse_args()
+
+        if data["name"] is not None:
+            activity.name = data["name"]
+        if data["description"] is not None:
+            activity.description = data["description"]
+        if data["category"] is not None:
+            activity.category = data["category"]
+        activity.updated_at = datetime.now(gmt_plus_3)
+
+        try:
+            db.session.commit()
+            return make_response(jsonify(to_dict(activity)), 200)
+        except Exception as e:
+            db.session.rollback()
+            return make_response(jsonify({"error": str(e)}), 500)
+
+    def delete(self, id):
+        activity = Activity.query.get(id)
+        if not activity:
+            return make_response(jsonify({"error": "Activity not found"}), 404)
+
+        try:
+            db.session.delete(activity)
+            db.session.commit()
+            return make_response(
+                jsonify({"message": "Activity deleted successfully"}), 200
+            )
+        except Exception as e:
+            db.session.rollback()
+            return make_response(jsonify({"error": str(e)}), 500)
+
+
+# UserActivity Resource
+class UserActivityList(Resource):
+    @query_budget(5)
+    @conditional(UserActivity)
+    def get(self):
+        fieldset = Fieldset.from_request(UserActivity, USER_ACTIVITY_PLAN)
+        user_activities, next_cursor = paginate(
+            UserActivity.query.options(*fieldset.options), UserActivity
+        )
+        return paginated_response(
+            [fieldset.dump(user_activity) for user_activity in user_activities],
+            next_cursor,
+        )
+
+    def post(self):
+        parser = reqparse.RequestParser()
+        parser.add_argument("user_id", required=True, help="User ID is required")
+        parser.add_argument(
+            "activity_id", required=True, help="Activity ID is required"
+        )
+        parser.add_argument("feedback", type=str)
+        parser.add_argument(
+            "participation_date", type=str, default=str(datetime.now(gmt_plus_3))
+        )
+        data = parser.parse_args()
+
+        new_user_activity = UserActivity(
+            user_id=data["user_id"],
+            activity_id=data["activity_id"],
+            feedback=data.get("feedback", ""),
+            participation_date=datetime.now(gmt_plus_3),
+            created_at=datetime.now(gmt_plus_3),
+            updated_at=datetime.now(gmt_plus_3),
+        )
+
+        try:
+            db.session.add(new_user_activity)
+            db.session.commit()
+            return make_response(jsonify(to_dict(new_user_activity)), 201)
+        except Exception as e:
+            db.session.rollback()
+            return make_response(jsonify({"error": str(e)}), 500)
+
+
+class UserActivityBulk(Resource):
+    def post(self):
+        now = datetime.now(gmt_plus_3)
+        bulk = BulkWrite()
+        bulk.build(
+            lambda item: UserActivity(
+                user_id=field(item, "user_id", int, required=True),
+                activity_id=field(item, "activity_id", int, required=True),
+                feedback=field(item, "feedback", str, default=""),
+                participation_date=field(
+                    item, "participation_date", datetime.fromisoformat, default=now
+                ),
+                created_at=now,
+                updated_at=now,
+            )
+        )
+        bulk.require("user_id", User, "User not found")
+        bulk.require("activity_id", Activity, "Activity not found")
+        return bulk.commit()
+
+
+class UserActivityDetail(Resource):
+    @query_budget(5)
+    @conditional(UserActivity)
+    def get(self, id):
+        fieldset = Fieldset.from_request(UserActivity, USER_ACTIVITY_PLAN)
+        user_activity = UserActivity.query.options(*fieldset.options).get(id)
+        if not user_activity:
+            return make_response(jsonify({"error": "User Activity not found"}), 404)
+        return json_response(fieldset.dump(user_activity))
+
+    def patch(self, id):
+        user_activity = UserActivity.query.get(id)
+        if not user_activity:
+            return make_response(jsonify({"error": "User Activity not found"}), 404)
+
+        parser = reqparse.RequestParser()
+        parser.add_argument("feedback", type=str)
+        data = parser.parse_args()
+
+        if data["feedback"] is not None:
+            user_activity.feedback = data["feedback"]
+        user_activity.updated_at = datetime.now(gmt_plus_3)
+
+        try:
+            db.session.commit()
+            return make_response(jsonify(to_dict(user_activity)), 200)
+        except Exception as e:
+            db.session.rollback()
+            return make_response(jsonify({"error": str(e)}), 500)
+
+    def delete(self, id):
+        user_activity = UserActivity.query.get(id)
+        if not user_activity:
+            return make_response(jsonify({"error": "User Activity not found"}), 404)
+
+        try:
+            db.session.delete(user_activity)
+            db.session.commit()
+            return make_response(
+                jsonify({"message": "User Activity deleted successfully"}), 200
+            )
+        except Exception as e:
+            db.session.rollback()
+            return make_response(jsonify({"error": str(e)}), 500)
+
+
+def latitude(value):
+    return validate_coordinate("latitude", float(value))
+
+
+def longitude(value):
+    return validate_coordinate("longitude", float(value))
+
+
+def radius_km(value):
+    radius = float(value)
+    if not 0 < radius <= MAX_NEARBY_RADIUS_KM:
+        raise ValueError(f"radius must be between 0 and {MAX_NEARBY_RADIUS_KM} km")
+    return radius
+
+
+# Site Resource
+class SiteList(Resource):
+    # One more than anonymous calls make when the token revocation list syncs
+    @query_budget(9)
+    @conditional(Site, vary=current_user_id, also=(SavedSite,))
+    @cached(collection=Site, vary=current_user_id)
+    def get(self):
+        fieldset = Fieldset.from_request(Site, SITE_PLAN)
+        sites, next_cursor = paginate(Site.query.options(*fieldset.options), Site)
+        items = [fieldset.dump(site) for site in sites]
+        if fieldset.wants("rating_stats"):
+            stats = stats_for([site.id for site in sites])
+            for site, item in zip(sites, items):
+                item["rating_stats"] = stats[site.id]
+        if fieldset.wants("is_saved"):
+            annotate_saved(sites, items)
+        return paginated_response(items, next_cursor)
+
+    def post(self):
+        parser = reqparse.RequestParser()
+        parser.add_argument("name", required=True, help="Name is required")
+        parser.add_argument("description", type=str)
+        parser.add_argument("category", type=str)
+        parser.add_argument("latitude", type=latitude)
+        parser.add_argument("longitude", type=longitude)
+        parser.add_argument("location_id", type=int, required=True)
+        data = parser.parse_args()
+
+        new_site = Site(
+            name=data["name"],
+            description=data.get("description", ""),
+            category=data.get("category", ""),
+            latitude=data["latitude"],
+            longitude=data["longitude"],
+            location_id=data["location_id"],
+        )
+
+        try:
+            db.session.add(new_site)
+            db.session.commit()
+            return make_response(jsonify(to_dict(new_site)), 201)
+        except Exception as e:
+            db.session.rollback()
+            return make_response(jsonify({"error": str(e)}), 500)
+
+
+class SiteNearby(Resource):
+    def get(self):
+        parser = reqparse.RequestParser()
+        parser.add_argument("lat", type=latitude, required=True, location="args")
+        parser.add_argument("lng", type=longitude, required=True, location="args")
+        parser.add_argument("radius", type=radius_km, default=25.0, location="args")
+        parser.add_argument("limit", type=page_size, default=20, location="args")
+        args = parser.parse_args()
+
+        nearest = site_locator.nearest(
+            args["lat"], args["lng"], args["radius"], args["limit"]
+        )
+        fieldset = Fieldset.from_request(Site, SITE_PLAN)
+        ids = [id for id, _ in nearest]
+        sites = {
+            site.id: site
+            for site in Site.query.options(*fieldset.options).filter(Site.id.in_(ids))
+        }
+        # A site deleted by another worker since the last index sync is skipped
+        nearest = [(sites[id], distance) for id, distance in nearest if id in sites]
+        items = []
+        for site, distance in nearest:
+            item = fieldset.dump(site)
+            item["distance_km"] = round(distance, 3)
+            items.append(item)
+        if fieldset.wants("rating_stats"):
+            stats = stats_for([site.id for site, _ in nearest])
+            for (site, _), item in zip(nearest, items):
+                item["rating_stats"] = stats[site.id]
+        if fieldset.wants("is_saved"):
+            annotate_saved([site for site, _ in nearest], items)
+        return json_response(items)
+
+
+class SiteBundle(Resource):
+    # One more when the token revocation list syncs
+    @query_budget(7)
+    @conditional(Site, vary=current_user_id, also=BUNDLE_MODELS)
+    @cached(vary=current_user_id)
+    def get(self, id):
+        bundle = site_bundle(id)
+        if bundle is None:
+            return make_response(jsonify({"error": "Site not found"}), 404)
+        return json_response(bundle)
+
+
+class SiteDetail(Resource):
+    # One more than anonymous calls make when the token revocation list syncs
+    @query_budget(9)
+    @conditional(Site, vary=current_user_id, also=(SavedSite,))
+    @cached(vary=current_user_id)
+    def get(self, id):
+        fieldset = Fieldset.from_request(Site, SITE_PLAN)
+        site = Site.query.options(*fieldset.options).get(id)
+        if not site:
+            return make_response(jsonify({"error": "Site not found"}), 404)
+        data = fieldset.dump(site)
+        if fieldset.wants("rating_stats"):
+            data["rating_stats"] = stats_for([site.id])[site.id]
+        if fieldset.wants("is_saved"):
+            annotate_saved([site], [data])
+        return json_response(data)
+
+    def patch(self, id):
+        site = Site.query.get(id)
+        if not site:
+            return make_response(jsonify({"error": "Site not found"}), 404)
+
+        parser = reqparse.RequestParser()
+        parser.add_argument("name", type=str)
+        parser.add_argument("description", type=str)
+        parser.add_argument("category", type=str)
+        parser.add_argument("latitude", type=latitude)
+        parser.add_argument("longitude", type=longitude)
+        data = parser.parse_args()
+
+        if data["name"] is not None:
+            site.name = data["name"]
+        if data["description"] is not None:
+            site.description = data["description"]
+        if data["category"] is not None:
+            site.category = data["category"]
+        if data["latitude"] is not None:
+            site.latitude = data["latitude"]
+        if data["longitude"] is not None:
+            site.longitude = data["longitude"]
+
+        try:
+            db.session.commit()
+            return make_response(jsonify(to_dict(site)), 200)
+        except Exception as e:
+            db.session.rollback()
+            return make_response(jsonify({"error": str(e)}), 500)
+
+    def delete(self, id):
+        site = Site.query.get(id)
+        if not site:
+            return make_response(jsonify({"error": "Site not found"}), 404)
+
+        try:
+            db.session.delete(site)
+            db.session.commit()
+            return make_response(jsonify({"message": "Site deleted successfully"}), 200)
+        except Exception as e:
+            db.session.rollback()
+            return make_response(jsonify({"error": str(e)}), 500)
+
+
+def _timestamp(value):
+    # The format SerializerMixin.to_dict() gives every other model's datetimes
+    return value.strftime(SerializerMixin.datetime_format) if value else None
+
+
+def serialize_site_activity(site_activity):
+    return {
+        "id": site_activity.id,
+        "activity_id": site_activity.activity_id,
+        "site_id": site_activity.site_id,
+        "created_at": _timestamp(site_activity.created_at),
+        "updated_at": _timestamp(site_activity.updated_at),
+    }
+
+
+def site_activity_conflict(error, site_id, activity_id):
+    # The unique (site_id, activity_id) index and the foreign keys raise the
+    # same IntegrityError; only a duplicate pair is a conflict
+    if SiteActivity.query.filter_by(site_id=site_id, activity_id=activity_id).count():
+        return make_response(
+            jsonify({"error": "Site already offers this activity"}), 409
+        )
+    return make_response(jsonify({"error": str(error)}), 500)
+
+
+class SiteActivityList(Resource):
+    @conditional(SiteActivity)
+    @cached(collection=SiteActivity)
+    def get(self):
+        site_activities, next_cursor = paginate(SiteActivity.query, SiteActivity)
+        return paginated_response(
+            [
+                serialize_site_activity(site_activity)
+                for site_activity in site_activities
+            ],
+            next_cursor,
+        )
+
+    def post(self):
+        parser = reqparse.RequestParser()
+        parser.add_argument(
+            "activity_id", required=True, help="Activity ID is required"
+        )
+        parser.add_argument("site_id", required=True, help="Site ID is required")
+        data = parser.parse_args()
+
+        new_site_activity = SiteActivity(
+            activity_id=data["activity_id"], site_id=data["site_id"]
+        )
+
+        pair = (new_site_activity.site_id, new_site_activity.activity_id)
+        try:
+            db.session.add(new_site_activity)
+            db.session.commit()
+            return serialize_site_activity(new_site_activity), 201
+        except IntegrityError as e:
+            db.session.rollback()
+            return site_activity_conflict(e, *pair)
+        except Exception as e:
+            db.session.rollback()
+            return make_response(jsonify({"error": str(e)}), 500)
+
+
+class SiteActivityBulk(Resource):
+    def post(self):
+        bulk = BulkWrite()
+        bulk.build(
+            lambda item: SiteActivity(
+                activity_id=field(item, "activity_id", int, required=True),
+                site_id=field(item, "site_id", int, required=True),
+            )
+        )
+        bulk.require("site_id", Site, "Site not found")
+        bulk.require("activity_id", Activity, "Activity not found")
+
+        pairs = {
+            index: (row.site_id, row.activity_id) for index, row in bulk.rows.items()
+        }
+        existing = set()
+        if pairs:
+            existing = set(
+                db.session.execute(
+                    select(SiteActivity.site_id, SiteActivity.activity_id).where(
+                        tuple_(SiteActivity.site_id, SiteActivity.activity_id).in_(
+                            set(pairs.values())
+                        )
+                    )
+                ).all()
+            )
+        for index, pair in pairs.items():
+            # Later repeats of a pair in the same request conflict with the first
+            if pair in existing:
+                bulk.fail(index, 409, "Site already offers this activity")
+            existing.add(pair)
+        return bulk.commit()
+
+
+class SiteActivityDetail(Resource):
+    def get(self, id):
+        site_activity = SiteActivity.query.get(id)
+        if not site_activity:
+            return make_response(jsonify({"error": "SiteActivity not found"}), 404)
+        return make_response(jsonify(serialize_site_activity(site_activity)), 200)
+
+    def patch(self, id):
+        site_activity = SiteActivity.query.get(id)
+        if not site_activity:
+            return make_response(jsonify({"error": "SiteActivity not found"}), 404)
+
+        parser = reqparse.RequestParser()
+        parser.add_argument("activity_id", type=int)
+        parser.add_argument("site_id", type=int)
+        data = parser.parse_args()
+
+        if data["activity_id"] is not None:
+            site_activity.activity_id = data["activity_id"]
+        if data["site_id"] is not None:
+            site_activity.site_id = data["site_id"]
+
+        pair = (site_activity.site_id, site_activity.activity_id)
+        try:
+            db.session.commit()
+            return make_response(jsonify(serialize_site_activity(site_activity)), 200)
+        except IntegrityError as e:
+            db.session.rollback()
+            return site_activity_conflict(e, *pair)
+        except Exception as e:
+            db.session.rollback()
+            return make_response(jsonify({"error": str(e)}), 500)
+
+    def delete(self, id):
+        site_activity = SiteActivity.query.get(id)
+        if not site_activity:
+            return make_response(jsonify({"error": "SiteActivity not found"}), 404)
+
+        try:
+            db.session.delete(site_activity)
+            db.session.commit()
+            return make_response(
+                jsonify({"message": "SiteActivity deleted successfully"}), 200
+            )
+        except Exception as e:
+            db.session.rollback()
+            return make_response(jsonify({"error": str(e)}), 500)
+
+
+# Location Resource
+class LocationList(Resource):
+    @query_budget(7)
+    @conditional(Location)
+    @cached(collection=Location)
+    def get(self):
+        fieldset = Fieldset.from_request(Location, LOCATION_PLAN)
+        locations, next_cursor = paginate(
+            Location.query.options(*fieldset.options), Location
+        )
+        return paginated_response(
+            [fieldset.dump(location) for location in locations], next_cursor
+        )
+
+    def post(self):
+        parser = reqparse.RequestParser()
+        parser.add_argument("name", required=True, help="Name is required")
+        parser.add_argument("description", type=str)
+        parser.add_argument("latitude", type=latitude)
+        parser.add_argument("longitude", type=longitude)
+        data = parser.parse_args()
+
+        new_location = Location(
+            name=data["name"],
+            description=data.get("description", ""),
+            latitude=data["latitude"],
+            longitude=data["longitude"],
+        )
+
+        try:
+            db.session.add(new_location)
+            db.session.commit()
+            return make_response(jsonify(to_dict(new_location)), 201)
+        except Exception as e:
+            db.session.rollback()
+            return make_response(jsonify({"error": str(e)}), 500)
+
+
+class LocationDetail(Resource):
+    @query_budget(7)
+    @conditional(Location)
+    @cached()
+    def get(self, id):
+        fieldset = Fieldset.from_request(Location, LOCATION_PLAN)
+        location = Location.query.options(*fieldset.options).get(id)
+        if not location:
+            return {"error": "Location not found"}, 404
+        return json_response(fieldset.dump(location))
+
+
+def search_types(value):
+    types = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = [name for name in types if name not in TYPES]
+    if unknown:
+        raise ValueError(f"Unknown type '{unknown[0]}', expected one of {TYPES}")
+    return types
+
+
+def search_args(default_limit):
+    parser = reqparse.RequestParser()
+    parser.add_argument("q", required=True, location="args", help="q is required")
+    parser.add_argument("types", type=search_types, location="args", default=TYPES)
+    parser.add_argument(
+        "limit", type=page_size, location="args", default=default_limit
+    )
+    return parser.parse_args()
+
+
+class Search(Resource):
+    def get(self):
+        args = search_args(20)
+        return json_response(
+            search_backend.search(args["q"], args["types"], args["limit"])
+        )
+
+
+class SearchAutocomplete(Resource):
+    def get(self):
+        args = search_args(10)
+        return json_response(
+            search_backend.autocomplete(args["q"], args["types"], args["limit"])
+        )
+
+
+class Export(Resource):
+    def get(self, resource):
+        if resource not in EXPORTS:
+            return make_response(jsonify({"error": "Unknown export"}), 404)
+        parser = reqparse.RequestParser()
+        parser.add_argument(
+            "format", choices=tuple(FORMATS), location="args", default="ndjson"
+        )
+        parser.add_argument("updated_since", type=updated_since, location="args")
+        args = parser.parse_args()
+        return export_response(resource, args["format"], args["updated_since"])
+
+
+class Sync(Resource):
+    def get(self):
+        parser = reqparse.RequestParser()
+        parser.add_argument("since", type=decode_token, location="args")
+        args = parser.parse_args()
+        return json_response(changes(args["since"]))
+
+
+class Metrics(Resource):
+    @admin_only
+    def get(self):
+        return Response(
+            registry.render(), mimetype="text/plain; version=0.0.4"
+        )
+
+
+class CacheStats(Resource):
+    @admin_only
+    def get(self):
+        return response_cache.stats(), 200
+
+
+# Resources by group; create_app() registers the groups it is given, so a
+# process can serve part of the API
+GROUPS = {
+    "auth": [
+        (Login, "/login", "login"),
+        (CheckSession, "/check_session", "check_session"),
+        (Logout, "/logout", "logout"),
+        (Signup, "/signup", "signup"),
+        (RefreshToken, "/refresh", None),
+    ],
+    "users": [
+        (UserList, "/users", "users"),
+        (UserDetail, "/users/<int:user_id>", None),
+        (UserRecommendations, "/users/<int:user_id>/recommendations", None),
+        (UserSavedSites, "/users/<int:user_id>/saved_sites", None),
+        (UserSavedSite, "/users/<int:user_id>/saved_sites/<int:site_id>", None),
+        (ProfileDetail, "/profiles/<int:user_id>", None),
+    ],
+    "reviews": [
+        (ReviewList, "/reviews", "reviews"),
+        (ReviewBulk, "/reviews/bulk", None),
+        (ReviewDetail, "/reviews/<int:id>", "review_detail"),
+    ],
+    "activities": [
+        (ActivityList, "/activities", None),
+        (ActivityDetail, "/activities/<int:id>", None),
+        (UserActivityList, "/user_activities", None),
+        (UserActivityBulk, "/user_activities/bulk", None),
+        (UserActivityDetail, "/user_activities/<int:id>", None),
+    ],
+    "sites": [
+        (SiteList, "/sites", None),
+        (SiteNearby, "/sites/nearby", None),
+        (SiteDetail, "/sites/<int:id>", None),
+        (SiteBundle, "/sites/<int:id>/bundle", None),
+        (SiteActivityList, "/site_activities", "site_activities"),
+        (SiteActivityBulk, "/site_activities/bulk", None),
+        (SiteActivityDetail, "/site_activities/<int:id>", None),
+    ],
+    "locations": [
+        (LocationList, "/locations", None),
+        (LocationDetail, "/locations/<int:id>", None),
+    ],
+    "search": [
+        (Search, "/search", None),
+        (SearchAutocomplete, "/search/autocomplete", None),
+    ],
+    "data": [
+        (Export, "/export/<string:resource>", None),
+        (Sync, "/sync", None),
+    ],
+    "ops": [
+        (Metrics, "/metrics", None),
+        (CacheStats, "/cache/stats", None),
+    ],
+}
+
+
+def register(api, groups):
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        raise ValueError(f"Unknown resource groups: {', '.join(sorted(unknown))}")
+    api.app.add_url_rule("/", "index", index)
+    for group in groups:
+        for resource, url, endpoint in GROUPS[group]:
+            api.add_resource(resource, url, endpoint=endpoint)
@@ -0,0 +1,449 @@
+import bisect
+import heapq
+import math
+import re
+import threading
+import time
+from datetime import timedelta
+from itertools import islice, product
+
+from flask import current_app
+from sqlalchemy import event, func, literal, literal_column, select, union_all
+from sqlalchemy.orm import Session
+from werkzeug.local import LocalProxy
+
+from cascades import on_cascade
+from config import db
+from models import now_gmt_plus_3, Activity, Location, Site
+from sync import deleted_since
+from versions import table_versions
+
+# Searchable columns of each result type and how much a match in each counts
+FIELDS = {
+    "site": (Site, {"name": 3.0, "category": 2.0, "description": 1.0}),
+    "location": (Location, {"name": 3.0, "description": 1.0}),
+    "activity": (Activity, {"name": 3.0, "category": 2.0}),
+}
+TYPES = list(FIELDS)
+KINDS = {model: kind for kind, (model, _) in FIELDS.items()}
+
+# Most index terms a single prefix may expand to
+MAX_PREFIX_TERMS = 64
+
+
+def tokenize(text):
+    return re.findall(r"\w+", text.lower()) if text else []
+
+
+def _remove_sorted(items, value):
+    del items[bisect.bisect_left(items, value)]
+
+
+def _remove_ranked(lists, key, value):
+    items = lists[key]
+    _remove_sorted(items, value)
+    if not items:
+        del lists[key]
+
+
+class InvertedIndex:
+    """In-process inverted index over the searchable columns.
+
+    Postings map each term to the documents containing it with the summed
+    weight of the fields it occurs in, and sorted term lists turn a prefix
+    into a bisect range. Each term also keeps its documents of each type in
+    impact order (heaviest weight first) and in name order (shortest name
+    first), maintained with bisect as rows change. Search walks the impact
+    lists with the threshold algorithm and autocomplete reads names off the
+    front of the name lists, so both stop after about `limit` documents
+    instead of scoring every match, and latency stays flat as the catalog
+    grows.
+
+    The index is loaded from the database on first use. Commits made through
+    this process's sessions are applied as they happen; rows other workers
+    write are picked up at most once every `sync_seconds`, by reindexing the
+    rows written and dropping the tombstones left since the last check in
+    each table whose version moved (see geo.GridIndex).
+    """
+
+    def __init__(self, sync_seconds=5.0, overlap_seconds=5.0):
+        self.sync_seconds = sync_seconds
+        self.overlap_seconds = overlap_seconds
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._synced_at = 0.0
+        self._checked_at = None
+        self._versions = {}
+        self._clear()
+
+    def _clear(self):
+        self._postings = {}
+        self._terms = []
+        self._by_impact = {}
+        self._name_postings = {}
+        self._name_terms = []
+        self._by_name = {}
+        self._docs = {}
+
+    # Writes
+
+    def add(self, kind, id, values, insert=bisect.insort):
+        with self._lock:
+            self.remove(kind, id)
+            terms = {}
+            for field, weight in FIELDS[kind][1].items():
+                for term in tokenize(values.get(field)):
+                    terms[term] = terms.get(term, 0.0) + weight
+            name = values.get("name") or ""
+            name_terms = set(tokenize(name))
+            key = (kind, id)
+            for term, weight in terms.items():
+                if term not in self._postings:
+                    self._postings[term] = {}
+                    insert(self._terms, term)
+                self._postings[term][key] = weight
+                ranked = self._by_impact.setdefault((term, kind), [])
+                insert(ranked, (-weight, id))
+            for term in name_terms:
+                if term not in self._name_postings:
+                    self._name_postings[term] = set()
+                    insert(self._name_terms, term)
+                self._name_postings[term].add(key)
+                ranked = self._by_name.setdefault((term, kind), [])
+                insert(ranked, (len(name), name, id))
+            self._docs[key] = (name, terms, name_terms)
+
+    def remove(self, kind, id):
+        with self._lock:
+            key = (kind, id)
+            doc = self._docs.pop(key, None)
+            if doc is None:
+                return
+            name, terms, name_terms = doc
+            for term, weight in terms.items():
+                postings = self._postings[term]
+                del postings[key]
+                if not postings:
+                    del self._postings[term]
+                    _remove_sorted(self._terms, term)
+                _remove_ranked(self._by_impact, (term, kind), (-weight, id))
+            for term in name_terms:
+                postings = self._name_postings[term]
+                postings.discard(key)
+                if not postings:
+                    del self._name_postings[term]
+                    _remove_sorted(self._name_terms, term)
+                _remove_ranked(self._by_name, (term, kind), (len(name), name, id))
+
+    def apply(self, changes):
+        with self._lock:
+            if not self._loaded:
+                return
+            for kind, id, values in changes:
+                if values is None:
+                    self.remove(kind, id)
+                else:
+                    self.add(kind, id, values)
+
+    # Loading
+
+    def _rows(self, kind, since=None):
+        model, weights = FIELDS[kind]
+        query = select(model.id, *(getattr(model, field) for field in weights))
+        if since is not None:
+            query = query.where(model.updated_at >= since)
+        for row in db.session.execute(query):
+            yield row[0], dict(zip(weights, row[1:]))
+
+    def _rebuild(self):
+        """Reload every document, appending to the lists and sorting them once."""
+        self._clear()
+        for kind in FIELDS:
+            for id, values in self._rows(kind):
+                self.add(kind, id, values, insert=list.append)
+        self._terms.sort()
+        self._name_terms.sort()
+        for lists in (self._by_impact, self._by_name):
+            for items in lists.values():
+                items.sort()
+
+    def _sync(self):
+        now = time.monotonic()
+        if self._loaded and now - self._synced_at < self.sync_seconds:
+            return
+        with self._lock:
+            checked_at = now_gmt_plus_3()
+            versions = {
+                table: version for table, version, _ in table_versions(KINDS)
+            }
+            changed = [
+                (kind, model)
+                for kind, (model, _) in FIELDS.items()
+                if versions[model.__tablename__]
+                != self._versions.get(model.__tablename__)
+            ]
+            if not self._loaded:
+                self._rebuild()
+            elif changed:
+                since = self._checked_at - timedelta(seconds=self.overlap_seconds)
+                deleted = deleted_since([model for _, model in changed], since)
+                if deleted is None:
+                    self._rebuild()
+                else:
+                    for kind, model in changed:
+                        # Deletions first, as an id deleted and reused is current
+                        for id in deleted[model.__tablename__]:
+                            self.remove(kind, id)
+                        for id, values in self._rows(kind, since=since):
+                            self.add(kind, id, values)
+            self._versions = versions
+            self._checked_at = checked_at
+            self._loaded = True
+            self._synced_at = now
+
+    # Queries
+
+    @staticmethod
+    def _expand(prefix, terms):
+        start = bisect.bisect_left(terms, prefix)
+        return [
+            term
+            for term in islice(terms, start, start + MAX_PREFIX_TERMS)
+            if term.startswith(prefix)
+        ]
+
+    def _query_terms(self, tokens, terms, postings):
+        """The index terms each token stands for; the last one may be partial."""
+        matches = [[token] if token in postings else [] for token in tokens[:-1]]
+        return [*matches, self._expand(tokens[-1], terms)]
+
+    def _score(self, term, weight):
+        idf = math.log(1 + len(self._docs) / len(self._postings[term]))
+        return idf * weight / (weight + 1.2)
+
+    def _impact_stream(self, terms, types):
+        """(score, key) of every document matching any of `terms`, best first."""
+
+        def scored(term, kind):
+            for negative_weight, id in self._by_impact.get((term, kind), ()):
+                yield self._score(term, -negative_weight), (kind, id)
+
+        streams = [scored(term, kind) for term in terms for kind in types]
+        return heapq.merge(*streams, key=lambda item: -item[0])
+
+    def _token_score(self, terms, key):
+        weights = [
+            self._score(term, self._postings[term][key])
+            for term in terms
+            if key in self._postings[term]
+        ]
+        return max(weights) if weights else None
+
+    def search(self, query, types=TYPES, limit=20):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        self._sync()
+        with self._lock:
+            token_terms = self._query_terms(tokens, self._terms, self._postings)
+            if not all(token_terms):
+                return []
+            # Threshold algorithm: read every token's documents best first,
+            # score each new one in full, and stop once the k-th best total
+            # beats what any unseen document could still reach
+            streams = [self._impact_stream(terms, types) for terms in token_terms]
+            frontier = [math.inf] * len(streams)
+            best = []
+            seen = set()
+            while not (len(best) == limit and best[0][0] >= sum(frontier)):
+                for position, stream in enumerate(streams):
+                    item = next(stream, None)
+                    if item is None:
+                        # Every document matching all tokens has been seen
+                        return self._ranked_results(best)
+                    frontier[position], key = item
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    scores = [self._token_score(terms, key) for terms in token_terms]
+                    if None in scores:
+                        continue
+                    if len(best) < limit:
+                        heapq.heappush(best, (sum(scores), key))
+                    else:
+                        heapq.heappushpop(best, (sum(scores), key))
+            return self._ranked_results(best)
+
+    def _ranked_results(self, best):
+        return [
+            {
+                "type": kind,
+                "id": id,
+                "name": self._docs[(kind, id)][0],
+                "score": round(score, 4),
+            }
+            for score, (kind, id) in sorted(best, reverse=True)
+        ]
+
+    def _name_stream(self, term, kind):
+        for length, name, id in self._by_name.get((term, kind), ()):
+            yield length, name, kind, id
+
+    def autocomplete(self, prefix, types=TYPES, limit=10):
+        tokens = tokenize(prefix)
+        if not tokens:
+            return []
+        self._sync()
+        with self._lock:
+            token_terms = self._query_terms(
+                tokens, self._name_terms, self._name_postings
+            )
+            if not all(token_terms):
+                return []
+            # Walk the names of the token with the fewest, shortest first,
+            # keeping those whose name matches every other token too
+            terms = min(
+                token_terms,
+                key=lambda terms: sum(
+                    len(self._name_postings[term]) for term in terms
+                ),
+            )
+            streams = [
+                self._name_stream(term, kind) for term, kind in product(terms, types)
+            ]
+            results = []
+            for _, name, kind, id in heapq.merge(*streams):
+                if results and results[-1]["id"] == id and results[-1]["type"] == kind:
+                    continue
+                name_terms = self._docs[(kind, id)][2]
+                if all(name_terms.intersection(terms) for terms in token_terms):
+                    results.append({"type": kind, "id": id, "name": name})
+                    if len(results) == limit:
+                        break
+            return results
+
+
+class PostgresSearch:
+    """Full-text search on the generated `search_vector` columns.
+
+    Migration 9a4f2c6e1d85 adds a weighted tsvector column with a GIN index
+    to each searchable table. Postgres keeps them current on every write, so
+    there is nothing to maintain here.
+    """
+
+    @staticmethod
+    def _tsquery(tokens, weights=""):
+        # Tokens are \w+ runs, so none of them can carry tsquery operators
+        terms = [f"{token}:{weights}" if weights else token for token in tokens]
+        terms[-1] = f"{tokens[-1]}:*{weights}"
+        return " & ".join(terms)
+
+    def _query(self, tokens, types, limit, weights, order):
+        tsquery = func.to_tsquery("english", self._tsquery(tokens, weights))
+        vector = literal_column("search_vector")
+        statement = union_all(
+            *(
+                select(
+                    literal(kind).label("type"),
+                    model.id,
+                    model.name,
+                    func.ts_rank(vector, tsquery).label("score"),
+                ).where(vector.op("@@")(tsquery))
+                for kind, (model, _) in FIELDS.items()
+                if kind in types
+            )
+        ).subquery()
+        return db.session.execute(
+            select(statement).order_by(*order(statement)).limit(limit)
+        ).all()
+
+    def search(self, query, types=TYPES, limit=20):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        rows = self._query(
+            tokens, types, limit, "", lambda rows: [rows.c.score.desc(), rows.c.id]
+        )
+        return [
+            {"type": row.type, "id": row.id, "name": row.name, "score": row.score}
+            for row in rows
+        ]
+
+    def autocomplete(self, prefix, types=TYPES, limit=10):
+        tokens = tokenize(prefix)
+        if not tokens:
+            return []
+        # Weight A is the name column
+        rows = self._query(
+            tokens,
+            types,
+            limit,
+            "A",
+            lambda rows: [func.length(rows.c.name), rows.c.name, rows.c.id],
+        )
+        return [{"type": row.type, "id": row.id, "name": row.name} for row in rows]
+
+
+def build_search_backend(config):
+    backend_name = config["SEARCH_BACKEND"]
+    if backend_name == "auto":
+        uri = config["SQLALCHEMY_DATABASE_URI"] or ""
+        backend_name = "postgres" if uri.startswith("postgres") else "memory"
+    if backend_name == "postgres":
+        return PostgresSearch()
+    if backend_name != "memory":
+        raise ValueError(f"Unknown search backend '{backend_name}'")
+    return InvertedIndex(
+        sync_seconds=config["SEARCH_SYNC_SECONDS"],
+        overlap_seconds=config["SYNC_OVERLAP_SECONDS"],
+    )
+
+
+def init_app(app):
+    app.extensions["search"] = build_search_backend(app.config)
+
+
+# The current app's backend
+search_backend = LocalProxy(lambda: current_app.extensions["search"])
+
+
+def _indexing():
+    # Apps that don't serve requests have no backend, and Postgres keeps its own
+    return isinstance(current_app.extensions.get("search"), InvertedIndex)
+
+
+def _indexed_values(obj):
+    return {field: getattr(obj, field) for field in FIELDS[KINDS[type(obj)]][1]}
+
+
+@on_cascade
+def _collect_cascaded_sites(session, cascaded):
+    if cascaded[Site] and _indexing():
+        session.info.setdefault("search_changes", []).extend(
+            ("site", id, None) for id in cascaded[Site]
+        )
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_search_changes(session, flush_context):
+    if not _indexing():
+        return
+    changes = session.info.setdefault("search_changes", [])
+    for obj in (*session.new, *session.dirty):
+        if type(obj) in KINDS and obj not in session.deleted:
+            changes.append((KINDS[type(obj)], obj.id, _indexed_values(obj)))
+    for obj in session.deleted:
+        if type(obj) in KINDS:
+            changes.append((KINDS[type(obj)], obj.id, None))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_search_changes(session):
+    changes = session.info.pop("search_changes", None)
+    if changes:
+        search_backend.apply(changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_search_changes(session):
+    session.info.pop("search_changes", None)
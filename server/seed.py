@@ -1,15 +1,37 @@
 #!/usr/bin/env python3
+"""Fill the database with synthetic data.
+
+    python seed.py                                        # a few rows per table
+    python seed.py --users 1e6 --sites 50k --reviews 10M  # capacity testing
+
+Rows come from a seeded random generator, so the same arguments always
+produce the same rows (timestamps are spread over the year before the day
+it runs). They are streamed into the database in batches, with COPY on
+Postgres and executemany elsewhere. Every generated user's password is one
+of `PASSWORDS`, hashed once up front.
+"""
 
 # Standard library imports
-from random import randint, choice as rc
+import argparse
+import csv
+import io
+import random
+import time
+from datetime import timedelta
+from itertools import islice
 
 # Remote library imports
 from faker import Faker
+from flask import current_app
+from sqlalchemy import delete, text
+from werkzeug.security import generate_password_hash
 
 # Local imports
-from app import app
+from config import create_app
 from models import (
     db,
+    now_gmt_plus_3,
+    RATINGS,
     User,
     Profile,
     UserActivity,
@@ -17,131 +39,391 @@ from models import (
     Activity,
     Site,
     SiteActivity,
+    SiteRatingStats,
+    ActivityCooccurrence,
+    SiteCooccurrence,
+    Tombstone,
+    SavedSite,
     Location,
 )
+import rating_stats
+import recommendations
+import versions
 
-if __name__ == "__main__":
-    fake = Faker()
+PASSWORDS = [f"safiripassword{n}" for n in range(8)]
+TEST_USER = ("markbkiunga", "markbkiungapassword")
 
-    with app.app_context():
-        print("Starting seed...")
+# Distinct Faker values drawn per field; rows pick from these instead of
+# calling Faker millions of times
+POOL_SIZE = 1000
+ONE_YEAR = 365 * 24 * 60 * 60
+SITE_CATEGORIES = ["Historical", "Adventure", "Leisure"]
+ACTIVITY_NAMES = ["Hiking", "Kayaking", "Museum Tour", "Beach Day", "Safari"]
+ACTIVITY_CATEGORIES = ["Outdoor", "Cultural", "Adventure"]
+# Locations are spread over East Africa, sites within about 30 km of theirs
+REGION = {"latitude": (-4.7, 4.6), "longitude": (33.9, 41.9)}
+SITE_SPREAD_DEGREES = 0.3
+# Reviews lean positive, like on most review sites
+RATING_WEIGHTS = [1, 1, 2, 2, 4, 6, 9, 10, 8, 5]
 
-        # Drop all existing data
-        db.session.query(SiteActivity).delete()
-        db.session.query(UserActivity).delete()
-        db.session.query(Review).delete()
-        db.session.query(Site).delete()
-        db.session.query(Activity).delete()
-        db.session.query(Profile).delete()
-        db.session.query(User).delete()
-        db.session.query(Location).delete()
-
-        # Commit deletions
-        db.session.commit()
+# Children before parents, so plain deletes never trip a foreign key
+TABLES = [
+    Tombstone,
+    SiteRatingStats,
+    ActivityCooccurrence,
+    SiteCooccurrence,
+    SavedSite,
+    SiteActivity,
+    UserActivity,
+    Review,
+    Site,
+    Activity,
+    Profile,
+    User,
+    Location,
+]
 
-        # SEED LOCATIONS
-        locations = []
-        for _ in range(3):
-            location = Location(
-                name=fake.city(),
-                image="https://picsum.photos/500/300",
-                description=fake.text(),
-            )
-            locations.append(location)
-            db.session.add(location)
 
-        db.session.commit()
+def hash_password(password):
+    return generate_password_hash(password, current_app.config["PASSWORD_HASH_METHOD"])
 
-        # SEED USERS AND PROFILES
-        users = []
-        profiles = []
-        for _ in range(3):
-            fake_username = fake.user_name()
-            while len(fake_username) < 5 or not fake_username.isalnum():
-                fake_username = fake.user_name()
-            user = User(
-                username=fake_username,
-            )
-            user.set_password(fake.password())
-
-            profile = Profile(
-                first_name=fake.first_name(),
-                last_name=fake.last_name(),
-                email=fake.email(),
-                image="https://picsum.photos/100/100",
-                bio=fake.text(),
-                phone_number=fake.phone_number(),
-                user=user,
-            )
 
-            users.append(user)
-            profiles.append(profile)
-            db.session.add(user)
-            db.session.add(profile)
-        test_user = User(username="markbkiunga")
-        test_user.set_password("markbkiungapassword")
-        db.session.add(test_user)
+def row_count(value):
+    """Parse counts like `500`, `50k`, `10M` or `1e6`."""
+    number = value.strip().lower()
+    multiplier = 1
+    if number[-1:] in ("k", "m"):
+        multiplier = 1_000 if number[-1] == "k" else 1_000_000
+        number = number[:-1]
+    try:
+        count = float(number) * multiplier
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid row count: {value!r}")
+    if count < 0 or count != int(count):
+        raise argparse.ArgumentTypeError(f"invalid row count: {value!r}")
+    return int(count)
 
-        db.session.commit()
 
-        # SEED SITES
-        sites = []
-        for _ in range(3):
-            site = Site(
-                name=fake.company(),
-                image="https://picsum.photos/100/100",
-                description=fake.text(),
-                is_saved=False,
-                category=rc(["Historical", "Adventure", "Leisure"]),
-                location=rc(locations),
-            )
-            sites.append(site)
-            db.session.add(site)
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Fill the database with fake data.")
+    for table in (
+        "locations",
+        "users",
+        "sites",
+        "activities",
+        "reviews",
+        "user-activities",
+        "site-activities",
+    ):
+        parser.add_argument(f"--{table}", type=row_count, default=3, metavar="N")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=row_count, default=10_000, metavar="N")
+    args = parser.parse_args(argv)
 
-        db.session.commit()
+    if args.sites and not args.locations:
+        parser.error("--sites needs at least one location")
+    if (args.reviews or args.user_activities) and not args.users:
+        parser.error("--reviews and --user-activities need at least one user")
+    if args.reviews and not args.sites:
+        parser.error("--reviews needs at least one site")
+    if (args.user_activities or args.site_activities) and not args.activities:
+        parser.error("--user-activities and --site-activities need activities")
+    if args.site_activities and not args.sites:
+        parser.error("--site-activities needs at least one site")
+    if args.batch_size < 1:
+        parser.error("--batch-size must be positive")
+    # Each site offers an activity at most once
+    args.site_activities = min(args.site_activities, args.sites * args.activities)
+    return args
 
-        # SEED ACTIVITIES
-        activities = []
-        for _ in range(3):
-            activity = Activity(
-                description=fake.sentence(),
-                name=rc(["Hiking", "Kayaking", "Museum Tour", "Beach Day", "Safari"]),
-                category=rc(["Outdoor", "Cultural", "Adventure"]),
-            )
-            activities.append(activity)
-            db.session.add(activity)
 
-        db.session.commit()
+class Pools:
+    def __init__(self, seed):
+        Faker.seed(seed)
+        fake = Faker()
+        self.cities = [fake.city() for _ in range(POOL_SIZE)]
+        self.companies = [fake.company() for _ in range(POOL_SIZE)]
+        self.sentences = [fake.sentence() for _ in range(POOL_SIZE)]
+        self.texts = [fake.text() for _ in range(POOL_SIZE)]
+        # Only values that pass the model validators and fit their columns
+        self.first_names = self._valid(fake.first_name, str.isalpha)
+        self.last_names = self._valid(fake.last_name, str.isalpha)
+        self.usernames = self._valid(
+            fake.user_name, lambda name: name.isalnum() and len(name) <= 20
+        )
+        self.phone_numbers = self._valid(fake.phone_number, lambda n: len(n) <= 20)
+
+    @staticmethod
+    def _valid(make, check):
+        values = []
+        while len(values) < POOL_SIZE:
+            value = make()
+            if len(value) >= 2 and check(value):
+                values.append(value)
+        return values
+
+
+class Generator:
+    """Yields the rows of each table as dicts of column values, ids included.
 
-        # SEED USER ACTIVITIES
-        for _ in range(3):
-            user_activity = UserActivity(
-                feedback=fake.text(),
-                participation_date=fake.date_time_this_year(),
-                user=rc(users),
-                activity=rc(activities),
+    Ids are assigned here rather than by the database so children can point
+    at their parents without reading anything back.
+    """
+
+    def __init__(self, args, pools, password_hashes):
+        self.args = args
+        self.pools = pools
+        self.password_hashes = password_hashes
+        self.rng = random.Random(args.seed)
+        # Coordinates draw from their own stream, leaving the other columns
+        # the same as before coordinates existed
+        self.coordinates_rng = random.Random(f"{args.seed}-coordinates")
+        self.location_points = [
+            (
+                self.coordinates_rng.uniform(*REGION["latitude"]),
+                self.coordinates_rng.uniform(*REGION["longitude"]),
             )
-            db.session.add(user_activity)
+            for _ in range(args.locations)
+        ]
+        now = now_gmt_plus_3()
+        self.today = now.replace(hour=0, minute=0, second=0, microsecond=0)
 
-        db.session.commit()
+    def _timestamps(self):
+        created_at = self.today - timedelta(seconds=self.rng.randrange(ONE_YEAR))
+        return {"created_at": created_at, "updated_at": created_at}
+
+    def _popular(self, count):
+        # Skewed towards low ids, so a few rows collect most of the traffic
+        return int(count * self.rng.random() ** 2) + 1
 
-        # SEED SITE ACTIVITIES
-        for _ in range(3):
-            site_activity = SiteActivity(activity=rc(activities), site=rc(sites))
-            db.session.add(site_activity)
+    def locations(self):
+        for id in range(1, self.args.locations + 1):
+            yield {
+                "id": id,
+                "name": self.rng.choice(self.pools.cities),
+                "image": "https://picsum.photos/500/300",
+                "description": self.rng.choice(self.pools.texts),
+                "latitude": self.location_points[id - 1][0],
+                "longitude": self.location_points[id - 1][1],
+                **self._timestamps(),
+            }
 
+    def users(self):
+        for id in range(1, self.args.users + 1):
+            username = self.rng.choice(self.pools.usernames)
+            yield {
+                "id": id,
+                "username": f"{username}{id:05d}",
+                "password": self.password_hashes[id % len(PASSWORDS)],
+                **self._timestamps(),
+            }
+        username, password = TEST_USER
+        yield {
+            "id": self.args.users + 1,
+            "username": username,
+            "password": hash_password(password),
+            **self._timestamps(),
+        }
+
+    def profiles(self):
+        for id in range(1, self.args.users + 1):
+            first_name = self.rng.choice(self.pools.first_names)
+            last_name = self.rng.choice(self.pools.last_names)
+            yield {
+                "id": id,
+                "first_name": first_name,
+                "last_name": last_name,
+                "email": f"{first_name}.{last_name}{id}@example.com".lower(),
+                "image": "https://picsum.photos/100/100",
+                "bio": self.rng.choice(self.pools.texts),
+                "phone_number": self.rng.choice(self.pools.phone_numbers),
+                "user_id": id,
+                **self._timestamps(),
+            }
+
+    def _site_coordinates(self, location_id):
+        lat, lng = self.location_points[location_id - 1]
+        spread = SITE_SPREAD_DEGREES
+        return {
+            "latitude": lat + self.coordinates_rng.uniform(-spread, spread),
+            "longitude": lng + self.coordinates_rng.uniform(-spread, spread),
+        }
+
+    def sites(self):
+        for id in range(1, self.args.sites + 1):
+            location_id = self.rng.randrange(self.args.locations) + 1
+            yield {
+                "id": id,
+                "name": self.rng.choice(self.pools.companies),
+                "image": "https://picsum.photos/100/100",
+                "description": self.rng.choice(self.pools.texts),
+                "category": self.rng.choice(SITE_CATEGORIES),
+                "location_id": location_id,
+                **self._site_coordinates(location_id),
+                **self._timestamps(),
+            }
+
+    def activities(self):
+        for id in range(1, self.args.activities + 1):
+            yield {
+                "id": id,
+                "description": self.rng.choice(self.pools.sentences),
+                "name": self.rng.choice(ACTIVITY_NAMES),
+                "category": self.rng.choice(ACTIVITY_CATEGORIES),
+                **self._timestamps(),
+            }
+
+    def user_activities(self):
+        for id in range(1, self.args.user_activities + 1):
+            timestamps = self._timestamps()
+            yield {
+                "id": id,
+                "feedback": self.rng.choice(self.pools.texts),
+                "participation_date": timestamps["created_at"],
+                "user_id": self.rng.randrange(self.args.users) + 1,
+                "activity_id": self._popular(self.args.activities),
+                **timestamps,
+            }
+
+    def site_activities(self):
+        sites, activities = self.args.sites, self.args.activities
+        offsets = [self.rng.randrange(activities) for _ in range(sites)]
+        for index in range(self.args.site_activities):
+            # Round-robin over sites; pass n gives each site its nth activity
+            site, nth = index % sites, index // sites
+            yield {
+                "id": index + 1,
+                "site_id": site + 1,
+                "activity_id": (offsets[site] + nth) % activities + 1,
+                **self._timestamps(),
+            }
+
+    def reviews(self):
+        ratings = list(RATINGS)
+        for id in range(1, self.args.reviews + 1):
+            yield {
+                "id": id,
+                "description": self.rng.choice(self.pools.texts),
+                "rating": self.rng.choices(ratings, RATING_WEIGHTS)[0],
+                "user_id": self.rng.randrange(self.args.users) + 1,
+                "site_id": self._popular(self.args.sites),
+                **self._timestamps(),
+            }
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def copy_batch(connection, table, batch):
+    """Stream one batch into Postgres through COPY ... FROM STDIN as CSV."""
+    columns = list(batch[0])
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([row[column] for column in columns] for row in batch)
+    buffer.seek(0)
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+    finally:
+        cursor.close()
+
+
+def load(model, rows, batch_size):
+    table = model.__table__
+    started = time.perf_counter()
+    total = 0
+    for batch in batches(rows, batch_size):
+        connection = db.session.connection()
+        if connection.dialect.name == "postgresql":
+            copy_batch(connection, table, batch)
+        else:
+            connection.execute(table.insert(), batch)
         db.session.commit()
+        total += len(batch)
+    report(table.name, total, time.perf_counter() - started)
+    return total
+
 
-        # SEED REVIEWS
-        for _ in range(3):
-            review = Review(
-                description=fake.text(),
-                rating=randint(1, 10),
-                user=rc(users),
-                site=rc(sites),
+def report(name, rows, elapsed):
+    rate = rows / elapsed if elapsed else 0
+    print(f"{name:<18} {rows:>12,} rows {elapsed:>9.2f}s {rate:>12,.0f} rows/s")
+
+
+def clear():
+    if db.session.connection().dialect.name == "postgresql":
+        names = ", ".join(model.__tablename__ for model in TABLES)
+        db.session.execute(text(f"TRUNCATE {names} RESTART IDENTITY CASCADE"))
+    else:
+        for model in TABLES:
+            db.session.execute(delete(model))
+    db.session.commit()
+
+
+def reset_sequences():
+    """Move Postgres id sequences past the ids the generator assigned."""
+    if db.session.connection().dialect.name != "postgresql":
+        return
+    for model in TABLES:
+        if "id" not in model.__table__.c:
+            continue
+        name = model.__tablename__
+        db.session.execute(
+            text(
+                f"SELECT setval(pg_get_serial_sequence('{name}', 'id'), "
+                f"COALESCE(MAX(id), 0) + 1, false) FROM {name}"
             )
-            db.session.add(review)
+        )
+    db.session.commit()
 
-        db.session.commit()
 
-        print("Seeding complete!")
+def populate(args):
+    """Replace the contents of every seeded table with generated rows."""
+    clear()
+
+    started = time.perf_counter()
+    generator = Generator(
+        args,
+        Pools(args.seed),
+        [hash_password(password) for password in PASSWORDS],
+    )
+    total = 0
+    for model, rows in (
+        (Location, generator.locations()),
+        (User, generator.users()),
+        (Profile, generator.profiles()),
+        (Site, generator.sites()),
+        (Activity, generator.activities()),
+        (UserActivity, generator.user_activities()),
+        (SiteActivity, generator.site_activities()),
+        (Review, generator.reviews()),
+    ):
+        total += load(model, rows, args.batch_size)
+    reset_sequences()
+
+    # Bulk inserts bypass the session hooks that keep these current
+    versions.bump(db.session, [model.__tablename__ for model in TABLES])
+    stats_started = time.perf_counter()
+    rating_stats.rebuild()
+    report("site_rating_stats", args.sites, time.perf_counter() - stats_started)
+    cooccurrences_started = time.perf_counter()
+    recommendations.rebuild()
+    elapsed = time.perf_counter() - cooccurrences_started
+    pairs = ActivityCooccurrence.query.count() + SiteCooccurrence.query.count()
+    report("co-occurrences", pairs, elapsed)
+
+    report("total", total, time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    # The database layer alone; seeding doesn't need the web stack
+    with create_app(groups=[]).app_context():
+        print("Starting seed...")
+        populate(args)
+        print(f"Generated users log in with one of: {', '.join(PASSWORDS)}")
@@ -0,0 +1,125 @@
+import json
+
+from flask import Response
+from sqlalchemy import DateTime, inspect
+from sqlalchemy_serializer import SerializerMixin
+from sqlalchemy_serializer.lib.schema import Schema
+
+from metrics import timed_serialization
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+# Deepest object graph a compiled serializer will unroll; serialize_rules that
+# fail to break a relationship cycle are reported instead of recursing forever
+MAX_DEPTH = 12
+
+
+def _format_datetime(value):
+    if value is None:
+        return None
+    return value.strftime(SerializerMixin.datetime_format)
+
+
+class _Compiler:
+    """Generates plain Python functions reproducing SerializerMixin.to_dict().
+
+    sqlalchemy_serializer decides which keys to emit from the serialize_rules
+    of every class it meets on the way down, but those decisions depend only
+    on the classes involved. Replaying them once per model with the library's
+    own Schema yields a fixed shape, which is turned into straight-line code
+    that reads attributes and builds dicts without any per-row rule handling.
+    """
+
+    def __init__(self):
+        self.lines = []
+        self.namespace = {"_dt": _format_datetime}
+        self.counter = 0
+        self.models = set()
+
+    def compile(self, model):
+        name = self._node(model, Schema(), 0)
+        exec("\n".join(self.lines), self.namespace)
+        return self.namespace[name]
+
+    def _node(self, model, schema, depth):
+        if depth > MAX_DEPTH:
+            raise RecursionError(
+                f"serialize_rules on {model.__name__} do not terminate"
+            )
+        self.models.add(model)
+        schema.update(only=model.serialize_only, extend=model.serialize_rules)
+        mapper = inspect(model)
+        keys = set(schema.keys)
+        if schema.is_greedy:
+            keys.update(attr.key for attr in mapper.attrs)
+
+        name = f"_dump_{model.__name__}_{self.counter}"
+        self.counter += 1
+        fields = []
+        for key in sorted(keys):
+            if not schema.is_included(key):
+                continue
+            if key in mapper.relationships:
+                fields.append(self._relationship(mapper, key, schema, depth))
+            elif isinstance(mapper.columns[key].type, DateTime):
+                fields.append(f"{key!r}: _dt(obj.{key})")
+            else:
+                fields.append(f"{key!r}: obj.{key}")
+
+        self.lines.append(f"def {name}(obj):")
+        self.lines.append("    return {" + ", ".join(fields) + "}")
+        return name
+
+    def _relationship(self, mapper, key, schema, depth):
+        relationship = mapper.relationships[key]
+        target = relationship.mapper.class_
+        if not issubclass(target, SerializerMixin):
+            # to_dict() drops items it cannot serialize, leaving an empty list
+            return f"{key!r}: []" if relationship.uselist else f"{key!r}: None"
+
+        child = self._node(target, schema.fork(key=key), depth + 1)
+        if relationship.uselist:
+            return f"{key!r}: [{child}(item) for item in obj.{key}]"
+        return f"{key!r}: (None if obj.{key} is None else {child}(obj.{key}))"
+
+
+_compiled = {}
+_reached = {}
+
+
+def serializer_for(model):
+    """Return the compiled serializer for `model`, building it on first use."""
+    if model not in _compiled:
+        compiler = _Compiler()
+        _compiled[model] = compiler.compile(model)
+        _reached[model] = frozenset(compiler.models)
+    return _compiled[model]
+
+
+def models_reached(model):
+    """Every model whose rows can appear in `model`'s to_dict() output."""
+    if not issubclass(model, SerializerMixin):
+        return frozenset((model,))
+    serializer_for(model)
+    return _reached[model]
+
+
+@timed_serialization
+def dump(obj):
+    """Equivalent of obj.to_dict() using the compiled serializer."""
+    return serializer_for(type(obj))(obj)
+
+
+@timed_serialization
+def dumps(data):
+    """Encode already serialized data as compact JSON bytes with sorted keys."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(data, separators=(",", ":"), sort_keys=True).encode()
+
+
+def json_response(data, status=200):
+    return Response(dumps(data), status=status, mimetype="application/json")
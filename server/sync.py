@@ -0,0 +1,156 @@
+import base64
+import binascii
+import json
+from datetime import timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import delete, event, insert, select
+from sqlalchemy.orm import Session
+
+from cascades import on_cascade
+from config import db
+from export import row_dict, updated_since
+from models import (
+    now_gmt_plus_3,
+    Activity,
+    Location,
+    Site,
+    SiteActivity,
+    Tombstone,
+)
+
+# Catalog tables /sync covers, parents first
+SYNCED = [Location, Site, Activity, SiteActivity]
+SYNCED_TABLES = {model.__tablename__ for model in SYNCED}
+
+
+def encode_token(when):
+    payload = json.dumps({"since": when.isoformat()}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_token(token):
+    """Turn an opaque sync token back into the time it points at."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        return updated_since(json.loads(base64.urlsafe_b64decode(padded))["since"])
+    except (binascii.Error, ValueError, TypeError, KeyError, AttributeError):
+        raise ValueError("Invalid sync token")
+
+
+def changes(since=None):
+    """Catalog rows written and deleted since a sync token's time.
+
+    Each table's rows come from one indexed `updated_at >= since` range scan
+    and the deletions from one scan of the tombstones, so the cost follows
+    how much changed rather than how big the catalog is. Without `since`, or
+    when it is older than the tombstones reach back, every row is returned
+    with `full` set and the client should replace what it has.
+    """
+    started = now_gmt_plus_3()
+    horizon = started - timedelta(days=current_app.config["SYNC_TOMBSTONE_DAYS"])
+    full = since is None or since < horizon
+
+    result = {}
+    for model in SYNCED:
+        columns = list(model.__table__.columns)
+        query = select(*columns).order_by(model.id)
+        if not full:
+            query = query.where(model.updated_at >= since)
+        keys = [column.key for column in columns]
+        rows = [row_dict(keys, row) for row in db.session.execute(query)]
+        result[model.__tablename__] = {"updated": rows, "deleted": []}
+
+    if not full:
+        tombstones = db.session.execute(
+            select(Tombstone.table_name, Tombstone.row_id)
+            .where(Tombstone.deleted_at >= since)
+            .distinct()
+        )
+        for table_name, row_id in tombstones:
+            if table_name in result:
+                result[table_name]["deleted"].append(row_id)
+        for table in result.values():
+            # An id that was deleted and then reused is current again
+            updated = {row["id"] for row in table["updated"]}
+            table["deleted"] = sorted(set(table["deleted"]) - updated)
+
+    overlap = timedelta(seconds=current_app.config["SYNC_OVERLAP_SECONDS"])
+    return {
+        "full": full,
+        "token": encode_token(started - overlap),
+        "changes": result,
+    }
+
+
+def deleted_since(models, since):
+    """{table: ids} of the rows of `models` deleted since `since`, or None
+    when that is older than the tombstones reach back."""
+    horizon = now_gmt_plus_3() - timedelta(
+        days=current_app.config["SYNC_TOMBSTONE_DAYS"]
+    )
+    if since < horizon:
+        return None
+    deleted = {model.__tablename__: set() for model in models}
+    tombstones = db.session.execute(
+        select(Tombstone.table_name, Tombstone.row_id)
+        .where(Tombstone.deleted_at >= since, Tombstone.table_name.in_(deleted))
+        .distinct()
+    )
+    for table_name, row_id in tombstones:
+        deleted[table_name].add(row_id)
+    return deleted
+
+
+def prune(now=None):
+    """Drop tombstones older than any token /sync still answers incrementally."""
+    horizon = (now or now_gmt_plus_3()) - timedelta(
+        days=current_app.config["SYNC_TOMBSTONE_DAYS"]
+    )
+    removed = db.session.execute(
+        delete(Tombstone).where(Tombstone.deleted_at < horizon)
+    ).rowcount
+    db.session.commit()
+    return removed
+
+
+@on_cascade
+def _collect_cascaded_rows(session, cascaded):
+    rows = [
+        (model.__tablename__, id) for model, ids in cascaded.items() for id in ids
+    ]
+    if rows:
+        session.info.setdefault("sync_cascaded", []).extend(rows)
+
+
+@event.listens_for(Session, "after_flush")
+def _record_tombstones(session, flush_context):
+    deleted = set(session.info.pop("sync_cascaded", ()))
+    deleted.update(
+        (obj.__tablename__, obj.id)
+        for obj in session.deleted
+        if obj.__tablename__ in SYNCED_TABLES
+    )
+    if deleted:
+        now = now_gmt_plus_3()
+        session.execute(
+            insert(Tombstone),
+            [
+                {"table_name": table_name, "row_id": row_id, "deleted_at": now}
+                for table_name, row_id in sorted(deleted)
+            ],
+        )
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_cascaded_rows(session):
+    session.info.pop("sync_cascaded", None)
+
+
+@click.command("prune-tombstones")
+@with_appcontext
+def prune_command():
+    """Delete tombstones older than SYNC_TOMBSTONE_DAYS."""
+    print(f"Pruned {prune()} tombstones")
@@ -0,0 +1,123 @@
+from functools import cache
+
+from sqlalchemy import event, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from config import db
+from models import now_gmt_plus_3, TableVersion
+
+
+def table_versions(models):
+    """(table, version, updated_at) for each model, by primary key lookup.
+
+    The version moves whenever a transaction that wrote to the table
+    commits, including rows ON DELETE CASCADE removed along with the ones
+    it deleted, and updated_at is when that happened. A table nothing has
+    written to yet reads as (table, 0, None).
+    """
+    names = sorted(model.__tablename__ for model in models)
+    found = {
+        table: (version, updated_at)
+        for table, version, updated_at in db.session.execute(
+            select(
+                TableVersion.table_name, TableVersion.version, TableVersion.updated_at
+            ).where(TableVersion.table_name.in_(names))
+        )
+    }
+    return [(table, *found.get(table, (0, None))) for table in names]
+
+
+def bump(session, tables):
+    """Move the versions of `tables` on, in the session's transaction."""
+    if not tables:
+        return
+    now = now_gmt_plus_3()
+    dialect = session.connection().dialect.name
+    statement = (postgresql if dialect == "postgresql" else sqlite).insert(
+        TableVersion
+    )
+    session.execute(
+        statement.on_conflict_do_update(
+            index_elements=[TableVersion.table_name],
+            set_={
+                "version": TableVersion.version + 1,
+                "updated_at": statement.excluded.updated_at,
+            },
+        ),
+        # Sorted so concurrent transactions lock the rows in the same order
+        [
+            {"table_name": table, "version": 1, "updated_at": now}
+            for table in sorted(tables)
+        ],
+    )
+
+
+@cache
+def _cascades():
+    """table -> every table ON DELETE CASCADE reaches from it."""
+    children = {}
+    for table in db.metadata.tables.values():
+        for key in table.foreign_keys:
+            if (key.ondelete or "").upper() == "CASCADE":
+                children.setdefault(key.column.table.name, set()).add(table.name)
+    reached = {}
+    for name in children:
+        seen, stack = set(), [name]
+        while stack:
+            for child in children.get(stack.pop(), ()):
+                if child not in seen:
+                    seen.add(child)
+                    stack.append(child)
+        reached[name] = seen
+    return reached
+
+
+def _written(session, tables, deleted=()):
+    written = session.info.setdefault("written_tables", set())
+    written.update(tables)
+    for table in deleted:
+        written.add(table)
+        written.update(_cascades().get(table, ()))
+
+
+@event.listens_for(Session, "after_flush")
+def _record_flushed_tables(session, flush_context):
+    _written(
+        session,
+        {obj.__tablename__ for obj in (*session.new, *session.dirty)},
+        deleted={obj.__tablename__ for obj in session.deleted},
+    )
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _record_bulk_tables(orm_execute_state):
+    # insert()/update()/delete() run through the session, as the derived
+    # tables and seed.clear() use, never pass through a flush
+    if not (
+        orm_execute_state.is_insert
+        or orm_execute_state.is_update
+        or orm_execute_state.is_delete
+    ):
+        return
+    table = orm_execute_state.statement.table.name
+    if table == TableVersion.__tablename__:
+        return
+    _written(
+        orm_execute_state.session,
+        [table],
+        deleted=[table] if orm_execute_state.is_delete else (),
+    )
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_written_tables(session):
+    # Flush first so the writes the commit is about to flush are counted;
+    # bumping last holds the version rows' locks only until the commit
+    session.flush()
+    bump(session, session.info.pop("written_tables", None))
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_written_tables(session):
+    session.info.pop("written_tables", None)